@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class CredibuyConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'credibuy'
+
+    def ready(self):
+        from . import checks, dbpool, middleware, signals  # noqa: F401
+        dbpool.connect_signals()
+        middleware.connect_signals()
@@ -2,6 +2,9 @@
 ASGI config for credibuy project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests are routed through ``settings.ASGI_URLCONF``, which serves the
+read-heavy endpoints with async views; run it with an ASGI server such as
+``uvicorn credibuy.asgi:application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -9,8 +12,21 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler, ASGIRequest
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'credibuy.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+
+class CredibuyASGIRequest(ASGIRequest):
+    urlconf = settings.ASGI_URLCONF
+
+
+class CredibuyASGIHandler(ASGIHandler):
+    request_class = CredibuyASGIRequest
+
+
+application = CredibuyASGIHandler()
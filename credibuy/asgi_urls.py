@@ -0,0 +1,23 @@
+"""
+URL configuration for ASGI deployments.
+
+The read-heavy endpoints are served by async views at the same paths and
+names as their viewset routes in ``credibuy.urls``; everything else is the
+same synchronous view. Detail routes only take integer keys, so that the
+viewsets' extra list routes, such as ``export/``, still reach them.
+"""
+from django.urls import path
+
+from credibuy.urls import urlpatterns as sync_urlpatterns
+from payments.views import AsyncCreditDetailView, AsyncCreditListView, AsyncPaymentsByCreditView
+from products.views import AsyncProductDetailView, AsyncProductListView
+
+urlpatterns = [
+    path('api/credit/', AsyncCreditListView.as_view(), name='credits-list'),
+    path('api/credit/<int:pk>/', AsyncCreditDetailView.as_view(), name='credits-detail'),
+    path(
+        'api/payments/by-credit/<str:credit_id>/', AsyncPaymentsByCreditView.as_view(), name='payment-by-credit'
+    ),
+    path('api/product/', AsyncProductListView.as_view(), name='product-list'),
+    path('api/product/<int:pk>/', AsyncProductDetailView.as_view(), name='product-detail'),
+] + sync_urlpatterns
@@ -0,0 +1,73 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.views import View
+from rest_framework.response import Response
+
+
+class AsyncReadView(View):
+    """Async counterpart of one read action of a DRF viewset, for ASGI deployments.
+
+    Authentication, permissions, filters, pagination and serializers are the
+    ``viewset``'s own, so responses match the synchronous endpoint. Rows are
+    fetched with the async ORM and the response is built on the event loop,
+    which leaves the worker free to serve other connections meanwhile.
+    """
+
+    viewset = None
+    basename = None
+    # "list" and "retrieve" fetch like the viewset's actions; other actions
+    # override ``get_queryset``.
+    action = "list"
+    paginate = True
+
+    async def get(self, request, *args, **kwargs):
+        view = self.viewset(
+            action_map={"get": self.action}, basename=self.basename, format_kwarg=None, args=args, kwargs=kwargs
+        )
+        view.request = view.initialize_request(request, *args, **kwargs)
+        view.headers = view.default_response_headers
+        try:
+            # Authentication and permission checks may query, so they run in a thread.
+            await sync_to_async(view.initial)(view.request, *args, **kwargs)
+            response = await self.respond(view)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        response = view.finalize_response(view.request, response, *args, **kwargs)
+        # Rendered here rather than by the handler, which would hop to a thread for it.
+        return response.render() if isinstance(response, Response) else response
+
+    async def respond(self, view) -> Response:
+        queryset = self.get_queryset(view)
+        if self.action == "retrieve":
+            return await self.retrieve(view, queryset)
+        return await self.list(view, queryset)
+
+    def get_queryset(self, view):
+        """The lazy queryset to read from; building it must not run queries."""
+        return view.filter_queryset(view.get_queryset())
+
+    async def list(self, view, queryset) -> Response:
+        paginator = view.paginator if self.paginate else None
+        if paginator is None:
+            return Response(await self.serialize(view, [row async for row in queryset], many=True))
+        rows = await paginator.apaginate_queryset(queryset, view.request, view=view)
+        return paginator.get_paginated_response(await self.serialize(view, rows, many=True))
+
+    async def retrieve(self, view, queryset) -> Response:
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        try:
+            obj = await queryset.filter(**{view.lookup_field: view.kwargs[lookup_url_kwarg]}).afirst()
+        except (TypeError, ValueError, ValidationError):
+            obj = None
+        if obj is None:
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        view.check_object_permissions(view.request, obj)
+        return Response(await self.serialize(view, obj))
+
+    async def serialize(self, view, instance, many: bool = False):
+        """Serializer output; override to run ``get_data`` in a thread if the serializer queries."""
+        return self.get_data(view, instance, many)
+
+    def get_data(self, view, instance, many: bool = False):
+        return view.get_serializer(instance, many=many).data
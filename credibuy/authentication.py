@@ -0,0 +1,136 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from .middleware import QueryStats, allow_queries, counting
+
+# Users resolved from a token are kept in this process, together with the
+# versions of their auth state in the default cache at load time. Changing a
+# user's flags, permissions or groups bumps that user's version; changing a
+# group's permissions bumps the version every user shares. A cached user is
+# served only while both versions still match, so every worker drops it on
+# the next request after the change, with one cache round trip and no
+# database query. That holds only if every worker shares the cache, which the
+# production settings configure and ``check --deploy`` enforces; with an
+# in-process cache a change reaches the other workers after AUTH_CACHE_TIMEOUT.
+
+GROUPS_VERSION_KEY = "auth:groups:version"
+
+
+def user_version_key(user_id) -> str:
+    return f"auth:user:{user_id}:version"
+
+
+def _bump(key: str) -> None:
+    cache.add(key, 1, None)
+    cache.incr(key)
+
+
+def invalidate(*user_ids) -> None:
+    """Drop the cached auth state of ``user_ids``, or of every user when none are given.
+
+    Model saves, deletes and m2m changes call this through ``credibuy.signals``.
+    ``QuerySet.update()`` and raw SQL send no signal, so code that changes
+    users that way, e.g. ``User.objects.filter(...).update(is_active=False)``,
+    must call it with the users' ids itself.
+
+    Bumped again on commit, because a concurrent request may have cached the
+    still-uncommitted old state in between.
+    """
+    keys = [user_version_key(user_id) for user_id in user_ids] or [GROUPS_VERSION_KEY]
+
+    def bump():
+        for key in keys:
+            _bump(key)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+class UserCache:
+    """Thread-safe LRU of users by (user id, token id) with a TTL."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key, versions: tuple):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            user, entry_versions, expires_at = entry
+            if entry_versions != versions or expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return user
+
+    def set(self, key, user, versions: tuple) -> None:
+        with self.lock:
+            self.entries[key] = (user, versions, time.monotonic() + settings.AUTH_CACHE_TIMEOUT)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.AUTH_CACHE_MAX_ENTRIES:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+
+users = UserCache()
+
+
+def versions(user_id) -> tuple:
+    key = user_version_key(user_id)
+    found = cache.get_many([key, GROUPS_VERSION_KEY])
+    return found.get(key), found.get(GROUPS_VERSION_KEY)
+
+
+def current_versions(user_id) -> tuple:
+    """Like ``versions``, creating the keys missing from the cache."""
+    cache.add(user_version_key(user_id), 1, None)
+    cache.add(GROUPS_VERSION_KEY, 1, None)
+    return versions(user_id)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that reuses the user and its permissions across requests.
+
+    The first request with a token loads the user and, unless it is a
+    superuser, its permission set; later requests with the token reach the
+    view without a query until ``AUTH_CACHE_TIMEOUT`` passes or the user's
+    auth state changes.
+    """
+
+    def authenticate(self, request):
+        self.request = request
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)  # Rejects the token.
+        key = (user_id, validated_token.get(api_settings.JTI_CLAIM) or str(validated_token))
+        user = users.get(key, versions(user_id))
+        if user is None:
+            # Read before loading: a change committed meanwhile leaves them stale.
+            loaded_versions = current_versions(user_id)
+            stats = QueryStats()
+            with counting(stats):
+                user = super().get_user(validated_token)
+                if not user.is_superuser:
+                    # Fills the backends' permission caches on the instance.
+                    user.get_all_permissions()
+            # Once per token and AUTH_CACHE_TIMEOUT, outside the view's budget.
+            allow_queries(getattr(self, "request", None), stats.count)
+            users.set(key, user, loaded_versions)
+        # A copy, so that attributes set during a request stay in that request.
+        return copy.copy(user)
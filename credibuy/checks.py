@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Backends whose entries only the process that wrote them can see.
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """The default cache must be shared, or invalidations reach only the worker that made them."""
+    backend = settings.CACHES.get("default", {}).get("BACKEND")
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            f"The default cache ({backend}) is local to each process.",
+            hint=(
+                "Cached catalog responses and users' auth state would stay stale in every worker "
+                "but the one that changed them. Set REDIS_URL, or use the database cache."
+            ),
+            id="credibuy.E001",
+        )
+    ]
+
+
+@register(Tags.caches, Tags.database)
+def check_replica_pins(app_configs, **kwargs):
+    """Replica pins must be seen by every worker, or a client may not read its own writes."""
+    backend = settings.CACHES.get("default", {}).get("BACKEND")
+    if not settings.REPLICA_DATABASES or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            f"REPLICA_DATABASES is set but the default cache ({backend}) is local to each process.",
+            hint=(
+                "A client that writes through one worker could read stale rows from a replica "
+                "through another. Set REDIS_URL, or use the database cache."
+            ),
+            id="credibuy.E002",
+        )
+    ]
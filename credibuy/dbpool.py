@@ -0,0 +1,66 @@
+from collections import Counter
+
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+# Per-process counters. A connection handed out by a pool also counts as a
+# connect, so with pooling ``connects`` is checkouts and the pool's own
+# ``connections_num`` is the number of server connections.
+_connects = Counter()
+_requests = 0
+
+
+def _count_connect(sender, connection, **kwargs):
+    _connects[connection.alias] += 1
+
+
+def _count_request(sender, **kwargs):
+    global _requests
+    _requests += 1
+
+
+def connect_signals():
+    connection_created.connect(_count_connect, dispatch_uid="credibuy.dbpool.connect")
+    request_started.connect(_count_request, dispatch_uid="credibuy.dbpool.request")
+
+
+def pool_stats(pool) -> dict:
+    """Wait time and saturation of a psycopg_pool ``ConnectionPool``."""
+    stats = pool.get_stats()
+    size = stats.get("pool_size", 0)
+    in_use = size - stats.get("pool_available", 0)
+    requests = stats.get("requests_num", 0)
+    wait_ms = stats.get("requests_wait_ms", 0)
+    return {
+        "min_size": pool.min_size,
+        "max_size": pool.max_size,
+        "size": size,
+        "in_use": in_use,
+        "saturation": round(in_use / pool.max_size, 4) if pool.max_size else None,
+        "waiting": stats.get("requests_waiting", 0),
+        "requests": requests,
+        "queued": stats.get("requests_queued", 0),
+        "wait_ms_total": wait_ms,
+        "wait_ms_avg": round(wait_ms / requests, 2) if requests else None,
+        "timeouts": stats.get("requests_errors", 0),
+        "connections_num": stats.get("connections_num", 0),
+    }
+
+
+def stats(alias: str = "default") -> dict:
+    """Connection reuse of ``alias`` in this process, plus pool metrics when pooled."""
+    connection = connections[alias]
+    connects = _connects[alias]
+    data = {
+        "vendor": connection.vendor,
+        "conn_max_age": connection.settings_dict.get("CONN_MAX_AGE"),
+        "health_checks": connection.settings_dict.get("CONN_HEALTH_CHECKS"),
+        "requests": _requests,
+        "connects": connects,
+        "connects_per_request": round(connects / _requests, 4) if _requests else None,
+        "pool": None,
+    }
+    if connection.settings_dict["OPTIONS"].get("pool"):
+        data["pool"] = pool_stats(connection.pool)
+    return data
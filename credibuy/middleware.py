@@ -0,0 +1,216 @@
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.permissions import SAFE_METHODS
+
+from . import replicas
+
+logger = logging.getLogger(__name__)
+
+# The same statement (parameters aside) running this many times in one
+# request is reported as a likely N+1.
+REPEATED_QUERY_THRESHOLD = 3
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.patterns = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.record(sql, time.perf_counter() - started)
+
+    def record(self, sql: str, duration: float) -> None:
+        self.duration += duration
+        self.count += 1
+        self.patterns[sql] += 1
+
+    def repeated(self) -> list[tuple[str, int]]:
+        return [(sql, n) for sql, n in self.patterns.most_common() if n >= REPEATED_QUERY_THRESHOLD]
+
+
+# The stats counting the current request's queries. Under ASGI the ORM runs in
+# ``sync_to_async`` threads, each with its own connections, which a context
+# variable follows into; every connection records into whatever stats are
+# current in the context its query runs in.
+_current_stats: ContextVar[tuple[QueryStats, ...]] = ContextVar("current_stats", default=())
+
+
+def _record_query(execute, sql, params, many, context):
+    current = _current_stats.get()
+    if not current:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for stats in current:
+            stats.record(sql, duration)
+
+
+def install_query_recorder(sender=None, connection=None, **kwargs) -> None:
+    if _record_query not in connection.execute_wrappers:
+        # First, so that the temporary wrappers pushed and popped around it
+        # still pop their own.
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+def connect_signals():
+    connection_created.connect(install_query_recorder, dispatch_uid="credibuy.middleware.record_query")
+
+
+@contextmanager
+def counting(stats: QueryStats):
+    """Count the queries run in this context into ``stats``, in whichever thread they run."""
+    for connection in connections.all(initialized_only=True):
+        # Those connected before the signal was; the others are when they connect.
+        install_query_recorder(connection=connection)
+    token = _current_stats.set((*_current_stats.get(), stats))
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+def view_action(view_func, method: str) -> tuple[type | None, str | None]:
+    """The class behind ``view_func`` and the viewset action (or lowercase method) ``method`` runs."""
+    view_class = getattr(view_func, "cls", None) or getattr(view_func, "view_class", None)
+    actions = getattr(view_func, "actions", None)
+    return view_class, actions.get(method.lower()) if actions else method.lower()
+
+
+def query_budget(view_func, method: str) -> int | None:
+    """The maximum query count a view declares for ``method`` through ``query_budget``."""
+    view_class, key = view_action(view_func, method)
+    budgets = getattr(view_class, "query_budget", None)
+    if not budgets:
+        return None
+    return budgets.get(key)
+
+
+def allow_queries(request, n: int) -> None:
+    """Raise the query budget of ``request`` by ``n`` queries that it runs by design, such as a COUNT(*)."""
+    request = getattr(request, "_request", request)
+    if getattr(request, "query_budget", None) is not None:
+        request.query_budget += n
+
+
+def reads_from_replica(view_func, method: str) -> bool:
+    """Whether the view lists ``method``'s action in ``replica_reads``, accepting replication lag."""
+    if method not in SAFE_METHODS:
+        return False
+    view_class, key = view_action(view_func, method)
+    return key in getattr(view_class, "replica_reads", ())
+
+
+class QueryCountMiddleware:
+    """Count SQL queries and database time per request and flag repeated queries.
+
+    Async-capable, so an ASGI deployment keeps async views on the event loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        request.query_budget = None
+        with counting(stats):
+            response = self.get_response(request)
+        return self.report(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        request.query_budget = None
+        with counting(stats):
+            response = await self.get_response(request)
+        return self.report(request, response, stats)
+
+    def report(self, request, response, stats: QueryStats):
+        repeated = stats.repeated()
+        for sql, n in repeated:
+            logger.warning("Query ran %d times in %s %s: %s", n, request.method, request.path, sql)
+        budget = request.query_budget
+        if budget is not None and stats.count > budget:
+            logger.warning(
+                "%s %s ran %d queries, over its budget of %d", request.method, request.path, stats.count, budget
+            )
+        if settings.DEBUG:
+            response["X-DB-Query-Count"] = str(stats.count)
+            response["X-DB-Time-ms"] = f"{stats.duration * 1000:.2f}"
+            response["X-DB-Repeated-Queries"] = str(len(repeated))
+            if budget is not None:
+                response["X-DB-Query-Budget"] = str(budget)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = query_budget(view_func, request.method)
+
+
+class ReplicaRoutingMiddleware:
+    """Serve the reads of list, search and report views from a replica.
+
+    Views opt in per action with ``replica_reads``. After a client's
+    successful write its requests stay on the primary for
+    ``REPLICA_STICKY_SECONDS``, so it reads its own writes despite
+    replication lag. Without ``REPLICA_DATABASES`` this does nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.read_from_replica(False)
+        if self.wrote(request, response):
+            replicas.pin(request)
+        return response
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            replicas.read_from_replica(False)
+        if self.wrote(request, response):
+            await replicas.apin(request)
+        return response
+
+    @staticmethod
+    def wrote(request, response) -> bool:
+        return bool(settings.REPLICA_DATABASES) and request.method not in SAFE_METHODS and response.status_code < 400
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas.read_from_replica(
+            bool(settings.REPLICA_DATABASES)
+            and reads_from_replica(view_func, request.method)
+            and not replicas.is_pinned(request)
+        )
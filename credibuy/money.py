@@ -0,0 +1,83 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+import django_filters
+from django.db import models
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import serializers
+
+# Money is stored and computed as integer cents; Decimal only appears at the
+# edges (rates, parsing and rendering amounts), always with explicit rounding.
+Cents = int
+
+CENT = Decimal("0.01")
+MAX_CENTS = 2**63 - 1
+
+
+def round_cents(amount: Decimal) -> Cents:
+    """Round an amount already expressed in cents half up to a whole cent."""
+    return int(amount.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_cents(amount) -> Cents:
+    """Convert an amount in currency units (``"12.345"``, ``Decimal``, ``int``) to cents, half up."""
+    return round_cents(Decimal(str(amount)) * 100)
+
+
+def from_cents(cents: Cents) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+class MoneyField(models.BigIntegerField):
+    """An amount of money in integer cents."""
+
+    description = "Amount of money in cents"
+
+
+class MoneySerializerField(serializers.Field):
+    """Renders cents as a two-decimal amount and parses amounts back to cents.
+
+    More than two decimal places is a validation error rather than a silent
+    rounding.
+    """
+
+    default_error_messages = {
+        "invalid": "A valid amount is required.",
+        "max_decimal_places": "Ensure that there are no more than 2 decimal places.",
+        "max_value": "Ensure this amount is not too large.",
+    }
+
+    def to_internal_value(self, data) -> Cents:
+        if isinstance(data, bool) or data in ("", None):
+            self.fail("invalid")
+        try:
+            amount = Decimal(str(data).strip())
+        except InvalidOperation:
+            self.fail("invalid")
+        if not amount.is_finite():
+            self.fail("invalid")
+        if amount != amount.quantize(CENT, rounding=ROUND_HALF_UP):
+            self.fail("max_decimal_places")
+        cents = int(amount * 100)
+        if abs(cents) > MAX_CENTS:
+            self.fail("max_value")
+        return cents
+
+    def to_representation(self, value: Cents) -> str:
+        return str(from_cents(value))
+
+
+class MoneyFilter(django_filters.NumberFilter):
+    """Filters a cents column by an amount given in currency units."""
+
+    def filter(self, qs, value):
+        return super().filter(qs, None if value is None else to_cents(value))
+
+
+class MoneyFilterSet(django_filters.FilterSet):
+    FILTER_DEFAULTS = {**django_filters.FilterSet.FILTER_DEFAULTS, MoneyField: {"filter_class": MoneyFilter}}
+
+
+class MoneyFilterBackend(DjangoFilterBackend):
+    """``DjangoFilterBackend`` whose generated filters take money in currency units."""
+
+    filterset_base = MoneyFilterSet
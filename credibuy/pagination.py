@@ -0,0 +1,276 @@
+import binascii
+import json
+from base64 import b64decode, b64encode
+from datetime import date, datetime
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ObjectDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .middleware import allow_queries
+
+# Below this many estimated rows an exact COUNT(*) is cheap enough.
+ESTIMATE_THRESHOLD = 100_000
+MAX_PAGE_SIZE = 100
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts the planner's row estimate for very large tables.
+
+    On PostgreSQL an unfiltered queryset is counted from ``pg_class.reltuples``
+    and a filtered one from the plan's row estimate; small results and other
+    databases still get an exact COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        estimate = self.estimate()
+        if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+            return estimate
+        return super().count
+
+    def estimate(self) -> int | None:
+        queryset = self.object_list
+        if not hasattr(queryset, "query"):
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != "postgresql":
+            return None
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+                return row[0] if row and row[0] >= 0 else None
+            sql, params = queryset.query.sql_with_params()
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class LegacyPageNumberPagination(PageNumberPagination):
+    page_size_query_param = "page_size"
+    max_page_size = MAX_PAGE_SIZE
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination that seeks past the last row instead of using OFFSET.
+
+    The cursor holds the values of every ordering column of the row it points
+    at, with the primary key appended as a unique tiebreaker, so each page is
+    one index range scan no matter how deep it is and no COUNT(*) runs.
+    Requests carrying ``?page=`` keep the previous page-number behaviour.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    legacy_query_param = "page"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self.page_queryset(queryset, request, view)
+        if self.legacy is not None:
+            return self.legacy.paginate_queryset(queryset, request, view)
+        return self.set_page(list(page))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` fetching the page with the async ORM."""
+        page = self.page_queryset(queryset, request, view)
+        if self.legacy is not None:
+            return await sync_to_async(self.legacy.paginate_queryset)(queryset, request, view)
+        return self.set_page([row async for row in page])
+
+    def page_queryset(self, queryset, request, view=None):
+        """The query for the requested page plus one row, or None in page-number mode."""
+        self.legacy = None
+        if self.legacy_query_param in request.query_params:
+            self.legacy = LegacyPageNumberPagination()
+            if view is not None and getattr(view, "page_size", None):
+                self.legacy.page_size = view.page_size
+            # The page's COUNT(*), on top of the budget of a keyset page.
+            allow_queries(request, 1)
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(request, view)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request)
+        self.reverse = bool(cursor and cursor["r"])
+        self.has_cursor = cursor is not None
+
+        self.nullable = {name for name, _ in self.ordering if nullable(queryset.model, name)}
+
+        ordering = [(name, descending != self.reverse) for name, descending in self.ordering]
+        queryset = queryset.order_by(*[self.order_term(name, descending) for name, descending in ordering])
+        if cursor is not None:
+            queryset = queryset.filter(self.seek(ordering, cursor["v"], self.nullable))
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, rows: list) -> list:
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = self.has_cursor and (has_more if self.reverse else True)
+        self.page = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request, view) -> int:
+        page_size = getattr(view, "page_size", None) or api_settings.PAGE_SIZE
+        max_page_size = getattr(view, "max_page_size", None) or MAX_PAGE_SIZE
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        return max(1, min(requested, max_page_size))
+
+    def get_ordering(self, queryset) -> list[tuple[str, bool]]:
+        order_by = queryset.query.order_by or queryset.model._meta.ordering
+        ordering = []
+        for term in order_by:
+            if not isinstance(term, str) or term == "?":
+                raise ImproperlyConfigured(f"KeysetPagination cannot seek on ordering {term!r}")
+            ordering.append((term.lstrip("-"), term.startswith("-")))
+        pk_name = queryset.model._meta.pk.name
+        if not any(name in ("pk", pk_name) for name, _ in ordering):
+            ordering.append(("pk", ordering[-1][1] if ordering else False))
+        return ordering
+
+    def order_term(self, name: str, descending: bool):
+        # NULLs sort as the greatest value on every backend, as on PostgreSQL by default.
+        if name in self.nullable:
+            return F(name).desc(nulls_first=True) if descending else F(name).asc(nulls_last=True)
+        return ("-" if descending else "") + name
+
+    @staticmethod
+    def seek(ordering: list[tuple[str, bool]], values: list, nullable=frozenset()) -> Q:
+        # (a, b, c) after (x, y, z): a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        for i, (name, descending) in enumerate(ordering):
+            step = after(name, descending, values[i], name in nullable)
+            for j, (previous, _) in enumerate(ordering[:i]):
+                step &= equal(previous, values[j])
+            condition |= step
+        return condition
+
+    def position(self, row) -> list:
+        values = []
+        for name, _ in self.ordering:
+            obj = row
+            *path, last = name.split("__")
+            try:
+                for attr in path:
+                    obj = getattr(obj, attr)
+                    if obj is None:
+                        break
+            except ObjectDoesNotExist:
+                # A missing reverse one-to-one row.
+                obj = None
+            if obj is None:
+                value = None
+            elif last == "pk":
+                value = obj.pk
+            else:
+                try:
+                    value = getattr(obj, obj._meta.get_field(last).attname)
+                except (AttributeError, FieldDoesNotExist):
+                    value = getattr(obj, last)
+            if isinstance(value, (Decimal, date, datetime)):
+                value = value.isoformat() if not isinstance(value, Decimal) else str(value)
+            values.append(value)
+        return values
+
+    def encode_cursor(self, row, reverse: bool) -> str:
+        payload = json.dumps({"v": self.position(row), "r": int(reverse)}, separators=(",", ":"))
+        encoded = b64encode(payload.encode()).decode("ascii")
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request) -> dict | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode("ascii")))
+            if not isinstance(cursor["v"], list) or len(cursor["v"]) != len(self.ordering):
+                raise ValueError
+            return cursor
+        except (TypeError, ValueError, KeyError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+def nullable(model, name: str) -> bool:
+    """Whether the ordering column ``name`` can be NULL, through its own field or an optional relation."""
+    *path, last = name.split("__")
+    try:
+        for attr in path:
+            field = model._meta.get_field(attr)
+            # Reverse relations may have no row; forward ones may be NULL.
+            if not field.concrete or field.null:
+                return True
+            model = field.related_model
+        return last != "pk" and model._meta.get_field(last).null
+    except FieldDoesNotExist:
+        # Annotations.
+        return False
+
+
+def equal(name: str, value) -> Q:
+    return Q(**{f"{name}__isnull": True}) if value is None else Q(**{name: value})
+
+
+def after(name: str, descending: bool, value, nullable: bool) -> Q:
+    """Rows whose ``name`` sorts after ``value``, with NULL as the greatest value."""
+    if value is None:
+        return Q(**{f"{name}__isnull": False}) if descending else Q(pk__in=[])
+    step = Q(**{f"{name}__{'lt' if descending else 'gt'}": value})
+    if nullable and not descending:
+        step |= Q(**{f"{name}__isnull": True})
+    return step
+
@@ -0,0 +1,93 @@
+import hashlib
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# True while a request whose reads may be served by a replica is handled.
+# Outside such requests (writes, management commands, tests) every query
+# goes to the primary.
+_reads_from_replica = ContextVar("reads_from_replica", default=False)
+
+
+def read_from_replica(enabled: bool) -> None:
+    _reads_from_replica.set(enabled)
+
+
+def user_id(request):
+    """Id of the user behind ``request``, known before DRF authenticates it; None if anonymous."""
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return user.pk
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else None
+    if raw_token is None:
+        return None
+    try:
+        # Only the signature and expiry: the user row is loaded by the view.
+        return authentication.get_validated_token(raw_token).get(api_settings.USER_ID_CLAIM)
+    except InvalidToken:
+        return None
+
+
+def pin_key(request) -> str:
+    """Cache key of the client behind ``request``: its user, else its session, else its address.
+
+    The user rather than its token, so that refreshing the token keeps the pin.
+    """
+    client = user_id(request)
+    if client is not None:
+        client = f"user:{client}"
+    elif request.COOKIES.get(settings.SESSION_COOKIE_NAME):
+        client = "session:" + request.COOKIES[settings.SESSION_COOKIE_NAME]
+    else:
+        client = "address:" + request.META.get("REMOTE_ADDR", "")
+    return "replica:pin:" + hashlib.sha256(client.encode()).hexdigest()
+
+
+def pin(request) -> None:
+    """Keep the client's reads on the primary until its write has reached the replicas.
+
+    Pins live in the default cache, which must be shared by every worker
+    (checked by ``credibuy.checks``).
+    """
+    cache.set(pin_key(request), 1, settings.REPLICA_STICKY_SECONDS)
+
+
+async def apin(request) -> None:
+    # A session's user is loaded lazily, with a query.
+    await cache.aset(await sync_to_async(pin_key)(request), 1, settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(request) -> bool:
+    return cache.get(pin_key(request)) is not None
+
+
+class ReplicaRouter:
+    """Send reads to a replica in ``REPLICA_DATABASES`` when the request allows it; writes to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == "django_cache":
+            # The database cache is read where it was just written.
+            return DEFAULT_DB_ALIAS
+        if settings.REPLICA_DATABASES and _reads_from_replica.get():
+            return random.choice(settings.REPLICA_DATABASES)
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Also for instances that were read from a replica.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows, so relations across them are fine.
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
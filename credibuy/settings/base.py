@@ -39,12 +39,15 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'authtools',
     'rest_framework',
+    'credibuy',
     'products',
     'users',
     'payments'
 ]
 
 MIDDLEWARE = [
+    'credibuy.middleware.QueryCountMiddleware',
+    'credibuy.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +58,8 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'credibuy.urls'
+# Served under ASGI (credibuy.asgi): the same routes with async read views.
+ASGI_URLCONF = 'credibuy.asgi_urls'
 
 TEMPLATES = [
     {
@@ -85,6 +90,27 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# The catalog response cache, replica pins and the versions that invalidate
+# cached responses and users' auth state live here. This
+# in-process cache is only coherent within one process: deployments with more
+# than one worker need a shared backend, which `check --deploy` enforces.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Aliases of read replicas of 'default'. Views list the actions that may read
+# from them in `replica_reads`; a client that wrote stays on the primary for
+# REPLICA_STICKY_SECONDS.
+DATABASE_ROUTERS = ['credibuy.replicas.ReplicaRouter']
+REPLICA_DATABASES = []
+REPLICA_STICKY_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -117,6 +143,12 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.1/howto/static-files/
+
+STATIC_URL = 'static/'
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -131,8 +163,26 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.DjangoModelPermissions'
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication'
+        'credibuy.authentication.CachedJWTAuthentication'
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'credibuy.pagination.KeysetPagination',
     'PAGE_SIZE': 2
-}
\ No newline at end of file
+}
+
+# Seconds a worker reuses the user and permissions resolved for a token;
+# changes to them take effect on the next request regardless, through
+# versions kept in the shared cache (see CACHES).
+AUTH_CACHE_TIMEOUT = 60
+AUTH_CACHE_MAX_ENTRIES = 10_000
+
+# Outbox workers (manage.py process_outbox): events claimed per batch, how long
+# a claim holds before another worker may take the events over, and the
+# exponential backoff of a failing event until it is kept as failed.
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_LEASE_SECONDS = 300
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_SECONDS = 10
+OUTBOX_MAX_RETRY_SECONDS = 3600
+# How often a worker folds the appended cashflow deltas into the month rows,
+# which bounds what the cashflow report reads besides them.
+CASHFLOW_COMPACT_SECONDS = 60
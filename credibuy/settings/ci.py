@@ -10,5 +10,10 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3"
+    },
+    # Only created for the tests that declare it; stands in for a replica.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "replica.sqlite3"
     }
-}
\ No newline at end of file
+}
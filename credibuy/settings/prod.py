@@ -1,5 +1,6 @@
 from .base import *
 
+import copy
 
 from decouple import config
 
@@ -10,6 +11,8 @@ DEBUG = config("DEBUG")
 ALLOWED_HOSTS = config("DJANGO_ALLOWED_HOSTS").split()
 
 MIDDLEWARE = [
+    "credibuy.middleware.QueryCountMiddleware",
+    "credibuy.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -38,6 +41,58 @@ DATABASES = {
         "USER": config("DB_USER"),
         "PASSWORD": config("DB_PASSWORD"),
         "HOST": config("DB_HOST"),
-        "PORT": config("DB_PORT")
+        "PORT": config("DB_PORT"),
+        # Check a reused connection before handing it to a request.
+        "CONN_HEALTH_CHECKS": config("DB_CONN_HEALTH_CHECKS", default=True, cast=bool),
+        "OPTIONS": {},
     }
-}
\ No newline at end of file
+}
+
+# A psycopg 3 connection pool shared by the process's threads. Under uvicorn
+# the sync code runs in a thread per request, so persistent connections,
+# which are per thread, would pile up without being reused or closed; without
+# the pool (DB_POOL=False) each request opens its own unless DB_CONN_MAX_AGE
+# is raised, which only suits a WSGI deployment. Django refuses to combine
+# the pool with persistent connections.
+if config("DB_POOL", default=True, cast=bool):
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": config("DB_POOL_MIN_SIZE", default=2, cast=int),
+        "max_size": config("DB_POOL_MAX_SIZE", default=10, cast=int),
+        # Seconds a request waits for a free connection before failing.
+        "timeout": config("DB_POOL_TIMEOUT", default=10, cast=float),
+        "max_idle": config("DB_POOL_MAX_IDLE", default=300, cast=float),
+        "max_lifetime": config("DB_POOL_MAX_LIFETIME", default=3600, cast=float),
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = config("DB_CONN_MAX_AGE", default=0, cast=int)
+
+# Shared by every worker: Redis at REDIS_URL, else a table in the primary
+# (manage.py createcachetable).
+if config("REDIS_URL", default=""):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": config("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "credibuy_cache",
+        }
+    }
+
+# Optional streaming replica of the primary, for list, search and report reads.
+if config("DB_REPLICA_HOST", default=""):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": config("DB_REPLICA_HOST"),
+        "PORT": config("DB_REPLICA_PORT", default=DATABASES["default"]["PORT"]),
+        "OPTIONS": copy.deepcopy(DATABASES["default"]["OPTIONS"]),
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_DATABASES = ["replica"]
+# Longer than the replication lag the primary is monitored for.
+REPLICA_STICKY_SECONDS = config("DB_REPLICA_STICKY_SECONDS", default=5, cast=int)
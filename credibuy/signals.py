@@ -0,0 +1,44 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import authentication
+
+User = get_user_model()
+
+# Only after the change: m2m "pre_*" and the "post_*" twin both fire.
+M2M_ACTIONS = {"post_add", "post_remove", "post_clear"}
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    authentication.invalidate(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def user_permissions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in M2M_ACTIONS:
+        return
+    if not reverse:
+        authentication.invalidate(instance.pk)
+    elif isinstance(instance, Group) and pk_set:
+        # group.user_set.add(...) names the users.
+        authentication.invalidate(*pk_set)
+    else:
+        # A permission or group cleared of its users; which ones is unknown by now.
+        authentication.invalidate()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def group_permissions_changed(sender, action, **kwargs):
+    if action in M2M_ACTIONS:
+        authentication.invalidate()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def group_deleted(sender, **kwargs):
+    authentication.invalidate()
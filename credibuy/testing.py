@@ -0,0 +1,127 @@
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.cache import cache
+from django.db import OperationalError, connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from credibuy.middleware import query_budget
+
+# Tables owned by the project's apps; framework tables are not checked.
+APP_TABLE = re.compile(r'FROM "(payments_|products_|users_)')
+
+
+def explain(sql: str, using: str = "default") -> list[str]:
+    """Return the plan lines of an already-interpolated SELECT."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            # With sequential scans priced out, a Seq Scan in the plan means no index applies.
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN " + sql)
+            return [row[0] for row in cursor.fetchall()]
+        if connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql)
+            return [row[-1] for row in cursor.fetchall()]
+    raise NotImplementedError(f"EXPLAIN is not supported for {connection.vendor}")
+
+
+def full_scans(sql: str, plan: list[str]) -> list[str]:
+    """Plan lines that read a whole table instead of an index range.
+
+    A bare walk over an unfiltered table is allowed because paginated lists
+    stop at their LIMIT; it is flagged as soon as the query filters rows or has
+    to sort the whole table.
+    """
+    filtered = " WHERE " in sql
+    sorted_in_full = any("TEMP B-TREE FOR ORDER BY" in line for line in plan)
+    flagged = []
+    for line in plan:
+        if "Seq Scan on" in line:
+            flagged.append(line.strip())
+        elif re.match(r"\s*SCAN \S+$", line) and (filtered or sorted_in_full):
+            flagged.append(line.strip())
+    return flagged
+
+
+def run_concurrently(task, jobs, threads: int) -> list:
+    """Call ``task(job)`` for every job from ``threads`` threads; returns the results in completion order.
+
+    Each thread uses its own database connection. In-memory SQLite reports
+    lock contention instead of waiting, so a call that fails with
+    ``OperationalError`` is retried.
+    """
+    jobs = iter(jobs)
+    lock = threading.Lock()
+    results = []
+    done = object()
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    job = next(jobs, done)
+                if job is done:
+                    return
+                while True:
+                    try:
+                        result = task(job)
+                        break
+                    except OperationalError:
+                        time.sleep(0.001)
+                with lock:
+                    results.append(result)
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return results
+
+
+class CacheIsolationMixin:
+    """Start every test with an empty cache.
+
+    Cached responses and versions outlive the rows a test rolls back, and
+    rolled back rows fire no invalidation.
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+
+class QueryPlanMixin:
+    """Assertions over the plans of queries captured with CaptureQueriesContext."""
+
+    def assertNoFullTableScans(self, captured_queries, using: str = "default", msg: str = ""):
+        for query in captured_queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT") or not APP_TABLE.search(sql):
+                continue
+            plan = explain(sql, using)
+            scans = full_scans(sql, plan)
+            if scans:
+                self.fail(f"{msg}Full table scan in {sql}\n" + "\n".join(plan))
+
+
+class QueryBudgetMixin:
+    """Run a request and fail if it exceeds the ``query_budget`` its view declares."""
+
+    def assertWithinQueryBudget(self, method: str, url: str, data=None, **extra):
+        budget = query_budget(resolve(urlsplit(url).path).func, method)
+        self.assertIsNotNone(budget, f"{method} {url} declares no query budget")
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method.lower())(url, data, **extra)
+        if len(queries) > budget:
+            self.fail(
+                f"{method} {url} ran {len(queries)} queries, over its budget of {budget}:\n"
+                + "\n".join(query["sql"] for query in queries.captured_queries)
+            )
+        return response
@@ -0,0 +1,663 @@
+import asyncio
+import os
+import tempfile
+import time
+import warnings
+from datetime import date, timedelta
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db import connection, connections
+from django.db.models import F
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.test import APIRequestFactory
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from credibuy.money import MoneySerializerField, from_cents, to_cents
+from credibuy.testing import CacheIsolationMixin, QueryBudgetMixin, QueryPlanMixin
+from credibuy import dbpool
+from credibuy.checks import check_replica_pins, check_shared_cache
+from credibuy.authentication import CachedJWTAuthentication, invalidate
+from credibuy.middleware import QueryStats, query_budget
+from credibuy.urls import router, urlpatterns
+from payments.models import ClientPortfolio, Credit, Payment
+from payments.portfolio import rebuild_chunk
+from products.models import Product, ProductType
+from users.models import Client
+from users.search import ClientSearchFilter
+from users.views import ClientViewSet
+
+APPS = ("credibuy", "payments", "products", "users")
+# Their query count grows with the size of the submitted batch.
+UNBUDGETED_VIEWS = {"CreditBulkCreationView"}
+
+
+def seed(clients=300, product_types=20, products=60, credits=600, payments_per_credit=6):
+    ProductType.objects.bulk_create(
+        ProductType(name=f"Type {i}", status="active" if i % 4 else "inactive") for i in range(product_types)
+    )
+    types = list(ProductType.objects.all())
+    Product.objects.bulk_create(
+        Product(
+            name=f"Product {i}",
+            price=100000 + i * 3700,
+            product_type=types[i % len(types)],
+            description="seeded",
+            stock=100,
+        )
+        for i in range(products)
+    )
+    Client.objects.bulk_create(
+        Client(
+            first_name=f"First{i % 97}",
+            last_name=f"Last{i}",
+            email=f"client{i}@example.com",
+            is_active=bool(i % 5),
+            address="Seed street",
+            phone=f"300{i:07d}",
+        )
+        for i in range(clients)
+    )
+    client_ids = list(Client.objects.values_list("id", flat=True))
+    product_ids = list(Product.objects.values_list("id", flat=True))
+    Credit.objects.bulk_create(
+        Credit(
+            client_id=client_ids[i % len(client_ids)],
+            product_id=product_ids[i % len(product_ids)],
+            status="active" if i % 3 else "completed",
+            debt=500000 + i,
+            total_payments=payments_per_credit,
+        )
+        for i in range(credits)
+    )
+    today = date.today()
+    Payment.objects.bulk_create(
+        Payment(
+            credit_id=credit_id,
+            value=10000,
+            value_delayed=11200,
+            due_to=today + timedelta(days=30 * n),
+            status="pending",
+        )
+        for credit_id in Credit.objects.values_list("id", flat=True)
+        for n in range(payments_per_credit)
+    )
+    rebuild_chunk(client_ids)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def lookup(obj, path: str):
+    for attr in path.split("__"):
+        obj = getattr(obj, attr)
+    return str(obj)
+
+
+class QueryPlanTests(CacheIsolationMixin, QueryPlanMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed()
+        User = get_user_model()
+        cls.user = User.objects.create_superuser(email="plans@example.com", password="12345")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user)
+
+    def list_requests(self):
+        for prefix, viewset, basename in router.registry:
+            url = reverse(f"{basename}-list")
+            sample = viewset.queryset.model.objects.order_by("pk")[7]
+            yield url, {}
+            for field in getattr(viewset, "filterset_fields", []):
+                yield url, {field: lookup(sample, field)}
+            for field in getattr(viewset, "ordering_fields", []):
+                yield url, {"ordering": field}
+                yield url, {"ordering": f"-{field}"}
+            if ClientSearchFilter in getattr(viewset, "filter_backends", []):
+                yield url, {"search": "first1 last"}
+        credit = Credit.objects.order_by("pk")[7]
+        yield reverse("payment-by-credit", kwargs={"credit_id": credit.pk}), {}
+
+    def test_list_and_filter_queries_use_indexes(self):
+        for url, params in self.list_requests():
+            with self.subTest(url=url, params=params):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertNoFullTableScans(queries.captured_queries, msg=f"{url} {params}: ")
+
+
+class KeysetPaginationTests(CacheIsolationMixin, QueryPlanMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed(clients=40, product_types=4, products=12, credits=50, payments_per_credit=2)
+        User = get_user_model()
+        cls.user = User.objects.create_superuser(email="pages@example.com", password="12345")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user)
+
+    def walk(self, url, params=None):
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            if not response.data["next"]:
+                return pages
+            response = self.client.get(response.data["next"])
+
+    def test_pages_follow_the_viewset_ordering(self):
+        cases = [
+            (reverse("credits-list"), {}, Credit.objects.order_by("debt", "created_at", "pk"), "id"),
+            (reverse("credits-list"), {"ordering": "-created_at"}, Credit.objects.order_by("-created_at", "-pk"), "id"),
+            (reverse("payment-list"), {}, Payment.objects.order_by("pk"), "id"),
+            (reverse("product-list"), {}, Product.objects.order_by("name", "price", "product_type", "pk"), "id"),
+            (reverse("client-list"), {"page_size": 7}, Client.objects.order_by("first_name", "last_name", "pk"), "email"),
+        ]
+        for url, params, expected, key in cases:
+            with self.subTest(url=url, params=params):
+                pages = self.walk(url, params)
+                keys = [row[key] for page in pages for row in page["results"]]
+                self.assertEqual(keys, list(expected.values_list(key, flat=True)))
+
+    def test_pages_through_optional_relations(self):
+        # Clients created in bulk have no portfolio row; they sort as NULL, after every value.
+        ClientPortfolio.objects.filter(client__in=Client.objects.order_by("pk")[:25:2]).delete()
+        debt = F("portfolio__outstanding_debt")
+        cases = [
+            ("portfolio__outstanding_debt", [debt.asc(nulls_last=True), "pk"]),
+            ("-portfolio__outstanding_debt", [debt.desc(nulls_first=True), "-pk"]),
+        ]
+        for ordering, expected in cases:
+            with self.subTest(ordering=ordering):
+                pages = self.walk(reverse("client-list"), {"ordering": ordering, "page_size": 6})
+                emails = [row["email"] for page in pages for row in page["results"]]
+                self.assertEqual(emails, list(Client.objects.order_by(*expected).values_list("email", flat=True)))
+                backwards = self.client.get(pages[-1]["previous"])
+                self.assertEqual(backwards.data["results"], pages[-2]["results"])
+
+    def test_previous_links_walk_back(self):
+        pages = self.walk(reverse("client-list"), {"page_size": 9})
+        response = self.client.get(pages[-1]["previous"])
+        self.assertEqual(response.data["results"], pages[-2]["results"])
+        self.assertEqual(response.data["next"] is not None, True)
+        while response.data["previous"]:
+            response = self.client.get(response.data["previous"])
+        self.assertEqual(response.data["results"], pages[0]["results"])
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        pages = self.walk(reverse("payment-list"), {"page_size": 10})
+        for url in (reverse("payment-list") + "?page_size=10", pages[-2]["next"]):
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                self.assertEqual(len(queries), 1)
+                self.assertNotIn("OFFSET", queries[0]["sql"])
+                self.assertNoFullTableScans(queries.captured_queries)
+
+    def test_page_size_is_capped(self):
+        response = self.client.get(reverse("payment-list"), {"page_size": 10_000})
+        self.assertEqual(len(response.data["results"]), 100)
+
+    def test_page_number_mode_is_kept_behind_page_param(self):
+        # Its COUNT(*) is added to the list's query budget.
+        with self.assertNoLogs("credibuy.middleware", "WARNING"):
+            response = self.client.get(reverse("client-list"), {"page": 2})
+        self.assertEqual(response.data["count"], Client.objects.count())
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse("client-list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AsyncReadPathTests(CacheIsolationMixin, APITestCase):
+    """The async views served under ASGI answer exactly like the viewsets."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(clients=20, product_types=3, products=6, credits=12, payments_per_credit=3)
+        User = get_user_model()
+        cls.user = User.objects.create_superuser(email="async@example.com", password="12345")
+        cls.credit = Credit.objects.order_by("pk")[3]
+        cls.product = Product.objects.order_by("pk")[2]
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user)
+        self.auth = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    def aget(self, url, params=None, **headers):
+        with override_settings(ROOT_URLCONF=settings.ASGI_URLCONF):
+            return async_to_sync(self.async_client.get)(url, params or {}, headers={**self.auth, **headers})
+
+    def requests(self):
+        return [
+            (reverse("credits-list"), {}),
+            (reverse("credits-list"), {"search": "active", "ordering": "-created_at", "page_size": 5}),
+            (reverse("credits-detail", kwargs={"pk": self.credit.pk}), {}),
+            (reverse("payment-by-credit", kwargs={"credit_id": self.credit.pk}), {}),
+            (reverse("product-list"), {"page_size": 4}),
+            (reverse("product-detail", kwargs={"pk": self.product.pk}), {}),
+        ]
+
+    def test_async_views_match_the_viewsets(self):
+        for url, params in self.requests():
+            with self.subTest(url=url, params=params):
+                with override_settings(ROOT_URLCONF=settings.ASGI_URLCONF):
+                    self.assertTrue(iscoroutinefunction(resolve(url).func.view_class.get))
+                expected = self.client.get(url, params)
+                cache.clear()
+                response = self.aget(url, params)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response.json(), expected.json())
+
+    def test_async_views_stay_within_the_viewset_budget(self):
+        for url, params in self.requests():
+            with self.subTest(url=url, params=params):
+                with override_settings(ROOT_URLCONF=settings.ASGI_URLCONF):
+                    budget = query_budget(resolve(url).func, "GET")
+                with CaptureQueriesContext(connection) as queries:
+                    self.aget(url, params)
+                # One more for the user row, loaded by the first request with the token.
+                self.assertLessEqual(len(queries), budget + 1)
+
+    def test_cursor_links_and_catalog_cache(self):
+        first = self.aget(reverse("credits-list"), {"page_size": 5}).json()
+        second = self.aget(first["next"]).json()
+        self.assertEqual(second, self.client.get(first["next"]).json())
+
+        url = reverse("product-detail", kwargs={"pk": self.product.pk})
+        self.assertEqual(self.aget(url)["X-Cache"], "MISS")
+        cached = self.aget(url)
+        self.assertEqual(cached["X-Cache"], "HIT")
+        self.assertEqual(self.aget(url, If_None_Match=cached["ETag"]).status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_exports_stream_asynchronously(self):
+        async def read(response):
+            return b"".join([part async for part in response])
+
+        url = reverse("credits-export")
+        expected = b"".join(self.client.get(url, {"file_format": "jsonl"}).streaming_content)
+        with warnings.catch_warnings():
+            # Django's warning when it reads a sync iterator into memory.
+            warnings.simplefilter("error")
+            response = self.aget(url, {"file_format": "jsonl"})
+            self.assertTrue(response.is_async)
+            self.assertEqual(async_to_sync(read)(response), expected)
+        self.assertEqual(len(expected.splitlines()), Credit.objects.count())
+
+    def test_errors_are_rendered_like_drf(self):
+        self.auth = {}
+        self.assertEqual(self.aget(reverse("credits-list")).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.auth = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+        response = self.aget(reverse("credits-detail", kwargs={"pk": 0}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json(), {"detail": "No Credit matches the given query."})
+
+
+class QueryBudgetTests(CacheIsolationMixin, QueryBudgetMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed(clients=30, product_types=4, products=8, credits=40, payments_per_credit=6)
+        User = get_user_model()
+        cls.user = User.objects.create_user(email="budget@example.com", password="12345")
+        cls.user.user_permissions.add(*Permission.objects.all())
+        cls.credit = Credit.objects.order_by("pk").first()
+        cls.payment = Payment.objects.filter(credit=cls.credit).first()
+        cls.product = Product.objects.order_by("pk").first()
+        cls.product_type = ProductType.objects.order_by("pk").first()
+        cls.client_record = Client.objects.order_by("pk").first()
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user)
+
+    def authenticate(self):
+        # A fresh user per request, as JWT authentication would load, so
+        # permission lookups are not served from a previous request's cache.
+        self.client.force_authenticate(user=get_user_model().objects.get(pk=self.user.pk))
+
+    def endpoint_requests(self):
+        credit = {"client": self.client_record.pk, "product": self.product.pk, "total_payments": 12}
+        product = {
+            "name": "Budget product",
+            "price": "1500.00",
+            "product_type": self.product_type.pk,
+            "description": "budget",
+            "stock": 10,
+        }
+        client = {
+            "first_name": "Budget",
+            "last_name": "Client",
+            "email": "budget-client@example.com",
+            "is_active": True,
+            "address": "Budget street",
+            "phone": "3000000000",
+        }
+        return [
+            ("GET", reverse("credits-list"), None),
+            ("GET", reverse("credits-list"), {"status": "active", "ordering": "-created_at"}),
+            ("GET", reverse("credits-detail", kwargs={"pk": self.credit.pk}), None),
+            ("GET", reverse("payment-list"), None),
+            ("GET", reverse("payment-detail", kwargs={"pk": self.payment.pk}), None),
+            ("GET", reverse("payment-by-credit", kwargs={"credit_id": self.credit.pk}), None),
+            ("PATCH", reverse("payment-detail", kwargs={"pk": self.payment.pk}), {"status": "completed"}),
+            ("GET", reverse("producttype-list"), None),
+            ("GET", reverse("producttype-detail", kwargs={"pk": self.product_type.pk}), None),
+            ("POST", reverse("producttype-list"), {"name": "Budget type", "status": "active"}),
+            ("PATCH", reverse("producttype-detail", kwargs={"pk": self.product_type.pk}), {"status": "inactive"}),
+            ("GET", reverse("product-list"), None),
+            ("GET", reverse("product-detail", kwargs={"pk": self.product.pk}), None),
+            ("POST", reverse("product-list"), product),
+            ("PATCH", reverse("product-detail", kwargs={"pk": self.product.pk}), {"stock": 20}),
+            ("GET", reverse("client-list"), None),
+            ("GET", reverse("client-detail", kwargs={"pk": self.client_record.pk}), None),
+            ("POST", reverse("client-list"), client),
+            ("PATCH", reverse("client-detail", kwargs={"pk": self.client_record.pk}), {"phone": "3111111111"}),
+            ("POST", reverse("credit-create"), credit),
+            ("GET", reverse("credit-quote"), {"product": self.product.pk, "total_payments": "6,12"}),
+            ("GET", reverse("cashflow-report"), {"months": 24}),
+            ("DELETE", reverse("product-detail", kwargs={"pk": self.product.pk}), None),
+            ("DELETE", reverse("client-detail", kwargs={"pk": self.client_record.pk}), None),
+            ("DELETE", reverse("producttype-detail", kwargs={"pk": self.product_type.pk}), None),
+        ]
+
+    def test_endpoints_stay_within_query_budget(self):
+        for method, url, data in self.endpoint_requests():
+            with self.subTest(method=method, url=url):
+                self.authenticate()
+                extra = {} if method == "GET" else {"format": "json"}
+                response = self.assertWithinQueryBudget(method, url, data, **extra)
+                self.assertLess(response.status_code, 400, response.data)
+
+    def test_every_api_view_declares_a_budget(self):
+        views = [viewset for _, viewset, _ in router.registry]
+        views += [
+            pattern.callback.cls
+            for pattern in urlpatterns
+            if getattr(pattern, "callback", None) and pattern.callback.__module__.split(".")[0] in APPS
+        ]
+        views = [view for view in views if view.__name__ not in UNBUDGETED_VIEWS]
+        for view in views:
+            with self.subTest(view=view.__name__):
+                self.assertTrue(getattr(view, "query_budget", None))
+
+    @override_settings(DEBUG=True)
+    def test_query_count_headers(self):
+        response = self.client.get(reverse("credits-list"))
+        self.assertEqual(response["X-DB-Query-Count"], "1")
+        self.assertEqual(response["X-DB-Query-Budget"], "1")
+        self.assertEqual(response["X-DB-Repeated-Queries"], "0")
+        self.assertIn("X-DB-Time-ms", response)
+
+    def test_repeated_queries_are_flagged(self):
+        stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            for credit in Credit.objects.all()[:5]:
+                str(credit.client)
+        self.assertEqual(stats.count, 6)
+        self.assertEqual(len(stats.repeated()), 1)
+
+
+class ASGIQueryCountTests(CacheIsolationMixin, TransactionTestCase):
+    """Queries are counted in the threads that ``sync_to_async`` runs the ORM in, as under uvicorn."""
+
+    def setUp(self):
+        super().setUp()
+        seed(clients=5, product_types=2, products=3, credits=4, payments_per_credit=2)
+        user = get_user_model().objects.create_superuser(email="asgi-count@example.com", password="12345")
+        self.auth = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+
+    def serve(self, url):
+        # On a loop of its own rather than through async_to_sync, which would
+        # run the sync code back on this thread and its connections.
+        with override_settings(ROOT_URLCONF=settings.ASGI_URLCONF, DEBUG=True):
+            return asyncio.run(self.async_client.get(url, headers=self.auth))
+
+    def test_queries_run_in_executor_threads_are_counted(self):
+        for url in (reverse("credits-list"), reverse("client-list")):
+            with self.subTest(url=url):
+                response = self.serve(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertGreater(int(response["X-DB-Query-Count"]), 0)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    database_cache = {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "credibuy_cache"}
+
+    def test_deployments_need_a_shared_cache(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ["credibuy.E001"])
+        with override_settings(CACHES={"default": self.database_cache}):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_replicas_need_a_shared_cache(self):
+        self.assertEqual(check_replica_pins(None), [])
+        with override_settings(REPLICA_DATABASES=["replica"]):
+            self.assertEqual([error.id for error in check_replica_pins(None)], ["credibuy.E002"])
+            with override_settings(CACHES={"default": self.database_cache}):
+                self.assertEqual(check_replica_pins(None), [])
+
+
+class MoneyTests(SimpleTestCase):
+    def test_to_cents_rounds_half_up(self):
+        self.assertEqual(to_cents("10.005"), 1001)
+        self.assertEqual(to_cents("10.004"), 1000)
+        self.assertEqual(to_cents(Decimal("-0.005")), -1)
+        self.assertEqual(to_cents(12), 1200)
+        self.assertEqual(str(from_cents(5)), "0.05")
+        self.assertEqual(str(from_cents(0)), "0.00")
+
+    def test_serializer_field_parses_amounts_to_cents(self):
+        field = MoneySerializerField()
+        self.assertEqual(field.to_internal_value("1234.56"), 123456)
+        self.assertEqual(field.to_internal_value(7), 700)
+        self.assertEqual(field.to_representation(123456), "1234.56")
+        for invalid in ("12.345", "abc", "NaN", "", True):
+            with self.assertRaises(ValidationError):
+                field.to_internal_value(invalid)
+
+
+class ConnectionReuseTests(SimpleTestCase):
+    """Persistent connections survive between requests; a file SQLite database stands in for Postgres."""
+
+    @classmethod
+    def setUpClass(cls):
+        # Declared here rather than on the class: the test runner would try to
+        # create a test database for it.
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings["standin"] = {
+            **connections.settings["default"],
+            "NAME": os.path.join(cls.directory.name, "standin.sqlite3"),
+            "CONN_HEALTH_CHECKS": True,
+        }
+        cls.databases = {"standin"}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["standin"].close()
+        del connections["standin"]
+        del connections.settings["standin"]
+        cls.directory.cleanup()
+
+    def setUp(self):
+        connections["standin"].close()
+        self.connects = dbpool.stats("standin")["connects"]
+
+    def serve(self, requests=3):
+        # The request lifecycle of the WSGI and ASGI handlers.
+        for _ in range(requests):
+            request_started.send(sender=self.__class__)
+            with connections["standin"].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            request_finished.send(sender=self.__class__)
+        return dbpool.stats("standin")["connects"] - self.connects
+
+    def test_persistent_connection_is_reused_across_requests(self):
+        connections["standin"].settings_dict["CONN_MAX_AGE"] = 60
+        self.assertEqual(self.serve(), 1)
+        self.assertIsNone(dbpool.stats("standin")["pool"])
+
+    def test_connection_per_request_without_max_age(self):
+        connections["standin"].settings_dict["CONN_MAX_AGE"] = 0
+        self.assertEqual(self.serve(), 3)
+
+    def test_connection_is_replaced_after_max_age(self):
+        connections["standin"].settings_dict["CONN_MAX_AGE"] = 60
+        self.serve(requests=1)
+        connections["standin"].close_at = time.monotonic() - 1
+        self.assertEqual(self.serve(requests=2), 2)
+
+
+class DatabasePoolStatsTests(APITestCase):
+    def test_admins_read_the_pool_stats(self):
+        url = reverse("db-pool-stats")
+        user = get_user_model().objects.create_user(email="pool-user@example.com", password="12345")
+        self.client.force_authenticate(user=user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        admin = get_user_model().objects.create_superuser(email="pool-admin@example.com", password="12345")
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["default"]["vendor"], connection.vendor)
+        self.assertGreater(response.data["default"]["requests"], 0)
+
+
+@override_settings(REPLICA_DATABASES=["replica"])
+class ReplicaRoutingTests(CacheIsolationMixin, APITestCase):
+    """Two SQLite databases holding different rows show which one served a request."""
+
+    databases = {"default", "replica"}
+
+    @classmethod
+    def setUpTestData(cls):
+        for alias in ("default", "replica"):
+            Client.objects.using(alias).create(
+                first_name=alias, last_name="Reader", email=f"{alias}@example.com",
+                is_active=True, address="Street 1", phone="555",
+            )
+        # Requests authenticate with tokens, whose users are read from the replica too.
+        cls.admin = get_user_model().objects.create_superuser(email="replica-admin@example.com", password="12345")
+        cls.reader = get_user_model().objects.create_superuser(email="replica-reader@example.com", password="12345")
+        for user in (cls.admin, cls.reader):
+            user.save(using="replica")
+
+    def setUp(self):
+        super().setUp()
+        self.auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(self.admin)}"}
+
+    def names(self, user=None) -> list[str]:
+        auth = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"} if user else self.auth
+        response = self.client.get(reverse("client-list"), **auth)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row["first_name"] for row in response.data["results"]]
+
+    def test_list_and_report_reads_go_to_the_replica(self):
+        self.assertEqual(self.names(), ["replica"])
+        response = self.client.get(reverse("client-export"), {"file_format": "jsonl"}, **self.auth)
+        self.assertIn(b'"first_name":"replica"', b"".join(response.streaming_content))
+
+    def test_other_reads_stay_on_the_primary(self):
+        primary = Client.objects.using("default").get()
+        response = self.client.get(reverse("client-detail", kwargs={"pk": primary.pk}), **self.auth)
+        self.assertEqual(response.data["first_name"], "default")
+        with override_settings(REPLICA_DATABASES=[]):
+            self.assertEqual(self.names(), ["default"])
+
+    def test_writes_go_to_the_primary_and_pin_the_writer(self):
+        response = self.client.post(reverse("client-list"), {
+            "first_name": "new", "last_name": "Reader", "email": "new@example.com",
+            "is_active": True, "address": "Street 2", "phone": "556",
+        }, **self.auth)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Client.objects.using("default").filter(email="new@example.com").exists())
+        self.assertFalse(Client.objects.using("replica").filter(email="new@example.com").exists())
+
+        # The writer reads its own write, also with a refreshed token; other clients keep reading the replica.
+        self.assertEqual(self.names(), ["default", "new"])
+        self.assertEqual(self.names(user=self.admin), ["default", "new"])
+        self.assertEqual(self.names(user=self.reader), ["replica"])
+        # Once the window lapses the writer is back on the replica.
+        cache.clear()
+        self.assertEqual(self.names(), ["replica"])
+
+
+class CachedAuthenticationTests(CacheIsolationMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email="cached-auth@example.com", password="12345")
+        cls.add_client = Permission.objects.get(codename="add_client")
+        cls.view_client = Permission.objects.get(codename="view_client")
+
+    def setUp(self):
+        super().setUp()
+        self.token = AccessToken.for_user(self.user)
+
+    def authenticate(self):
+        request = APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {self.token}")
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        return user
+
+    def test_warm_requests_resolve_user_and_permissions_without_queries(self):
+        self.user.user_permissions.add(self.add_client)
+        self.assertTrue(self.authenticate().has_perm("users.add_client"))
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertEqual(user.pk, self.user.pk)
+            self.assertTrue(user.has_perms(["users.add_client"]))
+            self.assertFalse(user.has_perm("users.delete_client"))
+
+    def test_permission_changes_invalidate(self):
+        self.assertFalse(self.authenticate().has_perm("users.add_client"))
+        self.user.user_permissions.add(self.add_client)
+        self.assertTrue(self.authenticate().has_perm("users.add_client"))
+
+        group = Group.objects.create(name="readers")
+        group.user_set.add(self.user)
+        self.assertFalse(self.authenticate().has_perm("users.view_client"))
+        group.permissions.add(self.view_client)
+        self.assertTrue(self.authenticate().has_perm("users.view_client"))
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_bulk_updates_invalidate_explicitly(self):
+        self.authenticate()
+        # QuerySet.update() sends no signal, so the cached user is still served...
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.authenticate().pk, self.user.pk)
+        # ...until the caller invalidates it.
+        invalidate(self.user.pk)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
+
+    def test_authenticated_request_only_runs_the_view_queries(self):
+        self.user.user_permissions.add(self.view_client)
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {self.token}"}
+        # Loading the user on the first request is not charged to the view's budget.
+        with self.assertNoLogs("credibuy.middleware", "WARNING"):
+            response = self.client.get(reverse("client-list"), **headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("client-list"), **headers)
+        self.assertEqual(len(queries), ClientViewSet.query_budget["list"])
@@ -19,9 +19,17 @@ from django.urls import path, include
 from rest_framework import routers
 from products.views import ProductTypeViewSet, ProductViewSet
 
-from payments.views import CreditCreationView, CreditViewSet, PaymentViewSet
+from payments.views import (
+    CashflowReportView,
+    CreditBulkCreationView,
+    CreditCreationView,
+    CreditQuoteView,
+    CreditViewSet,
+    PaymentViewSet,
+)
 
 from users.views import ClientViewSet
+from credibuy.views import DatabasePoolStatsView
 
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -41,6 +49,10 @@ urlpatterns = [
     path('api-auth/', include('rest_framework.urls')),
     path('api/', include(router.urls)),
     path('api/credits/create/', CreditCreationView.as_view(), name="credit-create"),
+    path('api/credits/bulk-create/', CreditBulkCreationView.as_view(), name="credit-bulk-create"),
+    path('api/credits/quote/', CreditQuoteView.as_view(), name="credit-quote"),
+    path('api/cashflow/', CashflowReportView.as_view(), name="cashflow-report"),
+    path('api/db-pool/', DatabasePoolStatsView.as_view(), name="db-pool-stats"),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]   
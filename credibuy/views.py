@@ -0,0 +1,16 @@
+from django.db import connections
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import dbpool
+
+
+class DatabasePoolStatsView(APIView):
+    """Connection reuse and pool wait/saturation of every database, for this worker process."""
+
+    permission_classes = [IsAdminUser]
+    query_budget = {"get": 0}
+
+    def get(self, request):
+        return Response({alias: dbpool.stats(alias) for alias in connections})
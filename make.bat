@@ -5,6 +5,7 @@ if "%1" == "dependencies" goto dependencies
 if "%1" == "lint" goto lint
 if "%1" == "test" goto test
 if "%1" == "run" goto run
+if "%1" == "worker" goto worker
 if "%1" == "migrate" goto migrate
 if "%1" == "help" goto help
 goto end
@@ -28,6 +29,10 @@ goto end
 python manage.py runserver
 goto end
 
+:worker
+python manage.py process_outbox
+goto end
+
 :migrate
 python manage.py makemigrations
 python manage.py migrate
@@ -39,6 +44,7 @@ echo dependencies       Install python dependencies
 echo lint               Format python files
 echo test               Run Django tests
 echo run                Run Django server
+echo worker             Run the outbox worker
 echo migrate            Apply modifications to Database
 goto end
 
@@ -1,12 +1,18 @@
 from django.contrib import admin
+from django.utils import timezone
 
-from .models import Credit, Payment
+from credibuy.pagination import EstimatedCountPaginator
+from .models import Credit, OutboxEvent, Payment
 
 @admin.register(Credit)
 class CreditAdmin(admin.ModelAdmin):
     list_display = ['id', 'get_client', 'get_product', 'created_at', 'status', 'debt', 'total_payments']
-    search_fields = ['get_client', 'get_product', 'status']
+    list_filter = ['status']
+    search_fields = ['client__email__exact', 'client__last_name__startswith', 'product__name__startswith']
     list_select_related = ['product', 'client']
+    autocomplete_fields = ['client', 'product']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     @admin.display(description="Client")
     def get_client(self, obj: Credit) -> str:
@@ -19,8 +25,16 @@ class CreditAdmin(admin.ModelAdmin):
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ['id', 'get_client', 'get_product', 'value', 'due_to', 'status', 'value_delayed']
-    search_fields = ['get_client', 'get_product', 'status']
-    list_select_related = ['credit']
+    list_filter = ['status']
+    search_fields = [
+        'credit__client__email__exact',
+        'credit__client__last_name__startswith',
+        'credit__product__name__startswith',
+    ]
+    list_select_related = ['credit__client', 'credit__product']
+    autocomplete_fields = ['credit']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     @admin.display(description="Client")
     def get_client(self, obj: Payment) -> str:
@@ -29,3 +43,15 @@ class PaymentAdmin(admin.ModelAdmin):
     @admin.display(description="Product")
     def get_product(self, obj: Payment) -> str:
         return obj.credit.product.__str__()
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'topic', 'status', 'attempts', 'created_at', 'available_at', 'locked_until']
+    list_filter = ['status', 'topic']
+    readonly_fields = ['topic', 'payload', 'attempts', 'created_at', 'locked_by', 'locked_until', 'last_error']
+    actions = ['retry']
+
+    @admin.action(description="Retry the selected events now")
+    def retry(self, request, queryset):
+        updated = queryset.update(status="pending", attempts=0, available_at=timezone.now())
+        self.message_user(request, f"{updated} events queued again")
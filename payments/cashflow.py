@@ -0,0 +1,190 @@
+from collections import defaultdict
+from collections.abc import Iterable
+from datetime import date
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from credibuy.money import Cents
+
+from .models import CashflowDelta, CashflowMonth, Payment
+
+# Expected amount of an installment in each tracked status.
+AMOUNT_FIELDS = {"pending": "value", "delayed": "value_delayed"}
+COMPACT_BATCH_SIZE = 5000
+
+# Writers append signed CashflowDelta rows instead of updating the month rows,
+# which every origination and settlement of the same month would otherwise
+# queue on. Readers add the deltas to CashflowMonth, and ``compact``, run every
+# CASHFLOW_COMPACT_SECONDS by the ``process_outbox`` workers, folds them into
+# it so that the table stays small.
+
+
+def month_of(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def _shift(payments, status: str, sign: int) -> None:
+    """Add (``sign=1``) or remove (``sign=-1``) ``payments`` from their months' ``status`` totals.
+
+    One SELECT of the per-month totals and one INSERT, whatever the number of
+    payments and months.
+    """
+    totals = (
+        payments.annotate(bucket=TruncMonth("due_to"))
+        .order_by()
+        .values("bucket")
+        .annotate(amount=Sum(AMOUNT_FIELDS[status]), installments=Count("pk"))
+    )
+    CashflowDelta.objects.bulk_create(
+        CashflowDelta(
+            month=row["bucket"], status=status, amount=sign * row["amount"], installments=sign * row["installments"]
+        )
+        for row in totals
+    )
+
+
+def _deltas(payment: Payment, sign: int) -> list[CashflowDelta]:
+    field = AMOUNT_FIELDS.get(payment.status)
+    if field is None:
+        return []
+    return [
+        CashflowDelta(
+            month=month_of(payment.due_to), status=payment.status, amount=sign * getattr(payment, field), installments=sign
+        )
+    ]
+
+
+def plans_created(plan: list[Payment]) -> None:
+    """Count the pending installments of freshly originated credits."""
+    _shift(Payment.objects.filter(credit_id__in={payment.credit_id for payment in plan}), "pending", 1)
+
+
+def payment_settled(payment: Payment, was_delayed: bool) -> None:
+    status = "delayed" if was_delayed else "pending"
+    field = AMOUNT_FIELDS[status]
+    CashflowDelta.objects.create(
+        month=month_of(payment.due_to), status=status, amount=-getattr(payment, field), installments=-1
+    )
+
+
+def payment_changed(before: Payment, after: Payment) -> None:
+    """Move a payment edited in place, such as through the API, to its new month, status or amount."""
+    removed, added = _deltas(before, -1), _deltas(after, 1)
+    if [(row.month, row.status, -row.amount) for row in removed] == [
+        (row.month, row.status, row.amount) for row in added
+    ]:
+        return
+    CashflowDelta.objects.bulk_create([*removed, *added])
+
+
+def payments_settled(payment_ids: Iterable[int], delayed_ids: Iterable[int] = ()) -> None:
+    """Remove settled installments; ``delayed_ids`` are those that were delayed before."""
+    delayed_ids = set(delayed_ids)
+    pending_ids = set(payment_ids) - delayed_ids
+    if pending_ids:
+        _shift(Payment.objects.filter(pk__in=pending_ids), "pending", -1)
+    if delayed_ids:
+        _shift(Payment.objects.filter(pk__in=delayed_ids), "delayed", -1)
+
+
+def payments_delayed(payment_ids: Iterable[int]) -> None:
+    """Move installments from the pending to the delayed totals of their month."""
+    payments = Payment.objects.filter(pk__in=list(payment_ids))
+    _shift(payments, "pending", -1)
+    _shift(payments, "delayed", 1)
+
+
+def compact(batch_size: int = COMPACT_BATCH_SIZE) -> int:
+    """Fold the deltas into the month rows; returns how many were folded.
+
+    Only the deltas read are deleted, so ones committed meanwhile wait for the
+    next run instead of being lost, and they are locked, so that concurrent
+    runs do not fold the same ones twice.
+    """
+    folded = 0
+    while True:
+        with transaction.atomic():
+            pending = CashflowDelta.objects.order_by("pk")
+            if connection.features.has_select_for_update_skip_locked:
+                pending = pending.select_for_update(skip_locked=True)
+            deltas = list(pending.values_list("pk", "month", "status", "amount", "installments")[:batch_size])
+            if not deltas:
+                return folded
+            totals = defaultdict(lambda: [0, 0])
+            for _, month, status, amount, installments in deltas:
+                totals[month, status][0] += amount
+                totals[month, status][1] += installments
+            CashflowMonth.objects.bulk_create(
+                [CashflowMonth(month=month, status=status) for month, status in totals], ignore_conflicts=True
+            )
+            for (month, status), (amount, installments) in totals.items():
+                CashflowMonth.objects.filter(month=month, status=status).update(
+                    amount=F("amount") + amount, installments=F("installments") + installments
+                )
+            CashflowDelta.objects.filter(pk__in=[delta[0] for delta in deltas]).delete()
+        folded += len(deltas)
+
+
+def stored_rows(first: date | None = None, last: date | None = None) -> dict[tuple[date, str], tuple[Cents, int]]:
+    """The rollup between the months ``first`` and ``last``: month rows plus pending deltas, in one query."""
+    querysets = [
+        model.objects.order_by().values_list("month", "status", "amount", "installments")
+        for model in (CashflowMonth, CashflowDelta)
+    ]
+    if first is not None:
+        querysets = [queryset.filter(month__gte=first) for queryset in querysets]
+    if last is not None:
+        querysets = [queryset.filter(month__lte=last) for queryset in querysets]
+    rows = defaultdict(lambda: (0, 0))
+    for month, status, amount, installments in querysets[0].union(querysets[1], all=True):
+        stored_amount, stored_installments = rows[month, status]
+        rows[month, status] = (stored_amount + amount, stored_installments + installments)
+    return dict(rows)
+
+
+def expected_rows() -> dict[tuple[date, str], tuple[Cents, int]]:
+    """The rollup as computed from scratch over the payment table."""
+    rows = {}
+    for status, field in AMOUNT_FIELDS.items():
+        totals = (
+            Payment.objects.filter(status=status)
+            .annotate(bucket=TruncMonth("due_to"))
+            .order_by()
+            .values("bucket")
+            .annotate(amount=Sum(field), installments=Count("pk"))
+        )
+        for row in totals:
+            rows[row["bucket"], status] = (row["amount"], row["installments"])
+    return rows
+
+
+@transaction.atomic
+def recompute() -> int:
+    rows = expected_rows()
+    CashflowDelta.objects.all().delete()
+    CashflowMonth.objects.all().delete()
+    CashflowMonth.objects.bulk_create(
+        CashflowMonth(month=month, status=status, amount=amount, installments=installments)
+        for (month, status), (amount, installments) in rows.items()
+    )
+    return len(rows)
+
+
+def report(start: date, months: int) -> list[dict]:
+    """Expected receipts for ``months`` months from ``start``'s month, zeros included."""
+    first = month_of(start)
+    month_list = [
+        date(first.year + (first.month - 1 + offset) // 12, (first.month - 1 + offset) % 12 + 1, 1)
+        for offset in range(months)
+    ]
+    stored = stored_rows(month_list[0], month_list[-1])
+    result = []
+    for month in month_list:
+        entry = {"month": month}
+        for status in AMOUNT_FIELDS:
+            amount, installments = stored.get((month, status), (0, 0))
+            entry[status] = {"amount": amount, "installments": installments}
+        result.append(entry)
+    return result
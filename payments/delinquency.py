@@ -0,0 +1,53 @@
+from datetime import date
+
+from django.db import connection, transaction
+
+from . import cashflow, portfolio
+from .models import Payment
+
+CHUNK_SIZE = 5000
+
+
+def overdue_payments(cutoff: date):
+    return Payment.objects.filter(status="pending", due_to__lt=cutoff)
+
+
+@transaction.atomic
+def mark_delayed_chunk(cutoff: date, chunk_size: int = CHUNK_SIZE) -> int:
+    """Flip up to ``chunk_size`` overdue pending payments to delayed in one UPDATE.
+
+    Rows leave the (status, due_to) range as they are flipped, so repeated
+    calls walk the backlog and a rerun after an interruption resumes it.
+    """
+    chunk = list(overdue_payments(cutoff).select_for_update().values_list("pk", flat=True)[:chunk_size])
+    if not chunk:
+        return 0
+    flipped = flip_pending(chunk)
+    if flipped:
+        portfolio.payments_delayed(flipped)
+        cashflow.payments_delayed(flipped)
+    return len(flipped)
+
+
+def flip_pending(payment_ids: list[int]) -> list[int]:
+    """Mark the payments of ``payment_ids`` that are still pending delayed; returns the ids flipped.
+
+    Payments settled since they were selected are left alone and, so that
+    the rollups are not moved for them, left out of the result.
+    """
+    if connection.vendor == "postgresql" or (
+        connection.vendor == "sqlite" and connection.features.can_return_columns_from_insert
+    ):
+        quote = connection.ops.quote_name
+        placeholders = ", ".join(["%s"] * len(payment_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {quote(Payment._meta.db_table)} SET {quote('status')} = %s "
+                f"WHERE {quote('id')} IN ({placeholders}) AND {quote('status')} = %s RETURNING {quote('id')}",
+                ["delayed", *payment_ids, "pending"],
+            )
+            return [row[0] for row in cursor.fetchall()]
+    # Without UPDATE ... RETURNING: the rows are locked FOR UPDATE, so the recheck holds.
+    pending = list(Payment.objects.filter(pk__in=payment_ids, status="pending").values_list("pk", flat=True))
+    Payment.objects.filter(pk__in=pending).update(status="delayed")
+    return pending
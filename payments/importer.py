@@ -0,0 +1,451 @@
+"""Bulk import of legacy clients, products, credits and payments.
+
+Rows are streamed from CSV or JSON Lines files and handled a chunk at a
+time: every value of a chunk is parsed and checked first, foreign keys are
+resolved through in-memory maps (client email, product name, the file's own
+credit references), and the valid rows are written in one statement per
+chunk — ``COPY`` on PostgreSQL, a batched ``executemany`` elsewhere.
+Primary keys are allocated up front, so nothing is read back after writing.
+"""
+import csv
+import io
+import json
+import re
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from datetime import date, datetime
+from itertools import islice
+from typing import IO
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+from credibuy.money import MAX_CENTS, Cents
+from products import caching
+from products.models import Product, ProductType
+from users.models import Client
+from . import cashflow
+from .models import Credit, Payment
+from .portfolio import CHUNK_SIZE as PORTFOLIO_CHUNK_SIZE, rebuild_chunk
+
+CHUNK_SIZE = 10_000
+# In dependency order: later kinds refer to rows of the earlier ones.
+KINDS = ("clients", "products", "credits", "payments")
+MAX_REPORTED_ERRORS = 50
+MODELS = {"clients": Client, "products": Product, "credits": Credit, "payments": Payment}
+
+MONEY = re.compile(r"-?(\d+)(?:\.(\d{1,2}))?")
+TRUE = {"true", "1", "yes", "y", "t"}
+FALSE = {"false", "0", "no", "n", "f"}
+
+
+def read_rows(stream: IO[str], fmt: str) -> Iterator[tuple[int, dict | None]]:
+    """Yield ``(line number, row)`` from a CSV or JSON Lines stream; unreadable rows are ``None``."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "jsonl":
+        for number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    row = None
+                yield number, row if isinstance(row, dict) else None
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+# Parsers turn one raw value into what is stored, or raise ValueError with the reason.
+
+def money(minimum: Cents = 0) -> Callable[[object], Cents]:
+    """Amounts in currency units with at most two decimals, as the API accepts them."""
+    def parse(value) -> Cents:
+        if isinstance(value, bool):
+            raise ValueError("A valid amount is required.")
+        text = str(value).strip() if value is not None else ""
+        match = MONEY.fullmatch(text)
+        if match is None:
+            raise ValueError("A valid amount with at most 2 decimal places is required.")
+        cents = int(match[1]) * 100 + int((match[2] or "0").ljust(2, "0"))
+        cents = -cents if text.startswith("-") else cents
+        if cents < minimum:
+            raise ValueError(f"Ensure this amount is at least {minimum / 100:.2f}.")
+        if cents > MAX_CENTS:
+            raise ValueError("Ensure this amount is not too large.")
+        return cents
+    return parse
+
+
+def choice(choices: Iterable[str]) -> Callable[[object], str]:
+    allowed = frozenset(choices)
+
+    def parse(value) -> str:
+        if value not in allowed:
+            raise ValueError(f"Expected one of {', '.join(sorted(allowed))}.")
+        return value
+    return parse
+
+
+def text(max_length: int, required: bool = True) -> Callable[[object], str]:
+    def parse(value) -> str:
+        value = "" if value is None else str(value).strip()
+        if required and not value:
+            raise ValueError("This field is required.")
+        if len(value) > max_length:
+            raise ValueError(f"Ensure this field has no more than {max_length} characters.")
+        return value
+    return parse
+
+
+def integer(minimum: int = 0) -> Callable[[object], int]:
+    def parse(value) -> int:
+        if isinstance(value, bool):
+            raise ValueError("A valid integer is required.")
+        try:
+            number = int(value)
+        except (TypeError, ValueError):
+            raise ValueError("A valid integer is required.")
+        if number < minimum:
+            raise ValueError(f"Ensure this value is at least {minimum}.")
+        return number
+    return parse
+
+
+def boolean(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    normalized = str(value).strip().lower()
+    if normalized in TRUE:
+        return True
+    if normalized in FALSE:
+        return False
+    raise ValueError("Must be a valid boolean.")
+
+
+def day(value) -> date:
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError("Date has wrong format. Use YYYY-MM-DD.")
+
+
+def moment(value) -> datetime | None:
+    if value in (None, ""):
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError("Datetime has wrong format. Use ISO 8601.")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Importer:
+    """Imports the rows of each kind into ``using`` and keeps the lookup maps between kinds.
+
+    Existing clients (by email) and products (by name) are reused rather than
+    duplicated. Credits are referenced from payment rows by their ``ref``
+    column, which only lives in the import's memory.
+    """
+
+    def __init__(self, using: str = "default", chunk_size: int = CHUNK_SIZE):
+        self.using = using
+        self.connection = connections[using]
+        self.chunk_size = chunk_size
+        # Emails match case-insensitively.
+        self.clients = {email.lower(): pk for email, pk in Client.objects.using(using).values_list("email", "id")}
+        # Names are not unique; the oldest product of a name wins.
+        self.products = dict(Product.objects.using(using).order_by("-pk").values_list("name", "id"))
+        self.product_types = dict(ProductType.objects.using(using).values_list("name", "id"))
+        self.credits: dict[str, int] = {}
+        self.imported = Counter()
+        self.existing = Counter()
+        self.invalid = Counter()
+        self.errors: list[str] = []
+        self.touched_clients: set[int] = set()
+
+    def error(self, source: str, line: int, message: str) -> None:
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"{source}:{line}: {message}")
+
+    def parse(self, kind: str, source: str, chunk: list, fields: dict) -> list[tuple[int, dict]]:
+        """Parse every value of ``chunk`` column by column; rows with any bad value are dropped."""
+        bad: dict[int, str] = {}
+        for line, row in chunk:
+            if row is None:
+                bad[line] = "Unreadable row."
+        values = {line: {} for line, row in chunk if line not in bad}
+        for name, parse in fields.items():
+            for line, row in chunk:
+                if line in bad:
+                    continue
+                try:
+                    values[line][name] = parse(row.get(name))
+                except ValueError as exc:
+                    bad[line] = f"{name}: {exc}"
+        for line, message in bad.items():
+            self.invalid[kind] += 1
+            self.error(source, line, message)
+        return [(line, parsed) for line, parsed in values.items() if line not in bad]
+
+    def run(self, kind: str, rows: Iterator[tuple[int, dict | None]], source: str) -> None:
+        handle = getattr(self, f"import_{kind}")
+        while chunk := list(islice(rows, self.chunk_size)):
+            handle(chunk, source)
+
+    def import_clients(self, chunk, source) -> None:
+        fields = {
+            "email": text(255),
+            "first_name": text(255),
+            "last_name": text(255),
+            "is_active": boolean,
+            "address": text(255),
+            "phone": text(255),
+        }
+        rows = []
+        for line, row in self.parse("clients", source, chunk, fields):
+            if row["email"].lower() in self.clients:
+                self.existing["clients"] += 1
+                continue
+            self.clients[row["email"].lower()] = None
+            rows.append(row)
+        ids = self.allocate_ids(Client, len(rows))
+        for pk, row in zip(ids, rows):
+            self.clients[row["email"].lower()] = pk
+        self.touched_clients.update(ids)
+        self.write("clients", Client, ["id", *fields], [(pk, *row.values()) for pk, row in zip(ids, rows)])
+
+    def import_products(self, chunk, source) -> None:
+        fields = {
+            "name": text(255),
+            "product_type": text(55),
+            "price": money(minimum=1),
+            "description": text(10_000, required=False),
+            "stock": integer(),
+        }
+        rows = []
+        for line, row in self.parse("products", source, chunk, fields):
+            if row["name"] in self.products:
+                self.existing["products"] += 1
+                continue
+            self.products[row["name"]] = None
+            row["product_type"] = self.product_type(row["product_type"])
+            rows.append(row)
+        ids = self.allocate_ids(Product, len(rows))
+        for pk, row in zip(ids, rows):
+            self.products[row["name"]] = pk
+        self.write(
+            "products",
+            Product,
+            ["id", "name", "product_type", "price", "description", "stock"],
+            [(pk, *row.values()) for pk, row in zip(ids, rows)],
+        )
+
+    def product_type(self, name: str) -> int:
+        """The id of the product type called ``name``, created as active if missing."""
+        if name not in self.product_types:
+            self.product_types[name] = ProductType.objects.using(self.using).create(name=name, status="active").pk
+        return self.product_types[name]
+
+    def import_credits(self, chunk, source) -> None:
+        fields = {
+            "ref": text(255),
+            "client": text(255),
+            "product": text(255),
+            "status": choice(Credit.STATUSES),
+            "debt": money(),
+            "total_payments": integer(minimum=1),
+            "created_at": moment,
+        }
+        now = timezone.now()
+        rows = []
+        for line, row in self.parse("credits", source, chunk, fields):
+            client = self.clients.get(row["client"].lower())
+            product = self.products.get(row["product"])
+            if row["ref"] in self.credits:
+                message = f"ref: Duplicate credit {row['ref']!r}."
+            elif client is None:
+                message = f"client: No client with email {row['client']!r}."
+            elif product is None:
+                message = f"product: No product named {row['product']!r}."
+            else:
+                self.credits[row["ref"]] = None
+                rows.append((row["ref"], client, product, row["created_at"] or now, row["status"], row["debt"], row["total_payments"]))
+                continue
+            self.invalid["credits"] += 1
+            self.error(source, line, message)
+        ids = self.allocate_ids(Credit, len(rows))
+        for pk, row in zip(ids, rows):
+            self.credits[row[0]] = pk
+            self.touched_clients.add(row[1])
+        self.write(
+            "credits",
+            Credit,
+            ["id", "client", "product", "created_at", "status", "debt", "total_payments"],
+            [(pk, *row[1:]) for pk, row in zip(ids, rows)],
+        )
+
+    def import_payments(self, chunk, source) -> None:
+        fields = {
+            "credit": text(255),
+            "value": money(minimum=1),
+            "value_delayed": money(minimum=1),
+            "due_to": day,
+            "status": choice(Payment.STATUSES),
+        }
+        rows = []
+        for line, row in self.parse("payments", source, chunk, fields):
+            credit = self.credits.get(row["credit"])
+            if credit is None:
+                self.invalid["payments"] += 1
+                self.error(source, line, f"credit: No credit with ref {row['credit']!r} in this import.")
+                continue
+            rows.append((credit, row["value"], row["due_to"], row["status"], row["value_delayed"]))
+        ids = self.allocate_ids(Payment, len(rows))
+        self.write(
+            "payments",
+            Payment,
+            ["id", "credit", "value", "due_to", "status", "value_delayed"],
+            [(pk, *row) for pk, row in zip(ids, rows)],
+        )
+
+    def allocate_ids(self, model, n: int) -> list[int]:
+        """Reserve ``n`` primary keys of ``model``'s table."""
+        if not n:
+            return []
+        table = model._meta.db_table
+        with self.connection.cursor() as cursor:
+            if self.connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)", [table, n]
+                )
+                return [row[0] for row in cursor.fetchall()]
+            cursor.execute(f"SELECT MAX(id) FROM {self.connection.ops.quote_name(table)}")
+            start = cursor.fetchone()[0] or 0
+            if self.connection.vendor == "sqlite":
+                # AUTOINCREMENT never reuses the ids of deleted rows.
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+                row = cursor.fetchone()
+                start = max(start, row[0] if row else 0)
+        return list(range(start + 1, start + 1 + n))
+
+    def write(self, kind: str, model, fields: list[str], rows: list[tuple]) -> None:
+        if not rows:
+            return
+        ops = self.connection.ops
+        model_fields = [model._meta.get_field(name) for name in fields]
+        # Columns the files do not carry get their model defaults.
+        defaults = [
+            field for field in model._meta.concrete_fields
+            if field not in model_fields and field.has_default()
+        ]
+        if defaults:
+            model_fields += defaults
+            extra = tuple(field.get_default() for field in defaults)
+            rows = [row + extra for row in rows]
+        # Dates go in as the backend stores them; every other value is ready.
+        adapters = {
+            "DateTimeField": ops.adapt_datetimefield_value,
+            "DateField": ops.adapt_datefield_value,
+        }
+        adapted = [
+            (i, adapters[field.get_internal_type()])
+            for i, field in enumerate(model_fields)
+            if field.get_internal_type() in adapters
+        ]
+        if adapted:
+            rows = [list(row) for row in rows]
+            for row in rows:
+                for i, adapt in adapted:
+                    row[i] = adapt(row[i])
+        table = ops.quote_name(model._meta.db_table)
+        columns = ", ".join(ops.quote_name(field.column) for field in model_fields)
+        with self.connection.cursor() as cursor:
+            if self.connection.vendor == "postgresql":
+                copy_rows(cursor.cursor, f"COPY {table} ({columns}) FROM STDIN", rows)
+            else:
+                placeholders = ", ".join(["%s"] * len(model_fields))
+                cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows)
+        self.imported[kind] += len(rows)
+
+    def finish(self) -> None:
+        """Bring the data derived from the imported rows up to date."""
+        # Fresh statistics first: planned against the empty tables' defaults,
+        # the portfolio rebuild scans every payment once per client.
+        ops = self.connection.ops
+        with self.connection.cursor() as cursor:
+            for kind in self.imported:
+                cursor.execute(f"ANALYZE {ops.quote_name(MODELS[kind]._meta.db_table)}")
+        clients = sorted(self.touched_clients)
+        for start in range(0, len(clients), PORTFOLIO_CHUNK_SIZE):
+            rebuild_chunk(clients[start:start + PORTFOLIO_CHUNK_SIZE])
+        if self.imported["payments"]:
+            cashflow.recompute()
+        if self.imported["products"]:
+            caching.invalidate_lists("product")
+            caching.invalidate_lists("producttype")
+
+
+def copy_rows(raw_cursor, sql: str, rows: list[tuple]) -> None:
+    """``COPY ... FROM STDIN`` with psycopg 3, or through CSV text with psycopg2."""
+    if hasattr(raw_cursor, "copy"):
+        with raw_cursor.copy(sql) as copy:
+            for row in rows:
+                copy.write_row(row)
+        return
+    buffer = io.StringIO()
+    # Unquoted empty fields are NULL in COPY's CSV format; quoted ones are empty strings.
+    csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+    buffer.seek(0)
+    raw_cursor.copy_expert(f"{sql} WITH (FORMAT csv)", buffer)
+
+
+@contextmanager
+def deferred_indexes(models: list, using: str = "default"):
+    """Drop the declared secondary indexes of ``models`` and create them again afterwards.
+
+    One index build after the load is much cheaper than maintaining them row
+    by row, but the tables are locked for writes meanwhile; run inside the
+    import's transaction so a failure restores them.
+    """
+    connection = connections[using]
+    indexes = [(model, index) for model in models for index in model._meta.indexes]
+    with connection.cursor() as cursor:
+        for model, index in indexes:
+            cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+    yield
+    # Not entered: the SQLite editor refuses to run inside a transaction,
+    # while the statements themselves are fine there.
+    editor = connection.schema_editor()
+    with connection.cursor() as cursor:
+        for model, index in indexes:
+            cursor.execute(str(index.create_sql(model, editor)))
+
+
+class InvalidRows(ValueError):
+    def __init__(self, importer: Importer):
+        super().__init__(f"{sum(importer.invalid.values())} invalid rows")
+        self.importer = importer
+
+
+def import_files(sources: dict[str, tuple[IO[str], str, str]], using: str = "default",
+                 chunk_size: int = CHUNK_SIZE, defer_indexes: bool = False, skip_invalid: bool = False) -> Importer:
+    """Import ``{kind: (stream, format, name)}`` in one transaction, in ``KINDS`` order.
+
+    Raises ``InvalidRows``, importing nothing, if any row is invalid, unless
+    ``skip_invalid`` imports the valid rows anyway.
+    """
+    importer = Importer(using, chunk_size)
+    with transaction.atomic(using=using):
+        deferred = [MODELS[kind] for kind in KINDS if kind in sources] if defer_indexes else []
+        with deferred_indexes(deferred, using):
+            for kind in KINDS:
+                if kind in sources:
+                    stream, fmt, name = sources[kind]
+                    importer.run(kind, read_rows(stream, fmt), name)
+        if importer.invalid and not skip_invalid:
+            raise InvalidRows(importer)
+        importer.finish()
+    return importer
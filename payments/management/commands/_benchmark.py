@@ -0,0 +1,51 @@
+import threading
+import time
+
+from django.db import connection
+from django.test import Client
+
+
+def percentile(latencies: list[float], q: float) -> float:
+    """Nearest-rank percentile of ``latencies``, which must be sorted."""
+    if not latencies:
+        return 0.0
+    rank = max(1, round(q / 100 * len(latencies)))
+    return latencies[min(rank, len(latencies)) - 1]
+
+
+def run_threads(send, requests: int, concurrency: int, headers: dict) -> tuple[float, list[float], list]:
+    """Send ``requests`` requests from ``concurrency`` threads, as a threaded WSGI server would run them.
+
+    ``send(client, i)`` sends the ``i``-th request with a test client of its
+    thread. Returns the wall time, the latencies and the responses that were
+    not successful.
+    """
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+    latencies, failures = [], []
+
+    def worker():
+        client = Client(headers=headers, raise_request_exception=False)
+        try:
+            while True:
+                with lock:
+                    index = next(remaining, None)
+                if index is None:
+                    return
+                started = time.perf_counter()
+                response = send(client, index)
+                latency = time.perf_counter() - started
+                with lock:
+                    latencies.append(latency)
+                    if response.status_code >= 400:
+                        failures.append(response)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, failures
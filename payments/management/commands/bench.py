@@ -0,0 +1,230 @@
+import json
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from itertools import cycle, islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from payments.models import Credit, Payment
+from payments.origination import CREDIT_BATCH_SIZE, originate_credits
+from payments.outbox import drain
+from products.models import Product, ProductType
+from users.models import Client
+from ._benchmark import percentile, run_threads
+
+LAST_NAMES = ("Garcia", "Rodriguez", "Martinez", "Lopez", "Gonzalez", "Perez", "Sanchez", "Ramirez", "Torres", "Flores")
+ENDPOINTS = ("credit create", "credit list", "payments by credit", "payment settle", "product list")
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a volume of clients, products, credits and payments, drive the main endpoints with "
+        "concurrent in-process workers and report requests/s and p50/p95/p99 latency per endpoint. "
+        "Runs against a throwaway test database unless --no-test-db is given"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=1000)
+        parser.add_argument("--products", type=int, default=100)
+        parser.add_argument("--credits", type=int, default=2000)
+        parser.add_argument("--payments", type=int, default=12, help="Installments of every seeded credit")
+        parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+        parser.add_argument("--compare", help="Results file of an earlier run to compare against")
+        parser.add_argument(
+            "--no-test-db", action="store_true",
+            help="Seed and run against the configured database instead of a throwaway test database",
+        )
+
+    def handle(self, *args, **options):
+        if min(options["clients"], options["products"], options["credits"], options["payments"]) < 1:
+            raise CommandError("--clients, --products, --credits and --payments must be positive")
+        self.verbosity = options["verbosity"]
+        baseline = self.load(options["compare"]) if options["compare"] else None
+        if options["no_test_db"]:
+            results = self.bench(options)
+        else:
+            with self.test_database():
+                results = self.bench(options)
+
+        self.report(results, baseline)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(results, output, indent=2)
+        failed = {name: endpoint["errors"] for name, endpoint in results["endpoints"].items() if endpoint["errors"]}
+        if failed:
+            raise CommandError(f"Requests failed, the numbers are not comparable: {failed}")
+
+    @contextmanager
+    def test_database(self):
+        """Create a test database for the run and destroy it afterwards."""
+        settings_dict = connection.settings_dict
+        saved = {key: dict(settings_dict[key]) for key in ("TEST", "OPTIONS")}
+        directory = None
+        if connection.vendor == "sqlite":
+            # A file rather than shared-cache memory, so that concurrent
+            # writers wait for the lock instead of failing.
+            directory = tempfile.TemporaryDirectory()
+            settings_dict["TEST"]["NAME"] = os.path.join(directory.name, "bench.sqlite3")
+            settings_dict["OPTIONS"].update(transaction_mode="IMMEDIATE", timeout=30)
+        verbosity = max(self.verbosity - 1, 0)
+        old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+            settings_dict.update(saved)
+            if directory is not None:
+                directory.cleanup()
+
+    def bench(self, options) -> dict:
+        self.seed(options["clients"], options["products"], options["credits"], options["payments"])
+        user, _ = get_user_model().objects.get_or_create(email="bench@example.com")
+        user.user_permissions.add(*Permission.objects.all())
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+
+        results = {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "database": connection.vendor,
+            "volume": {key: options[key] for key in ("clients", "products", "credits", "payments")},
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "endpoints": {},
+        }
+        # The test clients send requests for host "testserver".
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for name, send in self.endpoints(options["requests"]).items():
+                elapsed, latencies, failures = run_threads(send, options["requests"], options["concurrency"], headers)
+                latencies.sort()
+                results["endpoints"][name] = {
+                    "requests": len(latencies),
+                    "errors": len(failures),
+                    "seconds": round(elapsed, 4),
+                    "throughput": round(len(latencies) / elapsed, 2) if elapsed else None,
+                    "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+                    "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+                    "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+                }
+        return results
+
+    def seed(self, clients: int, products: int, credits: int, payments: int) -> None:
+        if self.verbosity:
+            self.stdout.write(f"Seeding {clients} clients, {products} products and {credits} credits...")
+        # Unique per run, so seeding twice into the same database does not collide.
+        run = uuid.uuid4().hex[:8]
+        types = ProductType.objects.bulk_create(
+            ProductType(name=f"Bench type {i}", status="active") for i in range(max(1, products // 10))
+        )
+        product_ids = [
+            product.pk
+            for product in Product.objects.bulk_create(
+                Product(
+                    name=f"Bench product {i:05d}",
+                    product_type=types[i % len(types)],
+                    price=100_000 + i * 3_700,
+                    description="bench",
+                    # Enough for every seeded and benchmarked credit.
+                    stock=10**9,
+                )
+                for i in range(products)
+            )
+        ]
+        client_ids = [
+            client.pk
+            for client in Client.objects.bulk_create(
+                Client(
+                    first_name=f"Bench{i}",
+                    last_name=LAST_NAMES[i % len(LAST_NAMES)],
+                    email=f"bench-{run}-{i}@example.com",
+                    is_active=True,
+                    address=f"Calle {i}",
+                    phone=f"300{i:07d}",
+                )
+                for i in range(clients)
+            )
+        ]
+        items = [
+            {"client": client, "product": product, "total_payments": payments}
+            for client, product in islice(zip(cycle(client_ids), cycle(product_ids)), credits)
+        ]
+        for start in range(0, len(items), CREDIT_BATCH_SIZE):
+            originate_credits(items[start:start + CREDIT_BATCH_SIZE])
+        drain()
+
+    def endpoints(self, requests: int) -> dict:
+        """``send(client, i)`` of every benchmarked endpoint, by name."""
+        client_ids = list(Client.objects.order_by("pk").values_list("pk", flat=True))
+        product_ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+        credit_ids = list(Credit.objects.order_by("pk").values_list("pk", flat=True))
+        # The earliest installments, spread over as many credits as possible.
+        pending = list(
+            Payment.objects.filter(status="pending")
+            .order_by("due_to", "id")
+            .values_list("pk", flat=True)[:requests]
+        )
+        if len(pending) < requests:
+            raise CommandError(f"Only {len(pending)} pending payments to settle; seed more credits")
+
+        def create_credit(client, i):
+            data = {
+                "client": client_ids[i % len(client_ids)],
+                "product": product_ids[i % len(product_ids)],
+                "total_payments": 12,
+            }
+            return client.post(reverse("credit-create"), data, content_type="application/json")
+
+        def list_credits(client, i):
+            params = {"search": LAST_NAMES[i % len(LAST_NAMES)], "ordering": "-created_at", "page_size": 20}
+            return client.get(reverse("credits-list"), params)
+
+        def payments_by_credit(client, i):
+            return client.get(reverse("payment-by-credit", kwargs={"credit_id": credit_ids[i % len(credit_ids)]}))
+
+        def settle_payment(client, i):
+            url = reverse("payment-detail", kwargs={"pk": pending[i]})
+            return client.patch(url, {"status": "completed"}, content_type="application/json")
+
+        def list_products(client, i):
+            return client.get(reverse("product-list"), {"page_size": 20})
+
+        return dict(zip(ENDPOINTS, (create_credit, list_credits, payments_by_credit, settle_payment, list_products)))
+
+    def load(self, path: str) -> dict:
+        try:
+            with open(path) as results:
+                return json.load(results)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read results from {path}: {exc}")
+
+    def report(self, results: dict, baseline: dict | None) -> None:
+        header = f"{'endpoint':<20} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+        if baseline:
+            header += f" {'req/s Δ':>9} {'p95 Δ':>9}"
+        self.stdout.write(header)
+        for name, endpoint in results["endpoints"].items():
+            line = (
+                f"{name:<20} {endpoint['throughput'] or 0:>9.1f} {endpoint['p50_ms']:>9.2f} "
+                f"{endpoint['p95_ms']:>9.2f} {endpoint['p99_ms']:>9.2f} {endpoint['errors']:>7}"
+            )
+            before = (baseline or {}).get("endpoints", {}).get(name)
+            if before:
+                line += f" {change(before['throughput'], endpoint['throughput']):>9} {change(before['p95_ms'], endpoint['p95_ms']):>9}"
+            self.stdout.write(line)
+
+
+def change(before, after) -> str:
+    """Relative change from ``before`` to ``after`` as a signed percentage."""
+    if not before or after is None:
+        return "n/a"
+    return f"{(after - before) / before:+.1%}"
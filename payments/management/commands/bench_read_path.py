@@ -0,0 +1,87 @@
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from payments.models import Credit
+from products.models import Product
+from ._benchmark import percentile, run_threads
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/s and p50/p99 latency of the async read endpoints under ASGI with the "
+        "viewsets under WSGI, in-process against the configured database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint and server")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--user", help="Email of the user to authenticate as (defaults to the first superuser)")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.filter(email=options["user"]) if options["user"] else User.objects.filter(is_superuser=True)
+        user = users.order_by("pk").first()
+        credit = Credit.objects.order_by("pk").first()
+        product = Product.objects.order_by("pk").first()
+        if user is None or credit is None or product is None:
+            raise CommandError("Needs a user, a credit and a product to read")
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+        endpoints = {
+            "credit list": reverse("credits-list"),
+            "credit detail": reverse("credits-detail", kwargs={"pk": credit.pk}),
+            "payments by credit": reverse("payment-by-credit", kwargs={"credit_id": credit.pk}),
+            "product list": reverse("product-list"),
+            "product detail": reverse("product-detail", kwargs={"pk": product.pk}),
+        }
+
+        self.stdout.write(f"{'endpoint':<20} {'server':<6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+        # The test clients send requests for host "testserver".
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for name, url in endpoints.items():
+                for server, run in (("wsgi", self.run_wsgi), ("asgi", self.run_asgi)):
+                    elapsed, latencies = run(url, headers, options["requests"], options["concurrency"])
+                    latencies.sort()
+                    self.stdout.write(
+                        f"{name:<20} {server:<6} {len(latencies) / elapsed:>9.1f} "
+                        f"{percentile(latencies, 50) * 1000:>9.2f} {percentile(latencies, 99) * 1000:>9.2f}"
+                    )
+
+    def ensure_ok(self, url, response):
+        if response.status_code != 200:
+            raise CommandError(f"GET {url} answered {response.status_code}")
+
+    def run_wsgi(self, url, headers, requests, concurrency) -> tuple[float, list[float]]:
+        elapsed, latencies, failures = run_threads(lambda client, _: client.get(url), requests, concurrency, headers)
+        if failures:
+            self.ensure_ok(url, failures[0])
+        return elapsed, latencies
+
+    def run_asgi(self, url, headers, requests, concurrency) -> tuple[float, list[float]]:
+        """Concurrent clients as tasks on one event loop, as a single ASGI worker runs them."""
+        with override_settings(ROOT_URLCONF=settings.ASGI_URLCONF):
+            return async_to_sync(self._run_asgi)(url, headers, requests, concurrency)
+
+    async def _run_asgi(self, url, headers, requests, concurrency) -> tuple[float, list[float]]:
+        client = AsyncClient()
+        slots = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one():
+            async with slots:
+                started = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                self.ensure_ok(url, response)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return time.perf_counter() - started, latencies
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from credibuy.exports import CHUNK_SIZE, EXPORT_FORMATS, export_lines, filtered_queryset
+from payments.views import CreditViewSet, PaymentViewSet
+from users.views import ClientViewSet
+
+RESOURCES = {
+    "credits": CreditViewSet,
+    "payments": PaymentViewSet,
+    "clients": ClientViewSet,
+}
+
+
+class Command(BaseCommand):
+    help = "Stream credits, payments or clients to CSV or JSON Lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("resource", choices=RESOURCES)
+        parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument("--output", help="Defaults to standard output")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            "--filter",
+            action="append",
+            default=[],
+            metavar="PARAM=VALUE",
+            help="A list query parameter such as status=active, search=... or ordering=-debt; repeatable",
+        )
+
+    def handle(self, *args, **options):
+        viewset = RESOURCES[options["resource"]]
+        params = {}
+        for item in options["filter"]:
+            key, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"Expected PARAM=VALUE, got {item!r}")
+            params.setdefault(key, []).append(value)
+
+        queryset = filtered_queryset(viewset, params)
+        lines = export_lines(queryset, viewset.export_columns, options["format"], options["chunk_size"])
+        if not options["output"]:
+            for line in lines:
+                self.stdout.write(line, ending="")
+            return
+        try:
+            with open(options["output"], "w", newline="", encoding="utf-8") as stream:
+                stream.writelines(lines)
+        except OSError as exc:
+            raise CommandError(exc)
@@ -0,0 +1,75 @@
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.importer import CHUNK_SIZE, KINDS, InvalidRows, import_files
+from payments.reconciliation import FORMATS, detect_format
+
+
+class Command(BaseCommand):
+    help = (
+        "Import a legacy portfolio from CSV or JSONL files in one transaction: clients "
+        "(email, first_name, last_name, is_active, address, phone), products (name, product_type, "
+        "price, description, stock), credits (ref, client email, product name, status, debt, "
+        "total_payments, created_at) and payments (credit ref, value, value_delayed, due_to, status)"
+    )
+
+    def add_arguments(self, parser):
+        for kind in KINDS:
+            parser.add_argument(f"--{kind}", metavar="PATH", help=f"File of {kind} to import")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to each file's extension")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            "--skip-invalid", action="store_true",
+            help="Import the valid rows even if some are invalid, instead of importing nothing",
+        )
+        parser.add_argument(
+            "--defer-indexes", action="store_true",
+            help="Drop the tables' secondary indexes during the load and rebuild them at the end; "
+            "blocks other writers to those tables until then, so only for onboarding windows",
+        )
+
+    def handle(self, *args, **options):
+        paths = {kind: options[kind] for kind in KINDS if options[kind]}
+        if not paths:
+            raise CommandError(f"Nothing to import; pass at least one of {', '.join('--' + kind for kind in KINDS)}")
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                sources = {
+                    kind: (
+                        stack.enter_context(open(path, newline="", encoding="utf-8")),
+                        options["format"] or detect_format(path),
+                        path,
+                    )
+                    for kind, path in paths.items()
+                }
+                importer = import_files(
+                    sources,
+                    chunk_size=options["chunk_size"],
+                    defer_indexes=options["defer_indexes"],
+                    skip_invalid=options["skip_invalid"],
+                )
+        except OSError as exc:
+            raise CommandError(exc)
+        except InvalidRows as exc:
+            self.report_errors(exc.importer)
+            raise CommandError(f"{exc}; nothing was imported (see --skip-invalid)")
+        elapsed = time.perf_counter() - started
+
+        self.report_errors(importer)
+        for kind in paths:
+            self.stdout.write(
+                f"{kind}: imported={importer.imported[kind]} existing={importer.existing[kind]} "
+                f"invalid={importer.invalid[kind]}"
+            )
+        rows = sum(importer.imported.values())
+        self.stdout.write(f"Imported {rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)")
+
+    def report_errors(self, importer) -> None:
+        for error in importer.errors:
+            self.stderr.write(error)
+        reported = len(importer.errors)
+        if sum(importer.invalid.values()) > reported:
+            self.stderr.write(f"... and {sum(importer.invalid.values()) - reported} more invalid rows")
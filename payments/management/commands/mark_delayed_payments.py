@@ -0,0 +1,43 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from payments.delinquency import CHUNK_SIZE, mark_delayed_chunk
+
+
+class Command(BaseCommand):
+    help = "Move pending payments past their due date to delayed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            "--date", type=date.fromisoformat, default=None,
+            help="Payments due before this ISO date are overdue (defaults to today)",
+        )
+        parser.add_argument(
+            "--pause", type=float, default=0,
+            help="Seconds to sleep between chunks to leave room for other writers",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = options["date"] or date.today()
+        chunk_size = options["chunk_size"]
+        total = 0
+        started = time.monotonic()
+        while True:
+            chunk_started = time.monotonic()
+            with transaction.atomic():
+                updated = mark_delayed_chunk(cutoff, chunk_size)
+            if not updated:
+                break
+            total += updated
+            elapsed = time.monotonic() - chunk_started
+            if options["verbosity"] >= 2:
+                self.stdout.write(f"{updated} payments in {elapsed:.3f}s ({updated / elapsed:.0f}/s)")
+            if options["pause"]:
+                time.sleep(options["pause"])
+        elapsed = time.monotonic() - started
+        rate = total / elapsed if elapsed else 0
+        self.stdout.write(f"Marked {total} payments delayed in {elapsed:.2f}s ({rate:.0f}/s)")
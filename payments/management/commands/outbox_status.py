@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.outbox import stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the outbox's depth and lag per topic; with --max-lag or --max-failed, "
+        "fail when a topic exceeds them, for monitoring"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-lag", type=float, help="Seconds the oldest pending event may wait")
+        parser.add_argument("--max-failed", type=int, help="Events that may have run out of attempts")
+
+    def handle(self, *args, **options):
+        topics = stats()
+        self.stdout.write(f"{'topic':<24} {'pending':>9} {'due':>9} {'failed':>9} {'lag s':>9}")
+        for topic, row in topics.items():
+            self.stdout.write(
+                f"{topic:<24} {row['pending']:>9} {row['due']:>9} {row['failed']:>9} {row['lag']:>9.1f}"
+            )
+
+        problems = []
+        for topic, row in topics.items():
+            if options["max_lag"] is not None and row["lag"] > options["max_lag"]:
+                problems.append(f"{topic} lags {row['lag']:.1f}s")
+            if options["max_failed"] is not None and row["failed"] > options["max_failed"]:
+                problems.append(f"{topic} has {row['failed']} failed events")
+        if problems:
+            raise CommandError("; ".join(problems))
@@ -0,0 +1,121 @@
+import logging
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from payments.cashflow import compact
+from payments.outbox import process_batch
+
+logger = logging.getLogger("payments.outbox")
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a pool of outbox workers that hand due events to their handlers in batches, "
+        "and fold the cashflow deltas on a schedule, until SIGINT/SIGTERM or, with --once, until no event is due"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="Threads, each with its own connection")
+        parser.add_argument("--batch-size", type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument(
+            "--lease", type=int, default=settings.OUTBOX_LEASE_SECONDS,
+            help="Seconds a claimed batch is held before other workers may take it over",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=1.0, help="Seconds to wait when no event is due",
+        )
+        parser.add_argument(
+            "--compact-interval", type=float, default=settings.CASHFLOW_COMPACT_SECONDS,
+            help="Seconds between foldings of the cashflow deltas, by the first worker; 0 disables them",
+        )
+        parser.add_argument("--once", action="store_true", help="Stop once no event is due, as from cron")
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["batch_size"] < 1 or options["lease"] < 1:
+            raise CommandError("--workers, --batch-size and --lease must be positive")
+        if options["compact_interval"] < 0:
+            raise CommandError("--compact-interval must not be negative")
+        stop = threading.Event()
+        handled: list[int] = []
+        errors: list[Exception] = []
+        previous = {}
+        if threading.current_thread() is threading.main_thread():
+            # Workers finish the batch in hand and exit.
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                previous[signum] = signal.signal(signum, lambda *args: stop.set())
+        try:
+            if options["workers"] == 1:
+                self.work(stop, options, handled, errors)
+            else:
+                if connection.vendor == "sqlite":
+                    # So that concurrent workers wait for the write lock instead
+                    # of failing to upgrade a read transaction.
+                    options_dict = connection.settings_dict["OPTIONS"]
+                    options_dict.setdefault("transaction_mode", "IMMEDIATE")
+                    options_dict.setdefault("timeout", 30)
+                threads = [
+                    threading.Thread(
+                        target=self.work_in_thread,
+                        args=(stop, options, handled, errors, i == 0),
+                        name=f"outbox-{i}",
+                    )
+                    for i in range(options["workers"])
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+        self.stdout.write(f"Handled {sum(handled)} outbox events")
+        if errors:
+            raise CommandError(f"Outbox workers stopped on errors: {errors}")
+
+    def work_in_thread(self, stop, options, handled, errors, compacts) -> None:
+        try:
+            self.work(stop, options, handled, errors, compacts)
+        finally:
+            connections.close_all()
+
+    def work(
+        self, stop: threading.Event, options, handled: list[int], errors: list[Exception], compacts: bool = True
+    ) -> None:
+        compacts = compacts and options["compact_interval"] > 0
+        compact_at = time.monotonic() + options["compact_interval"]
+        while not stop.is_set():
+            try:
+                claimed = process_batch(options["batch_size"], options["lease"])
+            except Exception as exc:
+                # Handler errors are retried by process_batch; these are the database's.
+                if options["once"]:
+                    errors.append(exc)
+                    return
+                logger.exception("Outbox worker could not claim or settle a batch")
+                claimed = 0
+            handled.append(claimed)
+            if compacts and (time.monotonic() >= compact_at or (options["once"] and not claimed)):
+                self.compact_cashflow(options, errors)
+                compact_at = time.monotonic() + options["compact_interval"]
+            if not claimed:
+                if options["once"]:
+                    return
+                stop.wait(options["poll_interval"])
+
+    def compact_cashflow(self, options, errors: list[Exception]) -> None:
+        try:
+            folded = compact()
+        except Exception as exc:
+            if options["once"]:
+                errors.append(exc)
+                return
+            logger.exception("Outbox worker could not fold the cashflow deltas")
+            return
+        if folded:
+            logger.info("Folded %d cashflow deltas", folded)
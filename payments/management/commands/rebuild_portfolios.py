@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from payments.portfolio import CHUNK_SIZE, rebuild_chunk
+from users.models import Client
+
+
+class Command(BaseCommand):
+    help = "Recompute every client's portfolio summary from credits and payments"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        clients = Client.objects.order_by("pk").values_list("pk", flat=True)
+        total = 0
+        last = 0
+        while chunk := list(clients.filter(pk__gt=last)[:chunk_size]):
+            with transaction.atomic():
+                total += rebuild_chunk(chunk)
+            last = chunk[-1]
+            if options["verbosity"] >= 2:
+                self.stdout.write(f"Rebuilt portfolios up to client {last}")
+        self.stdout.write(f"Rebuilt {total} client portfolios")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.cashflow import compact, expected_rows, recompute, stored_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the monthly expected-cashflow rollup from the payment table; with --compact, "
+        "fold the deltas appended since the last run into it, as the outbox workers do"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only compare the rollup with a full recompute and fail on differences",
+        )
+        parser.add_argument(
+            "--compact", action="store_true",
+            help="Fold the appended deltas into the month rows instead of rebuilding them",
+        )
+
+    def handle(self, *args, **options):
+        if options["compact"]:
+            self.stdout.write(f"Folded {compact()} cashflow deltas")
+            return
+        if not options["check"]:
+            rows = recompute()
+            self.stdout.write(f"Recomputed {rows} cashflow rows")
+            return
+
+        expected = expected_rows()
+        stored = {key: row for key, row in stored_rows().items() if row[1]}
+        differences = 0
+        for key in sorted(expected.keys() | stored.keys()):
+            if expected.get(key) != stored.get(key):
+                differences += 1
+                month, status = key
+                self.stdout.write(f"{month:%Y-%m} {status}: stored {stored.get(key)} expected {expected.get(key)}")
+        if differences:
+            raise CommandError(f"{differences} cashflow rows differ")
+        self.stdout.write("Cashflow rollup matches the payment table")
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.reconciliation import CHUNK_SIZE, FORMATS, detect_format, read_statement, reconcile
+
+
+class Command(BaseCommand):
+    help = "Settle payments from a CSV or JSONL bank statement"
+
+    def add_arguments(self, parser):
+        parser.add_argument("statement", help="Path to the statement file")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the file extension")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options["statement"]
+        fmt = options["format"] or detect_format(path)
+        try:
+            with open(path, newline="", encoding="utf-8") as stream:
+                summary = reconcile(read_statement(stream, fmt), chunk_size=options["chunk_size"])
+        except OSError as exc:
+            raise CommandError(exc)
+        self.stdout.write(
+            "matched={matched} unmatched={unmatched} duplicate={duplicate}".format(**summary)
+        )
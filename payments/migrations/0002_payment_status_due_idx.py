@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'due_to', 'id'], name='payment_status_due_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_payment_status_due_idx'),
+        ('products', '0003_query_indexes'),
+        ('users', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='credit',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='payments.credit'),
+        ),
+        migrations.AddIndex(
+            model_name='credit',
+            index=models.Index(fields=['debt', 'created_at', 'id'], name='credit_debt_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='credit',
+            index=models.Index(fields=['status', 'debt', 'created_at', 'id'], name='credit_status_debt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='credit',
+            index=models.Index(fields=['created_at', 'id'], name='credit_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['credit', 'due_to'], name='payment_credit_due_idx'),
+        ),
+    ]
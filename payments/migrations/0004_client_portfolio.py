@@ -0,0 +1,68 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:51
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_portfolios(apps, schema_editor):
+    # The portfolios of the clients that predate the table, as
+    # payments.portfolio.rebuild_chunk computes them, on this migration's models.
+    Client = apps.get_model('users', 'Client')
+    Credit = apps.get_model('payments', 'Credit')
+    Payment = apps.get_model('payments', 'Payment')
+    ClientPortfolio = apps.get_model('payments', 'ClientPortfolio')
+
+    def per_client(queryset, client_path, aggregate, output_field):
+        rows = queryset.filter(**{client_path: OuterRef('client_id')}).values(client_path)
+        total = Subquery(rows.annotate(total=aggregate).values('total'))
+        return Coalesce(total, Value(0), output_field=output_field)
+
+    active = Credit.objects.filter(status='active')
+    unpaid = Payment.objects.filter(
+        credit__client_id=OuterRef('client_id'), credit__status='active', status__in=('pending', 'delayed')
+    ).order_by('due_to')
+    amount = models.DecimalField(max_digits=25, decimal_places=10)
+    clients = Client.objects.order_by('pk').values_list('pk', flat=True)
+    last = 0
+    while chunk := list(clients.filter(pk__gt=last)[:1000]):
+        ClientPortfolio.objects.bulk_create(
+            [ClientPortfolio(client_id=client_id) for client_id in chunk], ignore_conflicts=True
+        )
+        ClientPortfolio.objects.filter(client_id__in=chunk).update(
+            outstanding_debt=per_client(active, 'client_id', Sum('debt'), amount),
+            active_credits=per_client(active, 'client_id', Count('pk'), models.IntegerField()),
+            next_due_date=Subquery(unpaid.values('due_to')[:1]),
+            delayed_payments=per_client(
+                Payment.objects.filter(status='delayed'), 'credit__client_id', Count('pk'), models.IntegerField()
+            ),
+        )
+        last = chunk[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_query_indexes'),
+        ('users', '0005_client_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientPortfolio',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='portfolio', serialize=False, to='users.client')),
+                ('outstanding_debt', models.DecimalField(decimal_places=10, default=Decimal('0'), max_digits=25)),
+                ('active_credits', models.IntegerField(default=0)),
+                ('next_due_date', models.DateField(blank=True, null=True)),
+                ('delayed_payments', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['outstanding_debt', 'client'], name='portfolio_debt_idx'), models.Index(fields=['active_credits', 'client'], name='portfolio_active_idx'), models.Index(fields=['delayed_payments', 'client'], name='portfolio_delayed_idx'), models.Index(fields=['next_due_date', 'client'], name='portfolio_next_due_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_portfolios, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:53
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_client_portfolio'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashflowMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the due month')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('delayed', 'Delayed')], max_length=30)),
+                ('amount', models.DecimalField(decimal_places=10, default=Decimal('0'), max_digits=25)),
+                ('installments', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('month', 'status'), name='unique_cashflow_month')],
+            },
+        ),
+    ]
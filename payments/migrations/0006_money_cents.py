@@ -0,0 +1,55 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:56
+
+import credibuy.money
+import django.core.validators
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_cashflow_month'),
+    ]
+
+    # Scale to cents while the columns are still decimal, then narrow them.
+    operations = [
+        migrations.RunSQL(
+            [
+                "UPDATE payments_credit SET debt = ROUND(debt * 100)",
+                "UPDATE payments_payment SET value = ROUND(value * 100), value_delayed = ROUND(value_delayed * 100)",
+                "UPDATE payments_clientportfolio SET outstanding_debt = ROUND(outstanding_debt * 100)",
+                "UPDATE payments_cashflowmonth SET amount = ROUND(amount * 100)",
+            ],
+            [
+                "UPDATE payments_credit SET debt = debt / 100.0",
+                "UPDATE payments_payment SET value = value / 100.0, value_delayed = value_delayed / 100.0",
+                "UPDATE payments_clientportfolio SET outstanding_debt = outstanding_debt / 100.0",
+                "UPDATE payments_cashflowmonth SET amount = amount / 100.0",
+            ],
+        ),
+        migrations.AlterField(
+            model_name='cashflowmonth',
+            name='amount',
+            field=credibuy.money.MoneyField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='clientportfolio',
+            name='outstanding_debt',
+            field=credibuy.money.MoneyField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='credit',
+            name='debt',
+            field=credibuy.money.MoneyField(validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='value',
+            field=credibuy.money.MoneyField(validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='value_delayed',
+            field=credibuy.money.MoneyField(validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:00
+
+import credibuy.money
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_cashflow(apps, schema_editor):
+    # The rollup of the payments that predate it, in cents like the schema
+    # from 0006 on; the same rows ``cashflow.recompute`` would write.
+    Payment = apps.get_model('payments', 'Payment')
+    CashflowMonth = apps.get_model('payments', 'CashflowMonth')
+    CashflowDelta = apps.get_model('payments', 'CashflowDelta')
+    rows = []
+    for status, field in (('pending', 'value'), ('delayed', 'value_delayed')):
+        totals = (
+            Payment.objects.filter(status=status)
+            .annotate(bucket=TruncMonth('due_to'))
+            .order_by()
+            .values('bucket')
+            .annotate(amount=Sum(field), installments=Count('pk'))
+        )
+        rows += [
+            CashflowMonth(month=row['bucket'], status=status, amount=row['amount'], installments=row['installments'])
+            for row in totals
+        ]
+    CashflowDelta.objects.all().delete()
+    CashflowMonth.objects.all().delete()
+    CashflowMonth.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_outbox_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashflowDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the due month')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('delayed', 'Delayed')], max_length=30)),
+                ('amount', credibuy.money.MoneyField()),
+                ('installments', models.IntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['month', 'status'], name='cashflow_delta_month_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_cashflow, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,13 @@
 from django.db import models
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 
 from users.models import Client
 from products.models import Product
 from decimal import Decimal
 
+from credibuy.money import MoneyField
+
 DELAYED_INTEREST_RATE = Decimal('0.12')
 INTEREST_RATE = Decimal('0.08')
 
@@ -18,17 +21,132 @@ class Credit(models.Model):
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=30, choices=STATUSES)
-    debt = models.DecimalField(max_digits=25, decimal_places=10, validators=[MinValueValidator(Decimal('0.01'))])
+    debt = MoneyField(validators=[MinValueValidator(1)])
     total_payments = models.IntegerField(validators=[MinValueValidator(0)])
 
+    class Meta:
+        indexes = [
+            # Default list ordering, with the primary key as a unique tiebreaker.
+            models.Index(fields=["debt", "created_at", "id"], name="credit_debt_created_idx"),
+            models.Index(fields=["status", "debt", "created_at", "id"], name="credit_status_debt_idx"),
+            models.Index(fields=["created_at", "id"], name="credit_created_idx"),
+        ]
+
 class Payment(models.Model):
     STATUSES = {
         "pending": "Pending",
         "completed": "Completed",
         "delayed": "Delayed"
     }
-    credit = models.ForeignKey(Credit, on_delete=models.SET_NULL, null=True)
-    value = models.DecimalField(max_digits=25, decimal_places=10, validators=[MinValueValidator(Decimal('0.01'))])
+    # Indexed through payment_credit_due_idx, which also serves the payment plan ordering.
+    credit = models.ForeignKey(Credit, on_delete=models.SET_NULL, null=True, db_index=False)
+    value = MoneyField(validators=[MinValueValidator(1)])
     due_to = models.DateField()
     status = models.CharField(max_length=30, choices=STATUSES)
-    value_delayed = models.DecimalField(max_digits=25, decimal_places=10, validators=[MinValueValidator(Decimal('0.01'))])
+    value_delayed = MoneyField(validators=[MinValueValidator(1)])
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["credit", "due_to"], name="payment_credit_due_idx"),
+            # Carries the id so the delinquency sweep's subquery is index-only.
+            models.Index(fields=["status", "due_to", "id"], name="payment_status_due_idx"),
+        ]
+
+
+class ClientPortfolio(models.Model):
+    """Per-client totals kept current by origination, settlement and the delinquency sweep.
+
+    ``payments.portfolio`` applies the changes; ``rebuild_portfolios`` recomputes them.
+    """
+    client = models.OneToOneField(Client, on_delete=models.CASCADE, primary_key=True, related_name="portfolio")
+    outstanding_debt = MoneyField(default=0)
+    active_credits = models.IntegerField(default=0)
+    next_due_date = models.DateField(null=True, blank=True)
+    delayed_payments = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["outstanding_debt", "client"], name="portfolio_debt_idx"),
+            models.Index(fields=["active_credits", "client"], name="portfolio_active_idx"),
+            models.Index(fields=["delayed_payments", "client"], name="portfolio_delayed_idx"),
+            models.Index(fields=["next_due_date", "client"], name="portfolio_next_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"Portfolio of {self.client_id}"
+
+
+class CashflowMonth(models.Model):
+    """Expected receipts of one due month and installment status.
+
+    Holds the totals folded from ``CashflowDelta`` by ``recompute_cashflow
+    --compact``; ``recompute_cashflow`` rebuilds it.
+    """
+    STATUSES = {
+        "pending": "Pending",
+        "delayed": "Delayed"
+    }
+    month = models.DateField(help_text="First day of the due month")
+    status = models.CharField(max_length=30, choices=STATUSES)
+    amount = MoneyField(default=0)
+    installments = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["month", "status"], name="unique_cashflow_month"),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.status}"
+
+
+class CashflowDelta(models.Model):
+    """A signed change to one ``CashflowMonth``, appended by ``payments.cashflow``.
+
+    Writers insert instead of updating the month rows, so concurrent writes
+    never queue on them; readers add the deltas to the rows.
+    """
+    month = models.DateField(help_text="First day of the due month")
+    status = models.CharField(max_length=30, choices=CashflowMonth.STATUSES)
+    amount = MoneyField()
+    installments = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["month", "status"], name="cashflow_delta_month_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.status} {self.installments:+d}"
+
+
+class OutboxEvent(models.Model):
+    """Follow-up work of a transaction, written in that transaction.
+
+    ``payments.outbox`` hands due events to the handler of their topic and
+    deletes them once handled; ``process_outbox`` runs the workers.
+    """
+    STATUSES = {
+        "pending": "Pending",
+        "failed": "Failed"
+    }
+    topic = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=30, choices=STATUSES, default="pending")
+    attempts = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    # Claim of the worker handling the event, which other workers respect until it expires.
+    locked_by = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "available_at", "id"], name="outbox_due_idx"),
+            models.Index(fields=["locked_by"], name="outbox_locked_by_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} #{self.pk}"
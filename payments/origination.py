@@ -0,0 +1,104 @@
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import transaction
+
+from credibuy.money import Cents
+from products.models import Product
+from products.stock import reserve
+from users.models import Client
+from . import cashflow, outbox, portfolio
+from .models import Credit, Payment
+from .utils import build_payment_plan, get_payment_values_batch
+
+PAYMENT_BATCH_SIZE = 500
+CREDIT_BATCH_SIZE = 500
+CREDIT_OPENED = "credit.opened"
+
+
+def credits_opened(credits: list[Credit], values: list[Cents], delayed: list[Cents], start: datetime) -> None:
+    """Queue the payment plans of freshly created ``credits``, with installments starting after ``start``."""
+    outbox.publish(
+        CREDIT_OPENED,
+        [
+            {"credit": credit.pk, "value": value, "value_delayed": value_delayed, "start": start.date().isoformat()}
+            for credit, value, value_delayed in zip(credits, values, delayed)
+        ],
+    )
+
+
+@outbox.handles(CREDIT_OPENED)
+def create_plans(payloads: list[dict]) -> None:
+    """Create the payment plans of opened credits and add them to the portfolios and cashflow."""
+    by_credit = {payload["credit"]: payload for payload in payloads}
+    # Locked, so that a redelivered event handled concurrently waits and then finds the plan.
+    locked = list(Credit.objects.select_for_update().filter(pk__in=by_credit).order_by("pk"))
+    planned = set(Payment.objects.filter(credit__in=locked).values_list("credit_id", flat=True).distinct())
+    credits = [credit for credit in locked if credit.pk not in planned]
+    plan: list[Payment] = []
+    for credit in credits:
+        payload = by_credit[credit.pk]
+        start = datetime.fromisoformat(payload["start"])
+        plan.extend(build_payment_plan(credit, payload["value"], payload["value_delayed"], credit.total_payments, start))
+    Payment.objects.bulk_create(plan, batch_size=PAYMENT_BATCH_SIZE)
+    portfolio.credits_opened(credits)
+    cashflow.plans_created(plan)
+
+
+@transaction.atomic
+def originate_credits(items: list[dict]) -> list[dict]:
+    """Create many credits at once.
+
+    ``items`` are validated dicts with ``client``, ``product`` and
+    ``total_payments`` ids. Returns one result per item, in order; items that
+    cannot be originated are reported without aborting the rest. The payment
+    plans are created by the outbox workers.
+    """
+    client_ids = set(
+        Client.objects.filter(pk__in={item["client"] for item in items}).values_list("pk", flat=True)
+    )
+    products = Product.objects.only("id", "price", "stock", "stock_shards").in_bulk(
+        {item["product"] for item in items}
+    )
+
+    results: list[dict] = [{} for _ in items]
+    requested: dict[int, list[int]] = defaultdict(list)
+    for index, item in enumerate(items):
+        if item["client"] not in client_ids:
+            results[index] = {"status": "error", "errors": {"client": ["Client not found"]}}
+        elif item["product"] not in products:
+            results[index] = {"status": "error", "errors": {"product": ["Product not found"]}}
+        else:
+            requested[item["product"]].append(index)
+
+    accepted: list[int] = []
+    for product_id, indexes in requested.items():
+        reserved = reserve(products[product_id], len(indexes))
+        accepted.extend(indexes[:reserved])
+        for index in indexes[reserved:]:
+            results[index] = {"status": "error", "errors": {"product": ["No products in stock"]}}
+    accepted.sort()
+
+    terms = [items[index]["total_payments"] for index in accepted]
+    values, delayed = get_payment_values_batch(
+        [products[items[index]["product"]].price for index in accepted], terms
+    )
+    credits = Credit.objects.bulk_create(
+        [
+            Credit(
+                client_id=items[index]["client"],
+                product_id=items[index]["product"],
+                status="active",
+                debt=value * n,
+                total_payments=n,
+            )
+            for index, value, n in zip(accepted, values, terms)
+        ],
+        batch_size=CREDIT_BATCH_SIZE,
+    )
+
+    credits_opened(credits, values, delayed, datetime.now())
+
+    for index, credit in zip(accepted, credits):
+        results[index] = {"status": "created", "id": credit.pk}
+    return results
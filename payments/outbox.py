@@ -0,0 +1,157 @@
+import logging
+import traceback
+import uuid
+from collections import defaultdict
+from collections.abc import Callable
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+# Work that follows a write is published as events in the write's transaction,
+# so it is queued exactly when the write commits, and handled afterwards by
+# ``process_outbox`` workers. A worker claims a batch of due events for
+# OUTBOX_LEASE_SECONDS, hands each topic's payloads to its handler and deletes
+# them in the handler's transaction. Delivery is at least once: events of a
+# worker that dies, or outlives its claim, are claimed again, so handlers must
+# be idempotent. A failed event is retried with exponential backoff and kept
+# as "failed" after OUTBOX_MAX_ATTEMPTS.
+
+Handler = Callable[[list[dict]], None]
+HANDLERS: dict[str, Handler] = {}
+
+
+def handles(topic: str):
+    """Register the decorated function as the handler of ``topic``'s payloads."""
+
+    def register(handler: Handler) -> Handler:
+        HANDLERS[topic] = handler
+        return handler
+
+    return register
+
+
+def publish(topic: str, payloads: list[dict]) -> None:
+    """Queue an event of ``topic`` per payload, in the current transaction."""
+    OutboxEvent.objects.bulk_create(
+        [OutboxEvent(topic=topic, payload=payload) for payload in payloads],
+        batch_size=settings.OUTBOX_BATCH_SIZE,
+    )
+
+
+def _due(now):
+    return OutboxEvent.objects.filter(status="pending", available_at__lte=now).filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lte=now)
+    )
+
+
+def claim(batch_size: int, lease_seconds: int) -> tuple[str, list[OutboxEvent]]:
+    """Claim up to ``batch_size`` due events, oldest first; returns the claim's token and the events."""
+    token = uuid.uuid4().hex
+    now = timezone.now()
+    with transaction.atomic():
+        ids = _due(now).order_by("available_at", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            # Concurrent workers move on to the next events instead of waiting.
+            ids = ids.select_for_update(skip_locked=True)
+        ids = list(ids.values_list("pk", flat=True)[:batch_size])
+        # Rechecks that the events are still due, so each is claimed by one worker.
+        _due(now).filter(pk__in=ids).update(
+            locked_by=token,
+            locked_until=now + timedelta(seconds=lease_seconds),
+            attempts=F("attempts") + 1,
+        )
+    return token, list(OutboxEvent.objects.filter(locked_by=token).order_by("id"))
+
+
+def _handle(token: str, topic: str, events: list[OutboxEvent]) -> bool:
+    try:
+        handler = HANDLERS.get(topic)
+        if handler is None:
+            raise LookupError(f"No outbox handler for topic {topic!r}")
+        with transaction.atomic():
+            handler([event.payload for event in events])
+            OutboxEvent.objects.filter(pk__in=[event.pk for event in events], locked_by=token).delete()
+    except Exception as exc:
+        if len(events) == 1:
+            _retry(token, events[0], exc)
+        return False
+    return True
+
+
+def _retry(token: str, event: OutboxEvent, exc: Exception) -> None:
+    if event.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+        changes = {"status": "failed"}
+        logger.error("Outbox event %s failed %d times, giving up", event, event.attempts, exc_info=exc)
+    else:
+        delay = min(settings.OUTBOX_RETRY_SECONDS * 2 ** (event.attempts - 1), settings.OUTBOX_MAX_RETRY_SECONDS)
+        changes = {"available_at": timezone.now() + timedelta(seconds=delay)}
+        logger.warning("Outbox event %s failed, retrying in %ds", event, delay, exc_info=exc)
+    OutboxEvent.objects.filter(pk=event.pk, locked_by=token).update(
+        locked_by="",
+        locked_until=None,
+        last_error="".join(traceback.format_exception(exc)),
+        **changes,
+    )
+
+
+def process_batch(batch_size: int | None = None, lease_seconds: int | None = None) -> int:
+    """Claim and handle one batch of due events; returns how many were claimed."""
+    token, events = claim(
+        batch_size or settings.OUTBOX_BATCH_SIZE, lease_seconds or settings.OUTBOX_LEASE_SECONDS
+    )
+    by_topic: dict[str, list[OutboxEvent]] = defaultdict(list)
+    for event in events:
+        by_topic[event.topic].append(event)
+    for topic, group in by_topic.items():
+        if not _handle(token, topic, group) and len(group) > 1:
+            # One at a time, so that a bad event does not hold back the others.
+            for event in group:
+                _handle(token, topic, [event])
+    if events:
+        lag = (timezone.now() - min(event.created_at for event in events)).total_seconds()
+        logger.info("Handled %d outbox events, the oldest %.1fs after it was published", len(events), lag)
+    return len(events)
+
+
+def drain(batch_size: int | None = None) -> int:
+    """Handle due events in this thread until none are left; returns how many were claimed."""
+    handled = 0
+    while claimed := process_batch(batch_size):
+        handled += claimed
+    return handled
+
+
+def stats() -> dict[str, dict]:
+    """Depth and lag of the outbox by topic.
+
+    ``pending`` events are waiting, ``due`` of them may be claimed now,
+    ``failed`` ones ran out of attempts; ``lag`` is the age in seconds of the
+    oldest pending event.
+    """
+    now = timezone.now()
+    rows = (
+        OutboxEvent.objects.values("topic")
+        .annotate(
+            pending=Count("pk", filter=Q(status="pending")),
+            due=Count("pk", filter=Q(status="pending", available_at__lte=now)),
+            failed=Count("pk", filter=Q(status="failed")),
+            oldest=Min("created_at", filter=Q(status="pending")),
+        )
+        .order_by("topic")
+    )
+    return {
+        row["topic"]: {
+            "pending": row["pending"],
+            "due": row["due"],
+            "failed": row["failed"],
+            "lag": (now - row["oldest"]).total_seconds() if row["oldest"] else 0.0,
+        }
+        for row in rows
+    }
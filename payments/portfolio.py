@@ -0,0 +1,111 @@
+from collections.abc import Iterable
+
+from django.db.models import BigIntegerField, Count, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Least
+from django.utils import timezone
+
+from .models import ClientPortfolio, Credit, Payment
+
+CHUNK_SIZE = 1000
+OUTSTANDING = ("pending", "delayed")
+
+# Each change is one set-based UPDATE over the affected clients' rows, with the
+# per-client deltas computed by correlated subqueries over the rows that just
+# changed, so a batch costs the same number of statements as a single credit.
+
+
+def _per_client(queryset, client_path: str, aggregate, output_field):
+    rows = queryset.filter(**{client_path: OuterRef("client_id")}).values(client_path)
+    return Coalesce(Subquery(rows.annotate(total=aggregate).values("total")), Value(0), output_field=output_field)
+
+
+def _debt(queryset, client_path: str, field: str):
+    return _per_client(queryset, client_path, Sum(field), BigIntegerField())
+
+
+def _count(queryset, client_path: str):
+    return _per_client(queryset, client_path, Count("pk"), IntegerField())
+
+
+def next_due_date():
+    """The earliest unpaid installment of the client's active credits."""
+    unpaid = Payment.objects.filter(
+        credit__client_id=OuterRef("client_id"), credit__status="active", status__in=OUTSTANDING
+    ).order_by("due_to")
+    return Subquery(unpaid.values("due_to")[:1])
+
+
+def credits_opened(credits: list[Credit]) -> None:
+    client_ids = {credit.client_id for credit in credits if credit.client_id is not None}
+    if not client_ids:
+        return
+    ClientPortfolio.objects.bulk_create(
+        [ClientPortfolio(client_id=client_id) for client_id in client_ids], ignore_conflicts=True
+    )
+    opened = Credit.objects.filter(pk__in=[credit.pk for credit in credits])
+    first_due = Subquery(
+        Payment.objects.filter(credit__in=opened, credit__client_id=OuterRef("client_id"))
+        .order_by("due_to")
+        .values("due_to")[:1]
+    )
+    ClientPortfolio.objects.filter(client_id__in=client_ids).update(
+        outstanding_debt=F("outstanding_debt") + _debt(opened, "client_id", "debt"),
+        active_credits=F("active_credits") + _count(opened, "client_id"),
+        next_due_date=Least(Coalesce("next_due_date", first_due), first_due),
+        updated_at=timezone.now(),
+    )
+
+
+def payments_settled(payment_ids: Iterable[int], delayed_ids: Iterable[int] = ()) -> None:
+    """Apply settled payments; ``delayed_ids`` are those that were delayed before."""
+    settled = Payment.objects.filter(pk__in=list(payment_ids))
+    delayed = Payment.objects.filter(pk__in=list(delayed_ids))
+    ClientPortfolio.objects.filter(client__credit__payment__in=settled).update(
+        outstanding_debt=F("outstanding_debt") - _debt(settled, "credit__client_id", "value"),
+        delayed_payments=F("delayed_payments") - _count(delayed, "credit__client_id"),
+        next_due_date=next_due_date(),
+        updated_at=timezone.now(),
+    )
+
+
+def credits_completed(credit_ids: Iterable[int]) -> None:
+    completed = Credit.objects.filter(pk__in=list(credit_ids))
+    ClientPortfolio.objects.filter(client__credit__in=completed).update(
+        active_credits=F("active_credits") - _count(completed, "client_id"),
+        next_due_date=next_due_date(),
+        updated_at=timezone.now(),
+    )
+
+
+def payments_delayed(payment_ids: Iterable[int]) -> None:
+    delayed = Payment.objects.filter(pk__in=list(payment_ids))
+    ClientPortfolio.objects.filter(client__credit__payment__in=delayed).update(
+        delayed_payments=F("delayed_payments") + _count(delayed, "credit__client_id"),
+        updated_at=timezone.now(),
+    )
+
+
+def payment_changed(before: Payment, after: Payment) -> None:
+    """Follow a payment edited in place, such as through the API, between pending and delayed."""
+    change = (after.status == "delayed") - (before.status == "delayed")
+    if not change or after.credit_id is None:
+        return
+    ClientPortfolio.objects.filter(client__credit=after.credit_id).update(
+        delayed_payments=F("delayed_payments") + change,
+        updated_at=timezone.now(),
+    )
+
+
+def rebuild_chunk(client_ids: list[int]) -> int:
+    """Recompute the portfolios of ``client_ids`` from their credits and payments."""
+    ClientPortfolio.objects.bulk_create(
+        [ClientPortfolio(client_id=client_id) for client_id in client_ids], ignore_conflicts=True
+    )
+    active = Credit.objects.filter(status="active")
+    return ClientPortfolio.objects.filter(client_id__in=client_ids).update(
+        outstanding_debt=_debt(active, "client_id", "debt"),
+        active_credits=_count(active, "client_id"),
+        next_due_date=next_due_date(),
+        delayed_payments=_count(Payment.objects.filter(status="delayed"), "credit__client_id"),
+        updated_at=timezone.now(),
+    )
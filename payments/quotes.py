@@ -0,0 +1,34 @@
+from datetime import datetime
+from decimal import Decimal
+from functools import lru_cache
+
+from credibuy.money import Cents
+
+from products.models import Product
+from .models import INTEREST_RATE
+from .utils import get_due_dates, get_payment_values
+
+QUOTE_CACHE_SIZE = 8192
+
+
+def get_product_price(product_id: int) -> Cents:
+    # Read on every quote: one primary key lookup, never stale, whichever
+    # worker or code path changed the price.
+    return Product.objects.values_list("price", flat=True).get(pk=product_id)
+
+
+@lru_cache(maxsize=QUOTE_CACHE_SIZE)
+def quote_values(price: Cents, n: int, r: Decimal = INTEREST_RATE) -> tuple[Cents, Cents, Cents]:
+    payment_value, delayed_value = get_payment_values(price, n, r)
+    return payment_value, delayed_value, payment_value * n
+
+
+def quote(price: Cents, n: int, start: datetime) -> dict:
+    payment_value, delayed_value, total_debt = quote_values(price, n)
+    return {
+        "total_payments": n,
+        "payment_value": payment_value,
+        "delayed_value": delayed_value,
+        "total_debt": total_debt,
+        "due_dates": [due_to.date() for due_to in get_due_dates(start, n)],
+    }
@@ -0,0 +1,107 @@
+import csv
+import json
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from itertools import islice
+from typing import IO
+
+from django.db import transaction
+from django.db.models import F
+
+from credibuy.money import Cents
+
+from . import cashflow, portfolio
+from .importer import money
+from .models import Credit, Payment
+from .settlement import complete_paid_credits
+
+CHUNK_SIZE = 1000
+FORMATS = ("csv", "jsonl")
+# Matched exactly: an amount with more than two decimals matches no payment.
+parse_amount = money()
+
+
+def detect_format(name: str) -> str:
+    return "jsonl" if name.lower().endswith((".jsonl", ".json")) else "csv"
+
+
+def read_statement(stream: IO[str], fmt: str) -> Iterator[dict]:
+    """Yield statement rows one at a time from a CSV or JSON Lines text stream."""
+    if fmt == "csv":
+        yield from csv.DictReader(stream)
+    elif fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield {}
+    else:
+        raise ValueError(f"Unsupported statement format: {fmt}")
+
+
+def _parse(row: dict) -> tuple[int, Cents | None] | None:
+    try:
+        payment_id = int(row["payment"])
+        amount = row.get("amount")
+        return payment_id, parse_amount(amount) if amount not in (None, "") else None
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+@transaction.atomic
+def reconcile_chunk(rows: list[dict]) -> dict[str, int]:
+    summary = {"matched": 0, "unmatched": 0, "duplicate": 0}
+    amounts: dict[int, Cents | None] = {}
+    for row in rows:
+        parsed = _parse(row)
+        if parsed is None:
+            summary["unmatched"] += 1
+        elif parsed[0] in amounts:
+            summary["duplicate"] += 1
+        else:
+            amounts[parsed[0]] = parsed[1]
+
+    payments = Payment.objects.select_for_update().filter(pk__in=amounts).values_list(
+        "id", "credit_id", "value", "value_delayed", "status"
+    )
+    settled: list[int] = []
+    was_delayed: list[int] = []
+    debt_paid: dict[int, Cents] = defaultdict(int)
+    for payment_id, credit_id, value, value_delayed, payment_status in payments:
+        amount = amounts.pop(payment_id)
+        if payment_status == "completed":
+            summary["duplicate"] += 1
+        elif amount is not None and amount not in (value, value_delayed):
+            summary["unmatched"] += 1
+        else:
+            settled.append(payment_id)
+            if payment_status == "delayed":
+                was_delayed.append(payment_id)
+            if credit_id is not None:
+                debt_paid[credit_id] += value
+    summary["unmatched"] += len(amounts)
+
+    if settled:
+        summary["matched"] = Payment.objects.filter(pk__in=settled).update(status="completed")
+        cashflow.payments_settled(settled, was_delayed)
+    for credit_id, total in debt_paid.items():
+        Credit.objects.filter(pk=credit_id).update(debt=F("debt") - total)
+    if debt_paid:
+        portfolio.payments_settled(settled, was_delayed)
+        complete_paid_credits(debt_paid)
+    return summary
+
+
+def reconcile(rows: Iterable[dict], chunk_size: int = CHUNK_SIZE) -> dict[str, int]:
+    """Settle the payments listed in a bank statement, ``chunk_size`` rows at a time.
+
+    Rows need a ``payment`` id and may carry the paid ``amount``, which must
+    match the installment (or its delayed value) to the cent.
+    """
+    summary = {"matched": 0, "unmatched": 0, "duplicate": 0}
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        for key, count in reconcile_chunk(chunk).items():
+            summary[key] += count
+    return summary
@@ -1,11 +1,26 @@
+from django.core.validators import MinValueValidator
+from django.db import transaction
 from rest_framework import serializers
 from .models import Credit, Payment
-from .utils import get_payment_values, add_to_month
+from credibuy.money import MoneySerializerField
+from .utils import get_payment_values
+from .origination import credits_opened
+from .settlement import settle_payment
+from . import cashflow, portfolio
 from products.models import Product
+from products.stock import reserve
 from datetime import datetime
-from decimal import Decimal
+import copy
+
+MAX_QUOTE_TERMS = 60
+# Longest payment plan, in monthly installments; each one is a row and a due date.
+MAX_TOTAL_PAYMENTS = 360
+MAX_BULK_CREDITS = 1000
+MAX_CASHFLOW_MONTHS = 120
 
 class CreditCreationSerializer(serializers.ModelSerializer):
+    debt = MoneySerializerField(read_only=True)
+
     class Meta:
         model = Credit
         fields = (
@@ -17,15 +32,18 @@ class CreditCreationSerializer(serializers.ModelSerializer):
             "debt",
             "total_payments",
         )
-        extra_kwargs = {"debt": {"read_only": True}, "created_at": {"read_only": True}, "status":{"read_only":True}}
+        extra_kwargs = {
+            "created_at": {"read_only": True},
+            "status": {"read_only": True},
+            "total_payments": {"min_value": 1, "max_value": MAX_TOTAL_PAYMENTS},
+        }
 
+    @transaction.atomic
     def create(self, validated_data):
         product: Product = validated_data["product"]
 
-        if product.stock <= 0:
+        if not reserve(product):
             raise serializers.ValidationError("No products in stock")
-        product.stock -= 1
-        product.save()
         price = validated_data["product"].price
         n_payments = validated_data["total_payments"]
         payment_value, delayed_value = get_payment_values(price, n_payments)
@@ -33,37 +51,42 @@ class CreditCreationSerializer(serializers.ModelSerializer):
         validated_data["debt"] = total_debt
         validated_data["status"] = "active"
         credit: Credit = super().create(validated_data)
-
-        today = datetime.now()
-        for i in range(1, n_payments + 1):
-            due_to = add_to_month(today, i)
-            Payment.objects.create(
-                credit=credit,
-                value=payment_value,
-                due_to=due_to,
-                status="pending",
-                value_delayed=delayed_value,
-            )
+        # The payment plan follows from the outbox, off the request.
+        credits_opened([credit], [payment_value], [delayed_value], datetime.now())
         return credit
 
 
+class CreditBulkItemSerializer(serializers.Serializer):
+    client = serializers.IntegerField()
+    product = serializers.IntegerField()
+    total_payments = serializers.IntegerField(min_value=1, max_value=MAX_TOTAL_PAYMENTS)
+
+
 class PaymentSerializer(serializers.ModelSerializer):
+    value = MoneySerializerField(validators=[MinValueValidator(1)])
+    value_delayed = MoneySerializerField(validators=[MinValueValidator(1)])
+
     class Meta:
         model = Payment
         fields = ("id", "value", "due_to", "value_delayed", "status", "credit")
 
     def update(self, instance: Payment, validated_data):
-        credit = instance.credit
-        if validated_data["status"] == "completed":
-            if instance.status != 'completed':
-                credit.debt -= instance.value
-                if credit.debt < Decimal('0.00001') :
-                    credit.status = 'completed'
-        credit.save()
-        return super().update(instance, validated_data)
+        if validated_data.get("status") == "completed":
+            del validated_data["status"]
+            settle_payment(instance)
+            instance.status = "completed"
+            if not validated_data:
+                return instance
+        before = copy.copy(instance)
+        with transaction.atomic(savepoint=False):
+            instance = super().update(instance, validated_data)
+            cashflow.payment_changed(before, instance)
+            portfolio.payment_changed(before, instance)
+        return instance
 
 
 class CreditSerializer(serializers.ModelSerializer):
+    debt = MoneySerializerField(validators=[MinValueValidator(1)])
     client_name = serializers.SerializerMethodField()
     product_name = serializers.SlugRelatedField(
         source="product", read_only=True, slug_field="name"
@@ -85,3 +108,42 @@ class CreditSerializer(serializers.ModelSerializer):
 
     def get_client_name(self, obj):
         return obj.client.__str__()
+
+
+class CreditQuoteRequestSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    total_payments = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=MAX_TOTAL_PAYMENTS),
+        allow_empty=False,
+        max_length=MAX_QUOTE_TERMS,
+    )
+
+
+class PaymentQuoteSerializer(serializers.Serializer):
+    total_payments = serializers.IntegerField()
+    payment_value = MoneySerializerField()
+    delayed_value = MoneySerializerField()
+    total_debt = MoneySerializerField()
+    due_dates = serializers.ListField(child=serializers.DateField())
+
+
+class CreditQuoteSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    price = MoneySerializerField()
+    quotes = PaymentQuoteSerializer(many=True)
+
+
+class CashflowReportRequestSerializer(serializers.Serializer):
+    start = serializers.DateField(input_formats=["%Y-%m", "iso-8601"], required=False)
+    months = serializers.IntegerField(min_value=1, max_value=MAX_CASHFLOW_MONTHS, default=24)
+
+
+class CashflowBucketSerializer(serializers.Serializer):
+    amount = MoneySerializerField()
+    installments = serializers.IntegerField()
+
+
+class CashflowMonthSerializer(serializers.Serializer):
+    month = serializers.DateField(format="%Y-%m")
+    pending = CashflowBucketSerializer()
+    delayed = CashflowBucketSerializer()
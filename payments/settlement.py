@@ -0,0 +1,39 @@
+from collections.abc import Iterable
+
+from django.db import transaction
+from django.db.models import F
+
+from . import cashflow, portfolio
+from .models import Credit, Payment
+
+def complete_paid_credits(credit_ids: Iterable[int]) -> int:
+    paid = list(
+        Credit.objects.select_for_update()
+        .filter(pk__in=credit_ids, status="active", debt__lte=0)
+        .values_list("pk", flat=True)
+    )
+    if not paid:
+        return 0
+    completed = Credit.objects.filter(pk__in=paid, status="active").update(status="completed")
+    portfolio.credits_completed(paid)
+    return completed
+
+
+@transaction.atomic
+def settle_payment(payment: Payment) -> bool:
+    """Mark ``payment`` completed and reduce its credit's debt, at most once.
+
+    Everything happens in conditional UPDATEs, so concurrent settlements of the
+    same credit never lose a debt reduction. Returns False when the payment was
+    already completed.
+    """
+    payments = Payment.objects.filter(pk=payment.pk)
+    was_delayed = payments.filter(status="delayed").update(status="completed")
+    if not was_delayed and not payments.exclude(status="completed").update(status="completed"):
+        return False
+    cashflow.payment_settled(payment, bool(was_delayed))
+    if payment.credit_id is not None:
+        Credit.objects.filter(pk=payment.credit_id).update(debt=F("debt") - payment.value)
+        portfolio.payments_settled([payment.pk], [payment.pk] if was_delayed else [])
+        complete_paid_credits([payment.credit_id])
+    return True
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from users.models import Client
+from .models import ClientPortfolio
+
+
+@receiver(post_save, sender=Client)
+def client_created(sender, instance: Client, created=False, raw=False, **kwargs):
+    # Every client has a portfolio row, so sorting clients by it never meets NULLs.
+    if created and not raw:
+        ClientPortfolio.objects.bulk_create([ClientPortfolio(client=instance)], ignore_conflicts=True)
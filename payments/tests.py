@@ -1,12 +1,35 @@
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APIClient, APITestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from unittest import mock
+import csv
+import io
+import json
+import os
+import tempfile
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
 from users.models import Client
 from products.models import Product, ProductType
-from .serializers import CreditCreationSerializer
-from .models import Payment, Credit
+from .serializers import MAX_QUOTE_TERMS, MAX_TOTAL_PAYMENTS, CreditCreationSerializer
+from .cashflow import stored_rows
+from .models import CashflowDelta, CashflowMonth, ClientPortfolio, OutboxEvent, Payment, Credit, INTEREST_RATE, DELAYED_INTEREST_RATE
+from .outbox import HANDLERS, claim, drain, publish
+from .delinquency import mark_delayed_chunk
+from .reconciliation import reconcile
+from .settlement import settle_payment
+from .utils import add_to_month, get_due_dates_batch, get_payment_values, get_payment_values_batch
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from credibuy.money import CENT, from_cents, round_cents, to_cents
+from credibuy.testing import run_concurrently
+
 
 # Create your tests here.
 class CreditAndPaymentTests(APITestCase):
@@ -45,6 +68,7 @@ class CreditAndPaymentTests(APITestCase):
         serializer = CreditCreationSerializer(data=credit_data)
         serializer.is_valid(raise_exception=True)
         cls.credit = serializer.save()
+        drain()
 
     @classmethod
     def tearDownClass(cls):
@@ -56,6 +80,27 @@ class CreditAndPaymentTests(APITestCase):
     def setUp(self):
         self.client.force_authenticate(user=self.user)
 
+    def test_search_credits_by_client_and_status(self):
+        other = Client.objects.create(
+            email="searchable@example.com",
+            first_name="Searchable",
+            last_name="Person",
+            is_active=True,
+            address="Search street",
+            phone="3100000000",
+        )
+        active = Credit.objects.create(client=other, product=self.product, status="active", debt=100, total_payments=1)
+        completed = Credit.objects.create(client=other, product=self.product, status="completed", debt=1, total_payments=1)
+        url = reverse("credits-list")
+
+        response = self.client.get(url, {"search": "searchab"})
+        self.assertEqual({row["id"] for row in response.data["results"]}, {active.id, completed.id})
+        response = self.client.get(url, {"search": "searchable active"})
+        self.assertEqual([row["id"] for row in response.data["results"]], [active.id])
+        response = self.client.get(url, {"search": "completed", "page_size": 100})
+        self.assertIn(completed.id, [row["id"] for row in response.data["results"]])
+        self.assertNotIn(active.id, [row["id"] for row in response.data["results"]])
+
     def test_create_credit(self):
         url = reverse("credit-create")
         credit = {
@@ -69,6 +114,125 @@ class CreditAndPaymentTests(APITestCase):
 
         self.assertEqual(Product.objects.get(pk=self.product.id).stock, 48)
 
+    def test_create_credit_rolls_back_on_failure(self):
+        url = reverse("credit-create")
+        credit = {
+            "client": self.client_data.id,
+            "product": self.product.id,
+            "total_payments": 12,
+        }
+        credits_before = Credit.objects.count()
+        with mock.patch.object(OutboxEvent.objects, "bulk_create", side_effect=RuntimeError("db down")):
+            with self.assertRaises(RuntimeError):
+                self.client.post(url, credit, format="json")
+        self.assertEqual(Credit.objects.count(), credits_before)
+        self.assertEqual(Product.objects.get(pk=self.product.id).stock, 49)
+
+    def test_create_credit_queries_do_not_grow_with_term(self):
+        url = reverse("credit-create")
+        query_counts = []
+        for total_payments in (12, 72):
+            credit = {
+                "client": self.client_data.id,
+                "product": self.product.id,
+                "total_payments": total_payments,
+            }
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, credit, format="json")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            query_counts.append(len(queries))
+            drain()
+            self.assertEqual(Payment.objects.filter(credit_id=response.data["id"]).count(), total_payments)
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_bulk_create_credits(self):
+        scarce = Product.objects.create(
+            name="Scarce Product",
+            product_type=self.product_type,
+            price=1000,
+            description="one left",
+            stock=1,
+        )
+        url = reverse("credit-bulk-create")
+        credits = [
+            {"client": self.client_data.id, "product": self.product.id, "total_payments": 6},
+            {"client": self.client_data.id, "product": scarce.id, "total_payments": 3},
+            {"client": self.client_data.id, "product": scarce.id, "total_payments": 3},
+            {"client": 0, "product": self.product.id, "total_payments": 3},
+            {"client": self.client_data.id, "product": self.product.id, "total_payments": 0},
+        ]
+        response = self.client.post(url, credits, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        results = response.data["results"]
+        self.assertEqual(
+            [result["status"] for result in results],
+            ["created", "created", "error", "error", "error"],
+        )
+        self.assertEqual(results[2]["errors"], {"product": ["No products in stock"]})
+        self.assertEqual(Product.objects.get(pk=self.product.id).stock, 48)
+        self.assertEqual(Product.objects.get(pk=scarce.id).stock, 0)
+        drain()
+        self.assertEqual(Payment.objects.filter(credit_id=results[0]["id"]).count(), 6)
+        self.assertEqual(Payment.objects.filter(credit_id=results[1]["id"]).count(), 3)
+
+    def test_bulk_create_queries_do_not_grow_with_batch(self):
+        url = reverse("credit-bulk-create")
+        query_counts = []
+        for size in (2, 20):
+            credits = [
+                {"client": self.client_data.id, "product": self.product.id, "total_payments": 3}
+            ] * size
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, credits, format="json")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_quote_credit(self):
+        url = reverse("credit-quote")
+        response = self.client.get(url, {"product": self.product.id, "total_payments": "12,24"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        quotes = response.data["quotes"]
+        self.assertEqual([q["total_payments"] for q in quotes], [12, 24])
+        payment = Payment.objects.filter(credit=self.credit).first()
+        self.assertEqual(quotes[0]["payment_value"], str(from_cents(payment.value)))
+        self.assertEqual(len(quotes[1]["due_dates"]), 24)
+        self.assertEqual(Product.objects.get(pk=self.product.id).stock, 49)
+
+    def test_quote_credit_follows_price_changes(self):
+        url = reverse("credit-quote")
+        params = {"product": self.product.id, "total_payments": 12}
+        with self.assertNumQueries(1):
+            first = self.client.get(url, params)
+        # Also without the model's save() and its signals.
+        Product.objects.filter(pk=self.product.id).update(price=self.product.price * 2)
+        second = self.client.get(url, params)
+        self.assertAlmostEqual(
+            Decimal(second.data["quotes"][0]["payment_value"]),
+            Decimal(first.data["quotes"][0]["payment_value"]) * 2,
+            delta=CENT,
+        )
+
+    def test_plans_are_capped_in_length(self):
+        too_long = MAX_TOTAL_PAYMENTS + 1
+        response = self.client.get(reverse("credit-quote"), {"product": self.product.id, "total_payments": too_long})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        terms = ",".join(["12"] * (MAX_QUOTE_TERMS + 1))
+        response = self.client.get(reverse("credit-quote"), {"product": self.product.id, "total_payments": terms})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        item = {"client": self.client_data.id, "product": self.product.id, "total_payments": too_long}
+        response = self.client.post(reverse("credit-bulk-create"), [item], format="json")
+        self.assertIn("total_payments", response.data["results"][0]["errors"])
+        response = self.client.post(reverse("credit-create"), item, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Product.objects.get(pk=self.product.id).stock, 49)
+
+    def test_quote_credit_unknown_product(self):
+        url = reverse("credit-quote")
+        response = self.client.get(url, {"product": 0, "total_payments": 12})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
     def test_get_credit(self):
         url = reverse("credits-detail", kwargs={"pk": self.credit.id})
         response = self.client.get(url)
@@ -105,8 +269,83 @@ class CreditAndPaymentTests(APITestCase):
         response = self.client.patch(url, data, format='json')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         new_credit = Credit.objects.get(id=self.credit.id)
-        self.assertAlmostEqual(new_credit.debt, credit_value-payment_value, 4)
+        self.assertEqual(new_credit.debt, credit_value - payment_value)
     
+    def test_reconcile_statement_command(self):
+        payments = list(Payment.objects.filter(credit=self.credit).order_by("due_to")[:4])
+        unpaid = payments.pop()
+        rows = ["payment,amount"]
+        rows += [f"{payment.id},{from_cents(payment.value)}" for payment in payments]
+        rows += [f"{payments[0].id},", "0,10.00", f"{payments[1].id},1.00", "not-a-number,"]
+        # Less than half a cent off the amount due is not rounded onto it.
+        rows += [f"{unpaid.id},{from_cents(unpaid.value)}4"]
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as statement:
+            statement.write("\n".join(rows))
+        self.addCleanup(os.remove, statement.name)
+        out = io.StringIO()
+        call_command("reconcile_payments", statement.name, "--chunk-size", "2", stdout=out)
+        self.assertEqual(out.getvalue().strip(), "matched=3 unmatched=3 duplicate=2")
+        self.assertEqual(Payment.objects.filter(credit=self.credit, status="completed").count(), 3)
+        self.assertEqual(Credit.objects.get(pk=self.credit.id).debt, self.credit.debt - 3 * payments[0].value)
+
+    def test_reconcile_statement_upload(self):
+        payment = Payment.objects.filter(credit=self.credit).first()
+        statement = SimpleUploadedFile(
+            "statement.jsonl",
+            f'{{"payment": {payment.id}}}\n{{"payment": {payment.id}}}\nnot json\n'.encode(),
+        )
+        url = reverse("payment-reconcile")
+        response = self.client.post(url, {"file": statement}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"matched": 1, "unmatched": 1, "duplicate": 1})
+
+    def test_mark_delayed_payments(self):
+        payments = list(Payment.objects.filter(credit=self.credit).order_by("due_to"))
+        Payment.objects.filter(pk__in=[p.id for p in payments[:5]]).update(due_to="2020-01-01")
+        Payment.objects.filter(pk=payments[0].id).update(status="completed")
+        out = io.StringIO()
+        call_command("mark_delayed_payments", "--chunk-size", "2", stdout=out)
+        self.assertIn("Marked 4 payments delayed", out.getvalue())
+        self.assertEqual(
+            list(Payment.objects.filter(credit=self.credit, status="delayed").values_list("id", flat=True).order_by("id")),
+            sorted(p.id for p in payments[1:5]),
+        )
+        call_command("mark_delayed_payments", stdout=out)
+        self.assertIn("Marked 0 payments delayed", out.getvalue())
+
+    def test_export_streams_filtered_rows(self):
+        response = self.client.get(reverse("payment-export"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), Payment.objects.count())
+        self.assertEqual(list(rows[0]), ["id", "credit", "value", "value_delayed", "due_to", "status"])
+
+        response = self.client.get(
+            reverse("credits-export"), {"file_format": "jsonl", "status": "active", "search": "test"}
+        )
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        expected = Credit.objects.filter(status="active", client__first_name="Test")
+        self.assertEqual(sorted(row["id"] for row in rows), sorted(expected.values_list("id", flat=True)))
+        self.assertEqual(rows[0]["client_first_name"], "Test")
+        self.assertEqual(rows[0]["product_name"], "Test Product")
+
+        response = self.client.get(reverse("payment-export"), {"file_format": "xml"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "credits.csv")
+            call_command("export", "credits", "--output", path, "--filter", "status=active", "--chunk-size", "1")
+            with open(path, newline="") as stream:
+                rows = list(csv.DictReader(stream))
+        self.assertEqual(len(rows), Credit.objects.filter(status="active").count())
+        self.assertEqual(rows[0]["client_last_name"], "Client")
+
+        out = io.StringIO()
+        call_command("export", "payments", "--format", "jsonl", stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), Payment.objects.count())
+
     def test_pay_all_debt(self):
         payments = Payment.objects.filter(credit=self.credit)
         for payment in payments:
@@ -120,3 +359,619 @@ class CreditAndPaymentTests(APITestCase):
         new_credit = Credit.objects.get(id=self.credit.id)
         self.assertEqual(new_credit.status, 'completed')
 
+
+
+class AmortizationTests(SimpleTestCase):
+    def test_batch_matches_decimal_formula_to_the_cent(self):
+        r = INTEREST_RATE
+        prices = [to_cents(p) for p in ("0.01", "55000.83", "12000000", "987654321.99")]
+        terms = [1, 6, 12, 36, 72]
+        batch_prices = [p for p in prices for _ in terms]
+        batch_terms = [n for _ in prices for n in terms]
+        values, delayed = get_payment_values_batch(batch_prices, batch_terms)
+        for p, n, value, value_delayed in zip(batch_prices, batch_terms, values, delayed):
+            expected = (p*r*(1+r)**n) / (((1+r)**n) - 1)
+            self.assertEqual(value, round_cents(expected))
+            self.assertEqual(value_delayed, round_cents(expected * (1+DELAYED_INTEREST_RATE)))
+            self.assertEqual((value, value_delayed), get_payment_values(p, n))
+
+    def test_batch_due_dates_match_add_to_month(self):
+        starts = [datetime(2024, 1, 31), datetime(2024, 1, 31), datetime(2024, 11, 5)]
+        terms = [3, 14, 2]
+        schedules = get_due_dates_batch(starts, terms)
+        for start, n, schedule in zip(starts, terms, schedules):
+            self.assertEqual(list(schedule), [add_to_month(start, i) for i in range(1, n + 1)])
+
+    def test_batch_rejects_mismatched_lengths(self):
+        with self.assertRaises(ValueError):
+            get_payment_values_batch([1000], [1, 2])
+
+
+class SettlementConcurrencyTests(TransactionTestCase):
+    THREADS = 8
+
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(email="settle@example.com", password="12345")
+        self.user.user_permissions.add(*Permission.objects.all())
+        client = Client.objects.create(
+            email="settle-client@example.com",
+            first_name="Settle",
+            last_name="Client",
+            is_active=True,
+            address="123 Calle1",
+            phone="3219876540",
+        )
+        product_type = ProductType.objects.create(name="Settle ProductType", status="active")
+        product = Product.objects.create(
+            name="Settle Product", product_type=product_type, price=2400000, description="stress", stock=5
+        )
+        serializer = CreditCreationSerializer(
+            data={"client": client.id, "product": product.id, "total_payments": 24}
+        )
+        serializer.is_valid(raise_exception=True)
+        self.credit = serializer.save()
+        drain()
+
+    def test_parallel_settlement_keeps_debt_exact(self):
+        # Every installment is settled twice, from different threads.
+        payment_ids = list(Payment.objects.filter(credit=self.credit).values_list("id", flat=True)) * 2
+
+        def settle(payment_id):
+            api = APIClient()
+            api.force_authenticate(user=self.user)
+            url = reverse("payment-detail", kwargs={"pk": payment_id})
+            return api.patch(url, {"status": "completed"}, format="json").status_code
+
+        responses = run_concurrently(settle, payment_ids, self.THREADS)
+        self.assertEqual(responses, [status.HTTP_200_OK] * 48)
+        credit = Credit.objects.get(pk=self.credit.pk)
+        self.assertEqual(credit.debt, 0)
+        self.assertEqual(credit.status, "completed")
+        portfolio = ClientPortfolio.objects.get(client_id=credit.client_id)
+        self.assertEqual(portfolio.outstanding_debt, 0)
+        self.assertEqual(portfolio.active_credits, 0)
+        self.assertIsNone(portfolio.next_due_date)
+
+
+class ClientPortfolioTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_superuser(email="portfolio@example.com", password="12345")
+        cls.client_record = Client.objects.create(
+            email="portfolio-client@example.com",
+            first_name="Portfolio",
+            last_name="Client",
+            is_active=True,
+            address="123 Calle1",
+            phone="3219876540",
+        )
+        cls.idle_client = Client.objects.create(
+            email="idle-client@example.com",
+            first_name="Idle",
+            last_name="Client",
+            is_active=True,
+            address="123 Calle1",
+            phone="3219876541",
+        )
+        product_type = ProductType.objects.create(name="Portfolio ProductType", status="active")
+        cls.product = Product.objects.create(
+            name="Portfolio Product", product_type=product_type, price=120000, description="portfolio", stock=10
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def originate(self, total_payments):
+        serializer = CreditCreationSerializer(
+            data={"client": self.client_record.id, "product": self.product.id, "total_payments": total_payments}
+        )
+        serializer.is_valid(raise_exception=True)
+        credit = serializer.save()
+        drain()
+        return credit
+
+    def portfolio(self):
+        return ClientPortfolio.objects.get(client=self.client_record)
+
+    def snapshot(self):
+        portfolio = self.portfolio()
+        return (
+            portfolio.outstanding_debt,
+            portfolio.active_credits,
+            portfolio.next_due_date,
+            portfolio.delayed_payments,
+        )
+
+    def test_portfolio_follows_origination_settlement_and_delinquency(self):
+        self.assertEqual(self.snapshot(), (0, 0, None, 0))
+        short = self.originate(2)
+        long = self.originate(6)
+        plan = list(Payment.objects.filter(credit=short).order_by("due_to"))
+        self.assertEqual(
+            self.snapshot(), (short.debt + long.debt, 2, plan[0].due_to, 0)
+        )
+
+        call_command("mark_delayed_payments", "--date", (plan[0].due_to + timedelta(days=1)).isoformat(), stdout=io.StringIO())
+        self.assertEqual(self.portfolio().delayed_payments, 2)
+
+        for payment in plan:
+            response = self.client.patch(
+                reverse("payment-detail", kwargs={"pk": payment.pk}), {"status": "completed"}, format="json"
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        long_plan = list(Payment.objects.filter(credit=long).order_by("due_to"))
+        self.assertEqual(self.snapshot(), (long.debt, 1, long_plan[0].due_to, 1))
+
+        statement = [{"payment": payment.pk} for payment in long_plan[1:]]
+        reconcile(statement)
+        self.assertEqual(self.snapshot(), (long_plan[0].value, 1, long_plan[0].due_to, 1))
+
+    def test_portfolio_follows_manual_status_changes(self):
+        plan = list(Payment.objects.filter(credit=self.originate(3)).order_by("due_to"))
+        url = reverse("payment-detail", kwargs={"pk": plan[1].pk})
+        self.client.patch(url, {"status": "delayed"}, format="json")
+        self.assertEqual(self.portfolio().delayed_payments, 1)
+        expected = self.snapshot()
+        call_command("rebuild_portfolios", stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), expected)
+
+        self.client.patch(url, {"status": "pending", "value": "10.00"}, format="json")
+        self.assertEqual(self.portfolio().delayed_payments, 0)
+
+    def test_delinquency_moves_only_the_payments_it_flips(self):
+        plan = list(Payment.objects.filter(credit=self.originate(3)).order_by("due_to"))
+        selected = Payment.objects.filter(pk__in=[payment.pk for payment in plan])
+        # Settled after the chunk was selected, so the guarded UPDATE skips it.
+        settle_payment(plan[0])
+        with mock.patch("payments.delinquency.overdue_payments", return_value=selected):
+            self.assertEqual(mark_delayed_chunk(plan[-1].due_to + timedelta(days=1)), 2)
+        self.assertEqual(self.portfolio().delayed_payments, 2)
+        call_command("recompute_cashflow", "--check", stdout=io.StringIO())
+
+    def test_rebuild_repairs_drift(self):
+        self.originate(3)
+        self.originate(4)
+        expected = self.snapshot()
+        ClientPortfolio.objects.update(outstanding_debt=0, active_credits=7, next_due_date=None, delayed_payments=3)
+        ClientPortfolio.objects.filter(client=self.idle_client).delete()
+
+        out = io.StringIO()
+        call_command("rebuild_portfolios", "--chunk-size", "1", stdout=out)
+        self.assertIn("Rebuilt 2 client portfolios", out.getvalue())
+        self.assertEqual(self.snapshot(), expected)
+        self.assertEqual(ClientPortfolio.objects.get(client=self.idle_client).active_credits, 0)
+
+    def test_clients_expose_sort_and_filter_on_portfolio(self):
+        self.originate(3)
+        url = reverse("client-list")
+        response = self.client.get(url, {"ordering": "-portfolio__outstanding_debt"})
+        self.assertEqual(response.data["results"][0]["email"], self.client_record.email)
+        self.assertEqual(response.data["results"][0]["portfolio"]["active_credits"], 1)
+        self.assertEqual(response.data["results"][1]["portfolio"]["outstanding_debt"], "0.00")
+
+        response = self.client.get(url, {"portfolio__active_credits__gte": 1})
+        self.assertEqual([row["email"] for row in response.data["results"]], [self.client_record.email])
+
+
+class CashflowTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_superuser(email="cashflow@example.com", password="12345")
+        cls.client_record = Client.objects.create(
+            email="cashflow-client@example.com",
+            first_name="Cashflow",
+            last_name="Client",
+            is_active=True,
+            address="123 Calle1",
+            phone="3219876540",
+        )
+        product_type = ProductType.objects.create(name="Cashflow ProductType", status="active")
+        cls.product = Product.objects.create(
+            name="Cashflow Product", product_type=product_type, price=120000, description="cashflow", stock=10
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def originate(self, total_payments):
+        serializer = CreditCreationSerializer(
+            data={"client": self.client_record.id, "product": self.product.id, "total_payments": total_payments}
+        )
+        serializer.is_valid(raise_exception=True)
+        credit = serializer.save()
+        drain()
+        return credit
+
+    def assertRollupMatches(self):
+        out = io.StringIO()
+        call_command("recompute_cashflow", "--check", stdout=out)
+        self.assertIn("matches", out.getvalue())
+
+    def test_rollup_follows_payment_lifecycle(self):
+        first = self.originate(3)
+        self.originate(6)
+        plan = list(Payment.objects.filter(credit=first).order_by("due_to"))
+        self.assertRollupMatches()
+
+        cutoff = plan[1].due_to + timedelta(days=1)
+        call_command("mark_delayed_payments", "--date", cutoff.isoformat(), stdout=io.StringIO())
+        self.assertRollupMatches()
+        self.assertEqual(stored_rows()[plan[0].due_to.replace(day=1), "delayed"][1], 2)
+
+        self.client.patch(reverse("payment-detail", kwargs={"pk": plan[0].pk}), {"status": "completed"}, format="json")
+        self.client.patch(reverse("payment-detail", kwargs={"pk": plan[2].pk}), {"status": "completed"}, format="json")
+        reconcile([{"payment": plan[1].pk}])
+        self.assertRollupMatches()
+
+        # Edits in place move the installment between amounts, statuses and months.
+        later = list(Payment.objects.exclude(credit=first).order_by("due_to"))
+        for payment, changes in [
+            (later[0], {"value": "10.00"}),
+            (later[1], {"status": "delayed", "value_delayed": "12.00"}),
+            (later[2], {"due_to": later[5].due_to.isoformat()}),
+        ]:
+            response = self.client.patch(reverse("payment-detail", kwargs={"pk": payment.pk}), changes, format="json")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRollupMatches()
+
+    def test_writers_append_deltas_that_compaction_folds(self):
+        self.originate(3)
+        self.assertFalse(CashflowMonth.objects.exists())
+        before = stored_rows()
+        out = io.StringIO()
+        call_command("recompute_cashflow", "--compact", stdout=out)
+        self.assertIn("Folded 3 cashflow deltas", out.getvalue())
+        self.assertFalse(CashflowDelta.objects.exists())
+        self.assertEqual(stored_rows(), before)
+
+        self.originate(3)
+        self.assertRollupMatches()
+        call_command("recompute_cashflow", "--compact", stdout=io.StringIO())
+        self.assertEqual(CashflowMonth.objects.count(), 3)
+        self.assertRollupMatches()
+
+    def test_workers_fold_the_deltas_the_report_reads(self):
+        for _ in range(5):
+            credit = {"client": self.client_record.id, "product": self.product.id, "total_payments": 12}
+            self.client.post(reverse("credit-create"), credit, format="json")
+        call_command("process_outbox", "--once", stdout=io.StringIO())
+        self.assertEqual(Payment.objects.count(), 60)
+        # However many writes came before, the report only reads the month rows.
+        self.assertFalse(CashflowDelta.objects.exists())
+        self.assertEqual(CashflowMonth.objects.count(), 12)
+        self.assertRollupMatches()
+
+        self.originate(3)
+        call_command("process_outbox", "--once", "--compact-interval", "0", stdout=io.StringIO())
+        self.assertEqual(CashflowDelta.objects.count(), 3)
+
+    def test_report_reads_months_from_the_rollup(self):
+        credit = self.originate(3)
+        plan = list(Payment.objects.filter(credit=credit).order_by("due_to"))
+        start = plan[0].due_to
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("cashflow-report"), {"start": f"{start:%Y-%m}", "months": 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        months = response.data["months"]
+        self.assertEqual(len(months), 4)
+        self.assertEqual(months[0]["month"], f"{start:%Y-%m}")
+        self.assertEqual([month["pending"]["installments"] for month in months], [1, 1, 1, 0])
+        self.assertEqual(months[0]["pending"]["amount"], str(from_cents(plan[0].value)))
+        self.assertEqual(months[3]["delayed"], {"amount": "0.00", "installments": 0})
+
+        response = self.client.get(reverse("cashflow-report"), {"months": 1000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recompute_repairs_the_rollup(self):
+        self.originate(4)
+        call_command("recompute_cashflow", "--compact", stdout=io.StringIO())
+        CashflowMonth.objects.filter(status="pending").update(amount=1, installments=9)
+        with self.assertRaises(CommandError):
+            call_command("recompute_cashflow", "--check", stdout=io.StringIO())
+        out = io.StringIO()
+        call_command("recompute_cashflow", stdout=out)
+        self.assertIn("Recomputed", out.getvalue())
+        self.assertRollupMatches()
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create_superuser(email="admin@example.com", password="12345")
+        client = Client.objects.create(
+            email="admin-client@example.com",
+            first_name="Admin",
+            last_name="Client",
+            is_active=True,
+            address="123 Calle1",
+            phone="3219876540",
+        )
+        product_type = ProductType.objects.create(name="Admin ProductType", status="active")
+        cls.product = Product.objects.create(
+            name="Admin Product", product_type=product_type, price=120000, description="admin", stock=10
+        )
+        cls.client_record = client
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def originate(self, total_payments):
+        serializer = CreditCreationSerializer(
+            data={"client": self.client_record.id, "product": self.product.id, "total_payments": total_payments}
+        )
+        serializer.is_valid(raise_exception=True)
+        credit = serializer.save()
+        drain()
+        return credit
+
+    def test_payment_changelist_queries_do_not_grow_with_rows(self):
+        url = reverse("admin:payments_payment_changelist")
+        query_counts = []
+        for total_payments in (3, 24):
+            self.originate(total_payments)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {"all": ""})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_changelists_search_related_fields(self):
+        credit = self.originate(3)
+        for url in (
+            reverse("admin:payments_credit_changelist"),
+            reverse("admin:payments_payment_changelist"),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url, {"q": "admin-client@example.com"})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertGreater(response.context["cl"].result_count, 0)
+                response = self.client.get(url, {"q": "nobody@example.com"})
+                self.assertEqual(response.context["cl"].result_count, 0)
+        response = self.client.get(reverse("admin:payments_credit_changelist"), {"q": "Admin"})
+        self.assertEqual(list(response.context["cl"].result_list), [credit])
+
+
+class ReadPathBenchmarkTests(TransactionTestCase):
+    def test_bench_read_path_reports_both_servers(self):
+        get_user_model().objects.create_superuser(email="bench@example.com", password="12345")
+        client = Client.objects.create(
+            email="bench-client@example.com", first_name="Bench", last_name="Client", is_active=True,
+            address="123 Calle1", phone="3219876540",
+        )
+        product_type = ProductType.objects.create(name="Bench ProductType", status="active")
+        product = Product.objects.create(
+            name="Bench Product", product_type=product_type, price=120000, description="bench", stock=5
+        )
+        serializer = CreditCreationSerializer(data={"client": client.id, "product": product.id, "total_payments": 3})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        drain()
+
+        out = io.StringIO()
+        call_command("bench_read_path", "--requests", "4", "--concurrency", "2", stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1 + 5 * 2)
+        self.assertEqual({line.split()[-4] for line in lines[1:]}, {"wsgi", "asgi"})
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    def test_bench_reports_and_compares_every_endpoint(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        results = os.path.join(directory.name, "bench.json")
+        # The test database already is a throwaway one; a single worker, as
+        # in-memory SQLite fails concurrent writers instead of queueing them.
+        options = ["--clients", "6", "--products", "2", "--credits", "4", "--payments", "3",
+                   "--requests", "5", "--concurrency", "1", "--no-test-db", "--verbosity", "0"]
+        call_command("bench", *options, "--output", results, stdout=io.StringIO())
+        with open(results) as output:
+            data = json.load(output)
+        self.assertEqual(list(data["endpoints"]), [
+            "credit create", "credit list", "payments by credit", "payment settle", "product list",
+        ])
+        for endpoint in data["endpoints"].values():
+            self.assertEqual((endpoint["requests"], endpoint["errors"]), (5, 0))
+            self.assertLessEqual(endpoint["p50_ms"], endpoint["p95_ms"])
+            self.assertLessEqual(endpoint["p95_ms"], endpoint["p99_ms"])
+        self.assertEqual(Credit.objects.count(), 4 + 5)
+        self.assertEqual(Payment.objects.filter(status="completed").count(), 5)
+
+        out = io.StringIO()
+        call_command("bench", *options, "--compare", results, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1 + 5)
+        self.assertIn("p95 Δ", lines[0])
+
+
+class ImportPortfolioTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.existing = Client.objects.create(
+            email="Existing@example.com", first_name="Old", last_name="Client", is_active=True,
+            address="Calle 1", phone="3000000000",
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, rows):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", newline="", encoding="utf-8") as stream:
+            if name.endswith(".jsonl"):
+                stream.writelines(json.dumps(row) + "\n" for row in rows)
+            else:
+                writer = csv.DictWriter(stream, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+        return path
+
+    def files(self, payments=None):
+        client = {"email": "new@example.com", "first_name": "New", "last_name": "Client", "is_active": "true",
+                  "address": "Calle 2", "phone": "3000000001"}
+        product = {"name": "Legacy TV", "product_type": "Legacy", "price": "1999.90", "description": "", "stock": 3}
+        credits = [
+            {"ref": "L-1", "client": "new@example.com", "product": "Legacy TV", "status": "active",
+             "debt": "200.50", "total_payments": 2, "created_at": "2024-01-10T09:00:00"},
+            {"ref": "L-2", "client": "existing@example.com", "product": "Legacy TV", "status": "completed",
+             "debt": "0", "total_payments": 1, "created_at": ""},
+        ]
+        payments = payments or [
+            {"credit": "L-1", "value": "100.25", "value_delayed": "112.28", "due_to": "2024-02-10", "status": "completed"},
+            {"credit": "L-1", "value": "100.25", "value_delayed": "112.28", "due_to": "2024-03-10", "status": "delayed"},
+            {"credit": "L-2", "value": "1999.9", "value_delayed": "2239.89", "due_to": "2024-02-10", "status": "completed"},
+        ]
+        return [
+            "--clients", self.write("clients.csv", [client]),
+            "--products", self.write("products.jsonl", [product]),
+            "--credits", self.write("credits.csv", credits),
+            "--payments", self.write("payments.csv", payments),
+        ]
+
+    def test_import_resolves_references_and_updates_derived_data(self):
+        out = io.StringIO()
+        call_command("import_portfolio", *self.files(), stdout=out)
+        self.assertIn("payments: imported=3 existing=0 invalid=0", out.getvalue())
+
+        new = Client.objects.get(email="new@example.com")
+        product = Product.objects.get(name="Legacy TV")
+        self.assertEqual((product.price, product.product_type.name, product.stock_shards), (199990, "Legacy", 0))
+        credit = Credit.objects.get(client=new)
+        self.assertEqual((credit.product, credit.debt, credit.status), (product, 20050, "active"))
+        self.assertEqual(credit.created_at.isoformat(), "2024-01-10T09:00:00+00:00")
+        self.assertTrue(Credit.objects.filter(client=self.existing, status="completed").exists())
+        self.assertEqual(
+            sorted(Payment.objects.filter(credit=credit).values_list("value", "value_delayed", "status")),
+            [(10025, 11228, "completed"), (10025, 11228, "delayed")],
+        )
+
+        portfolio = ClientPortfolio.objects.get(client=new)
+        self.assertEqual((portfolio.outstanding_debt, portfolio.active_credits, portfolio.delayed_payments), (20050, 1, 1))
+        self.assertEqual(portfolio.next_due_date, date(2024, 3, 10))
+        self.assertEqual(
+            list(CashflowMonth.objects.values_list("month", "status", "amount")),
+            [(date(2024, 3, 1), "delayed", 11228)],
+        )
+
+    def test_invalid_rows_abort_the_import_unless_skipped(self):
+        payments = [
+            {"credit": "L-1", "value": "100.255", "value_delayed": "112.28", "due_to": "2024-02-10", "status": "pending"},
+            {"credit": "L-1", "value": "100.25", "value_delayed": "112.28", "due_to": "2024-02-10", "status": "paid"},
+            {"credit": "L-9", "value": "100.25", "value_delayed": "112.28", "due_to": "2024-02-10", "status": "pending"},
+            {"credit": "L-1", "value": "100.25", "value_delayed": "112.28", "due_to": "2024-03-10", "status": "pending"},
+        ]
+        files = self.files(payments)
+        err = io.StringIO()
+        with self.assertRaisesMessage(CommandError, "3 invalid rows; nothing was imported"):
+            call_command("import_portfolio", *files, stdout=io.StringIO(), stderr=err)
+        self.assertIn("payments.csv:2: value: A valid amount with at most 2 decimal places is required.", err.getvalue())
+        self.assertIn("payments.csv:3: status: Expected one of completed, delayed, pending.", err.getvalue())
+        self.assertIn("payments.csv:4: credit: No credit with ref 'L-9' in this import.", err.getvalue())
+        self.assertFalse(Client.objects.filter(email="new@example.com").exists())
+
+        call_command("import_portfolio", *files, "--skip-invalid", stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_deferred_indexes_are_rebuilt(self):
+        call_command("import_portfolio", *self.files(), "--defer-indexes", stdout=io.StringIO())
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Payment._meta.db_table)
+        self.assertTrue({index.name for index in Payment._meta.indexes} <= set(constraints))
+        self.assertEqual(Payment.objects.count(), 3)
+
+
+class OutboxTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_superuser(email="outbox@example.com", password="12345")
+        cls.client_record = Client.objects.create(
+            email="outbox-client@example.com",
+            first_name="Outbox",
+            last_name="Client",
+            is_active=True,
+            address="123 Calle1",
+            phone="3219876540",
+        )
+        product_type = ProductType.objects.create(name="Outbox ProductType", status="active")
+        cls.product = Product.objects.create(
+            name="Outbox Product", product_type=product_type, price=120000, description="outbox", stock=10
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def test_payment_plan_is_created_by_the_workers(self):
+        credit = {"client": self.client_record.id, "product": self.product.id, "total_payments": 12}
+        response = self.client.post(reverse("credit-create"), credit, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Payment.objects.filter(credit_id=response.data["id"]).exists())
+        out = io.StringIO()
+        call_command("outbox_status", stdout=out)
+        self.assertRegex(out.getvalue(), r"credit.opened +1 +1 +0 ")
+
+        out = io.StringIO()
+        call_command("process_outbox", "--once", stdout=out)
+        self.assertIn("Handled 1 outbox events", out.getvalue())
+        self.assertEqual(Payment.objects.filter(credit_id=response.data["id"]).count(), 12)
+        self.assertEqual(ClientPortfolio.objects.get(client=self.client_record).active_credits, 1)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+        # A redelivered event leaves the plan as it is.
+        payload = {"credit": response.data["id"], "value": 1, "value_delayed": 1, "start": "2024-01-01"}
+        publish("credit.opened", [payload])
+        self.assertEqual(drain(), 1)
+        self.assertEqual(Payment.objects.filter(credit_id=response.data["id"]).count(), 12)
+        self.assertEqual(ClientPortfolio.objects.get(client=self.client_record).active_credits, 1)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_failing_events_are_retried_then_kept(self):
+        handled = []
+
+        def handler(payloads):
+            if any(payload["fail"] for payload in payloads):
+                raise RuntimeError("boom")
+            handled.extend(payloads)
+
+        publish("test.topic", [{"fail": False}, {"fail": True}])
+        with mock.patch.dict(HANDLERS, {"test.topic": handler}), self.assertLogs("payments.outbox", "WARNING"):
+            self.assertEqual(drain(), 2)
+            self.assertEqual(handled, [{"fail": False}])
+            event = OutboxEvent.objects.get()
+            self.assertEqual((event.status, event.attempts, event.locked_by), ("pending", 1, ""))
+            self.assertGreater(event.available_at, timezone.now())
+            self.assertIn("RuntimeError: boom", event.last_error)
+            self.assertEqual(drain(), 0)
+
+            OutboxEvent.objects.update(available_at=timezone.now())
+            self.assertEqual(drain(), 1)
+        self.assertEqual(OutboxEvent.objects.get().status, "failed")
+        with self.assertRaisesMessage(CommandError, "test.topic has 1 failed events"):
+            call_command("outbox_status", "--max-failed", "0", stdout=io.StringIO())
+
+    def test_claims_are_exclusive_until_they_expire(self):
+        publish("test.topic", [{"n": n} for n in range(3)])
+        _, first = claim(2, 60)
+        _, second = claim(10, 60)
+        self.assertEqual([event.payload for event in first], [{"n": 0}, {"n": 1}])
+        self.assertEqual([event.payload for event in second], [{"n": 2}])
+        self.assertEqual(claim(10, 60)[1], [])
+
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in first]).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        _, again = claim(10, 60)
+        self.assertEqual([(event.payload, event.attempts) for event in again], [({"n": 0}, 2), ({"n": 1}, 2)])
+
+    def test_status_fails_on_lag(self):
+        publish("test.topic", [{}])
+        OutboxEvent.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        with self.assertRaisesMessage(CommandError, "test.topic lags"):
+            call_command("outbox_status", "--max-lag", "60", stdout=io.StringIO())
+        call_command("outbox_status", "--max-lag", "600", stdout=io.StringIO())
+
@@ -1,14 +1,38 @@
 from decimal import Decimal
-from .models import INTEREST_RATE, DELAYED_INTEREST_RATE
+
+from credibuy.money import Cents, round_cents
+from .models import INTEREST_RATE, DELAYED_INTEREST_RATE, Payment
 from datetime import datetime
 from calendar import monthrange
+from functools import lru_cache
+from collections.abc import Sequence
+
+DELAYED_FACTOR = 1 + DELAYED_INTEREST_RATE
+
+@lru_cache(maxsize=4096)
+def annuity_factor(n: int, r: Decimal = INTEREST_RATE) -> Decimal:
+    growth = (1+r)**n
+    return r*growth / (growth - 1)
+
+def get_payment_values(p: Cents, n: int, r: Decimal = INTEREST_RATE) -> tuple[Cents, Cents]:
+    """Installment and delayed installment, in cents, for a price of ``p`` cents.
+
+    Both are rounded half up from the exact annuity; the debt of the plan is
+    the rounded installment times ``n``, so paying every installment leaves
+    exactly zero.
+    """
+    ans = p * annuity_factor(n, r)
+    return round_cents(ans), round_cents(ans * DELAYED_FACTOR)
 
-def get_payment_values(p: Decimal, n: int) -> tuple[Decimal, Decimal]:
-    r = INTEREST_RATE
-    x = (p*r*(1+r)**n)
-    y = (((1+r)**n) - 1)
-    ans = x/y
-    return ans, ans * (1+DELAYED_INTEREST_RATE) 
+def get_payment_values_batch(
+    prices: Sequence[Cents], terms: Sequence[int], rates: Sequence[Decimal] | None = None
+) -> tuple[list[Cents], list[Cents]]:
+    if rates is None:
+        rates = [INTEREST_RATE] * len(prices)
+    if not len(prices) == len(terms) == len(rates):
+        raise ValueError("prices, terms and rates must have the same length")
+    exact = [p * annuity_factor(n, r) for p, n, r in zip(prices, terms, rates)]
+    return [round_cents(v) for v in exact], [round_cents(v * DELAYED_FACTOR) for v in exact]
 
 def add_to_month(date: datetime, n: int) -> datetime:
     day = date.day
@@ -21,4 +45,35 @@ def add_to_month(date: datetime, n: int) -> datetime:
     month += 1
     day_max = monthrange(year, month)[1]
     day = min(day+1, day_max)
-    return datetime(year, month, day)
\ No newline at end of file
+    return datetime(year, month, day)
+
+@lru_cache(maxsize=1024)
+def _due_dates(year: int, month: int, day: int, n: int) -> tuple[datetime, ...]:
+    start = datetime(year, month, day)
+    return tuple(add_to_month(start, i) for i in range(1, n + 1))
+
+def get_due_dates(start: datetime, n: int) -> tuple[datetime, ...]:
+    return _due_dates(start.year, start.month, start.day, n)
+
+def get_due_dates_batch(starts: Sequence[datetime], terms: Sequence[int]) -> list[tuple[datetime, ...]]:
+    if len(starts) != len(terms):
+        raise ValueError("starts and terms must have the same length")
+    # Schedules for the same start date are prefixes of the longest one.
+    longest: dict[tuple[int, int, int], int] = {}
+    for start, n in zip(starts, terms):
+        key = (start.year, start.month, start.day)
+        longest[key] = max(longest.get(key, 0), n)
+    schedules = {key: _due_dates(*key, n) for key, n in longest.items()}
+    return [schedules[(start.year, start.month, start.day)][:n] for start, n in zip(starts, terms)]
+
+def build_payment_plan(credit, payment_value: Cents, delayed_value: Cents, n: int, start: datetime) -> list[Payment]:
+    return [
+        Payment(
+            credit=credit,
+            value=payment_value,
+            due_to=due_to,
+            status="pending",
+            value_delayed=delayed_value,
+        )
+        for due_to in get_due_dates(start, n)
+    ]
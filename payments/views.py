@@ -3,29 +3,194 @@ from rest_framework import generics
 from rest_framework import mixins
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .models import Credit, Payment
-from .serializers import CreditCreationSerializer, CreditSerializer, PaymentSerializer
-from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser
+import io
+from datetime import date, datetime
+from products.models import Product
+from .cashflow import report
+from .models import CashflowMonth, Credit, Payment
+from .origination import originate_credits
+from .quotes import get_product_price, quote
+from .reconciliation import FORMATS, detect_format, read_statement, reconcile
+from .serializers import (
+    MAX_BULK_CREDITS,
+    CashflowMonthSerializer,
+    CashflowReportRequestSerializer,
+    CreditBulkItemSerializer,
+    CreditCreationSerializer,
+    CreditQuoteRequestSerializer,
+    CreditQuoteSerializer,
+    CreditSerializer,
+    PaymentSerializer,
+)
+from rest_framework.filters import OrderingFilter
+from credibuy.async_views import AsyncReadView
+from credibuy.exports import ExportMixin
+from users.search import ClientSearchFilter
 from django_filters.rest_framework import DjangoFilterBackend
 # Create your views here.
 class CreditCreationView(generics.CreateAPIView):
     queryset = Credit.objects.all()
     serializer_class = CreditCreationSerializer
+    query_budget = {"post": 9}
 
-class CreditViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+class CreditBulkCreationView(generics.GenericAPIView):
     queryset = Credit.objects.all()
+    serializer_class = CreditBulkItemSerializer
+
+    def post(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError("Expected a list of credits")
+        if len(request.data) > MAX_BULK_CREDITS:
+            raise ValidationError(f"At most {MAX_BULK_CREDITS} credits per request")
+
+        results = [None] * len(request.data)
+        valid_items, valid_indexes = [], []
+        for index, item in enumerate(request.data):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid_items.append(serializer.validated_data)
+                valid_indexes.append(index)
+            else:
+                results[index] = {"status": "error", "errors": serializer.errors}
+        if valid_items:
+            for index, result in zip(valid_indexes, originate_credits(valid_items)):
+                results[index] = result
+
+        created = any(result["status"] == "created" for result in results)
+        return Response(
+            {"results": results},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST,
+        )
+
+class CreditQuoteView(generics.GenericAPIView):
+    queryset = Product.objects.all()
+    serializer_class = CreditQuoteRequestSerializer
+    query_budget = {"get": 1}
+
+    def get(self, request):
+        terms = [
+            term
+            for value in request.query_params.getlist("total_payments")
+            for term in value.split(",")
+            if term
+        ]
+        serializer = self.get_serializer(
+            data={"product": request.query_params.get("product"), "total_payments": terms}
+        )
+        serializer.is_valid(raise_exception=True)
+        product_id = serializer.validated_data["product"]
+        try:
+            price = get_product_price(product_id)
+        except Product.DoesNotExist:
+            raise NotFound("Product not found")
+        today = datetime.now()
+        data = {
+            "product": product_id,
+            "price": price,
+            "quotes": [quote(price, n, today) for n in serializer.validated_data["total_payments"]],
+        }
+        return Response(CreditQuoteSerializer(data).data)
+
+class CashflowReportView(generics.GenericAPIView):
+    queryset = CashflowMonth.objects.all()
+    serializer_class = CashflowReportRequestSerializer
+    query_budget = {"get": 1}
+    replica_reads = {"get"}
+
+    def get(self, request):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        start = serializer.validated_data.get("start") or date.today()
+        months = report(start, serializer.validated_data["months"])
+        return Response({"months": CashflowMonthSerializer(months, many=True).data})
+
+class CreditViewSet(ExportMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    queryset = Credit.objects.select_related("client", "product")
     serializer_class = CreditSerializer
-    filter_backends = [OrderingFilter, DjangoFilterBackend, SearchFilter]
+    filter_backends = [OrderingFilter, DjangoFilterBackend, ClientSearchFilter]
     search_fields = ["client__first_name", "client__last_name", "client__email", "status"]
+    search_client_field = "client"
+    search_exact_fields = ["status"]
     filterset_fields = ["client__first_name", "client__last_name", "client__email", "status"]
     ordering_fields = ["id", "created_at", "debt"]
     ordering = ['debt', "created_at"]
+    query_budget = {"list": 1, "retrieve": 1, "export": 1}
+    replica_reads = {"list", "export"}
+    export_columns = {
+        "id": "id",
+        "client": "client_id",
+        "client_first_name": "client__first_name",
+        "client_last_name": "client__last_name",
+        "product": "product_id",
+        "product_name": "product__name",
+        "status": "status",
+        "debt": "debt",
+        "total_payments": "total_payments",
+        "created_at": "created_at",
+    }
 
-class PaymentViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.UpdateModelMixin, viewsets.GenericViewSet):
-    queryset = Payment.objects.all()
+class PaymentViewSet(ExportMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.UpdateModelMixin, viewsets.GenericViewSet):
+    queryset = Payment.objects.order_by("id")
     serializer_class = PaymentSerializer
+    query_budget = {
+        "list": 1,
+        "retrieve": 1,
+        "by_credit": 1,
+        "export": 1,
+        "update": 11,
+        "partial_update": 11,
+    }
+    replica_reads = {"list", "export"}
+    export_columns = {
+        "id": "id",
+        "credit": "credit_id",
+        "value": "value",
+        "value_delayed": "value_delayed",
+        "due_to": "due_to",
+        "status": "status",
+    }
+
     @action(detail=False, methods=['get'], url_path='by-credit/(?P<credit_id>[^/.]+)') 
     def by_credit(self, request, credit_id=None): 
-        payments = self.queryset.filter(credit_id=credit_id) 
+        payments = self.queryset.filter(credit_id=credit_id).order_by("due_to", "id")
         serializer = self.get_serializer(payments, many=True) 
         return Response(serializer.data)
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    def reconcile(self, request):
+        statement = request.FILES.get("file")
+        if statement is None:
+            raise ValidationError({"file": ["A statement file is required"]})
+        fmt = request.data.get("format") or detect_format(statement.name)
+        if fmt not in FORMATS:
+            raise ValidationError({"format": [f"Expected one of {', '.join(FORMATS)}"]})
+        stream = io.TextIOWrapper(statement.file, encoding="utf-8", newline="")
+        return Response(reconcile(read_statement(stream, fmt)))
+
+
+class AsyncCreditListView(AsyncReadView):
+    viewset = CreditViewSet
+    basename = "credits"
+    query_budget = {"get": CreditViewSet.query_budget["list"]}
+    replica_reads = {"get"}
+
+
+class AsyncCreditDetailView(AsyncReadView):
+    viewset = CreditViewSet
+    basename = "credits"
+    action = "retrieve"
+    query_budget = {"get": CreditViewSet.query_budget["retrieve"]}
+
+
+class AsyncPaymentsByCreditView(AsyncReadView):
+    viewset = PaymentViewSet
+    basename = "payment"
+    action = "by_credit"
+    paginate = False
+    query_budget = {"get": PaymentViewSet.query_budget["by_credit"]}
+
+    def get_queryset(self, view):
+        return view.get_queryset().filter(credit_id=view.kwargs["credit_id"]).order_by("due_to", "id")
@@ -17,3 +17,11 @@ class ProductTypeAdmin(admin.ModelAdmin):
 class ProductAdmin(admin.ModelAdmin):
     list_display = ["id", "name", "price", "description", "stock"]
     search_fields = ["name", "description"]
+    # Stock moves through products.stock; a full save would overwrite concurrent sales.
+    readonly_fields = ["stock", "stock_shards"]
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.save(update_fields=form.changed_data)
+        else:
+            obj.save()
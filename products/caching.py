@@ -0,0 +1,215 @@
+import copy
+import hashlib
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Entries are keyed by a version number instead of being deleted: a write bumps
+# the version of its catalog's lists and of its own detail entry, so readers
+# simply stop finding the old keys and they age out of the cache. Versions and
+# entries live in the shared cache (see CACHES), so a bump reaches every worker.
+#
+# Fields that move on every sale, such as stock, are left out of the entries
+# and read fresh for each response (``live_fields``), so that the hot entries
+# survive the writes that would otherwise evict them.
+
+
+def _version(key: str) -> int:
+    cache.add(key, 1, None)
+    return cache.get(key) or 1
+
+
+async def _aversion(key: str) -> int:
+    await cache.aadd(key, 1, None)
+    return await cache.aget(key) or 1
+
+
+def _bump(key: str) -> None:
+    cache.add(key, 1, None)
+    cache.incr(key)
+
+
+def list_version_key(catalog: str) -> str:
+    return f"catalog:{catalog}:list-version"
+
+
+def detail_version_key(catalog: str, pk) -> str:
+    return f"catalog:{catalog}:{pk}:version"
+
+
+def _invalidate(catalog: str, pk) -> None:
+    _bump(list_version_key(catalog))
+    _bump(detail_version_key(catalog, pk))
+
+
+def invalidate(catalog: str, pk) -> None:
+    """Drop the cached detail of ``pk`` and every cached list of ``catalog``.
+
+    Bumped again on commit, because a concurrent read may have cached the
+    still-uncommitted old row in between.
+    """
+    _invalidate(catalog, pk)
+    transaction.on_commit(lambda: _invalidate(catalog, pk))
+
+
+def invalidate_lists(catalog: str) -> None:
+    """Drop every cached list of ``catalog``, for writes that add rows without signals."""
+    _bump(list_version_key(catalog))
+    transaction.on_commit(lambda: _bump(list_version_key(catalog)))
+
+
+def _count(catalog: str, outcome: str) -> None:
+    key = f"catalog:{catalog}:{outcome}"
+    cache.add(key, 0, None)
+    cache.incr(key)
+
+
+async def _acount(catalog: str, outcome: str) -> None:
+    key = f"catalog:{catalog}:{outcome}"
+    await cache.aadd(key, 0, None)
+    await cache.aincr(key)
+
+
+def stats(catalog: str) -> dict:
+    counters = cache.get_many([f"catalog:{catalog}:hits", f"catalog:{catalog}:misses"])
+    hits = counters.get(f"catalog:{catalog}:hits", 0)
+    misses = counters.get(f"catalog:{catalog}:misses", 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+    }
+
+
+def etag_for(data) -> str:
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+    return f'W/"{hashlib.md5(payload, usedforsecurity=False).hexdigest()}"'
+
+
+class CachedCatalogMixin:
+    """Serve list and retrieve from the cache, with ETag/Last-Modified and 304s.
+
+    The catalog name is the viewset's router basename. Product and product
+    type writes invalidate through ``products.signals``. ``live_fields`` are
+    not cached: ``live_values`` reads them for the rows of every response, in
+    one query, and such responses carry no Last-Modified.
+    """
+
+    live_fields: tuple[str, ...] = ()
+
+    def live_values(self, pks) -> dict:
+        """``{pk: {field: value}}`` of the ``live_fields`` of the rows ``pks``."""
+        raise NotImplementedError
+
+    @action(detail=False, methods=["get"], url_path="cache-stats")
+    def cache_stats(self, request):
+        """Hit and miss counts of this catalog's response cache."""
+        return Response(stats(self.basename))
+
+    def list(self, request, *args, **kwargs):
+        version = _version(list_version_key(self.basename))
+        return self.cached(request, f"list:{version}", lambda: super(CachedCatalogMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        version = _version(detail_version_key(self.basename, pk))
+        return self.cached(
+            request, f"{pk}:{version}", lambda: super(CachedCatalogMixin, self).retrieve(request, *args, **kwargs)
+        )
+
+    def cached(self, request, key: str, render) -> Response:
+        key = response_key(request, self.basename, key)
+        entry = cache.get(key)
+        hit = entry is not None
+        _count(self.basename, "hits" if hit else "misses")
+        if hit:
+            response = Response(with_live_values(entry["data"], self))
+        else:
+            response = render()
+            if response.status_code != 200:
+                return response
+            entry = new_entry(response, self.live_fields)
+            cache.set(key, entry, CATALOG_CACHE_TIMEOUT)
+        return conditional_response(request, response, entry, hit, live=bool(self.live_fields))
+
+
+class AsyncCachedCatalogMixin:
+    """``CachedCatalogMixin`` for ``credibuy.async_views.AsyncReadView``s, on the async cache API."""
+
+    async def respond(self, view) -> Response:
+        if self.action == "retrieve":
+            pk = view.kwargs[view.lookup_url_kwarg or view.lookup_field]
+            key = f"{pk}:{await _aversion(detail_version_key(self.basename, pk))}"
+        else:
+            key = f"list:{await _aversion(list_version_key(self.basename))}"
+        request = view.request
+        key = response_key(request, self.basename, key)
+        entry = await cache.aget(key)
+        hit = entry is not None
+        await _acount(self.basename, "hits" if hit else "misses")
+        if hit:
+            response = Response(await sync_to_async(with_live_values)(entry["data"], view))
+        else:
+            response = await super().respond(view)
+            if response.status_code != 200:
+                return response
+            entry = new_entry(response, view.live_fields)
+            await cache.aset(key, entry, CATALOG_CACHE_TIMEOUT)
+        return conditional_response(request, response, entry, hit, live=bool(view.live_fields))
+
+
+def response_key(request, catalog: str, key: str) -> str:
+    # Links in paginated responses are absolute, so the host is part of the key.
+    url = hashlib.md5(f"{request.get_host()}{request.get_full_path()}".encode(), usedforsecurity=False).hexdigest()
+    return f"catalog:{catalog}:{key}:{url}"
+
+
+def _rows(data) -> list[dict]:
+    """The serialized rows of a list, paginated or not, or of a detail response."""
+    if isinstance(data, dict):
+        return data["results"] if "results" in data else [data]
+    return data
+
+
+def with_live_values(data, view):
+    """Fill the ``live_fields`` of ``view`` into cached ``data``, a fresh copy from the cache."""
+    rows = _rows(data)
+    if view.live_fields and rows:
+        values = view.live_values([row["id"] for row in rows])
+        for row in rows:
+            row.update(values.get(row["id"], {}))
+    return data
+
+
+def new_entry(response: Response, live_fields: tuple[str, ...] = ()) -> dict:
+    data = response.data
+    if live_fields:
+        data = copy.deepcopy(data)
+        for row in _rows(data):
+            for field in live_fields:
+                row.pop(field, None)
+    return {"data": data, "etag": etag_for(data), "modified": int(time.time())}
+
+
+def conditional_response(request, response: Response, entry: dict, hit: bool, live: bool = False) -> Response:
+    if live:
+        # Live values change without a new entry, so the entry's ETag and age do not describe the response.
+        etag, modified = etag_for(response.data), None
+    else:
+        etag, modified = entry["etag"], entry["modified"]
+    response = get_conditional_response(request, etag=etag, last_modified=modified, response=response)
+    response["ETag"] = etag
+    if modified is not None:
+        response["Last-Modified"] = http_date(modified)
+    response["X-Cache"] = "HIT" if hit else "MISS"
+    return response
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_stock_shards'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'price', 'product_type'], name='product_name_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price'], name='product_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producttype',
+            index=models.Index(fields=['status', 'name'], name='producttype_status_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producttype',
+            index=models.Index(fields=['name'], name='producttype_name_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:56
+
+import credibuy.money
+import django.core.validators
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_admin_search_indexes'),
+    ]
+
+    # Scale to cents while the column is still decimal, then narrow it.
+    operations = [
+        migrations.RunSQL(
+            "UPDATE products_product SET price = ROUND(price * 100)",
+            "UPDATE products_product SET price = price / 100.0",
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='price',
+            field=credibuy.money.MoneyField(validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.validators import MinValueValidator
-from decimal import Decimal
+
+from credibuy.money import MoneyField
 
 # Create your models here.
 class ProductType(models.Model):
@@ -8,18 +9,40 @@ class ProductType(models.Model):
     name = models.CharField(max_length=511, null=False)
     status = models.CharField(max_length=55, choices=STATUSES)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "name"], name="producttype_status_name_idx"),
+            models.Index(fields=["name"], name="producttype_name_idx"),
+        ]
+
     def __str__(self) -> str:
         return self.name
 
 
 class Product(models.Model):
-    name = models.CharField(max_length=255, null=False)
-    price = models.DecimalField(
-        max_digits=25, decimal_places=10, validators=[MinValueValidator(Decimal('0.01'))]
-    )
+    name = models.CharField(max_length=255, null=False, db_index=True)
+    price = MoneyField(validators=[MinValueValidator(1)])
     product_type = models.ForeignKey(ProductType, on_delete=models.CASCADE)
     description = models.TextField()
     stock = models.IntegerField(validators=[MinValueValidator(0)])
+    stock_shards = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["name", "price", "product_type"], name="product_name_price_idx"),
+            models.Index(fields=["price"], name="product_price_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.name
+
+
+class StockShard(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="shards")
+    index = models.PositiveSmallIntegerField()
+    stock = models.IntegerField(validators=[MinValueValidator(0)])
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["product", "index"], name="unique_stock_shard"),
+        ]
@@ -1,5 +1,9 @@
+from django.core.validators import MinValueValidator
 from rest_framework import serializers
+
+from credibuy.money import MoneySerializerField
 from .models import ProductType, Product
+from . import stock
 
 class ProductTypeSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
@@ -11,6 +15,8 @@ class ProductTypeSerializer(serializers.HyperlinkedModelSerializer):
         )
 
 class ProductSerializer(serializers.ModelSerializer):
+    price = MoneySerializerField(validators=[MinValueValidator(1)])
+
     class Meta:
         model = Product
         fields = (
@@ -20,4 +26,20 @@ class ProductSerializer(serializers.ModelSerializer):
             "price",
             "stock",
             "product_type"
-        )
\ No newline at end of file
+        )
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Summed in the list query by ``stock.with_stock_total``.
+        data["stock"] = stock.total_stock(instance)
+        return data
+
+    def update(self, instance, validated_data):
+        total = validated_data.pop("stock", None)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Only the fields sent, so that the stock read with the instance is not written back.
+        instance.save(update_fields=list(validated_data))
+        if total is not None:
+            stock.set_total(instance, total)
+        return instance
\ No newline at end of file
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import caching
+from .models import Product, ProductType
+
+# Stock is served live rather than cached, so its own writes do not invalidate.
+STOCK_FIELDS = frozenset({"stock", "stock_shards"})
+
+
+@receiver(post_save, sender=ProductType)
+@receiver(post_delete, sender=ProductType)
+def product_type_changed(sender, instance: ProductType, **kwargs):
+    caching.invalidate("producttype", instance.pk)
+    # Product lists are filtered and searched by their type's name.
+    caching.invalidate_lists("product")
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def product_changed(sender, instance: Product, update_fields=None, **kwargs):
+    if update_fields and update_fields <= STOCK_FIELDS:
+        return
+    caching.invalidate("product", instance.pk)
@@ -0,0 +1,118 @@
+import random
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Product, StockShard
+
+# Hot products keep their stock split across ``Product.stock_shards`` StockShard
+# rows so concurrent sales update different rows instead of queueing on the
+# Product row. Restocks written to Product.stock are still sold from the row.
+# Stock is only written here: saving a whole Product would write back the
+# stock read with it over the reservations made since. Stock is not part of
+# the cached catalog (``ProductViewSet.live_fields``), so moving it
+# invalidates nothing.
+
+
+def _take(queryset, quantity: int) -> int:
+    """Atomically take up to ``quantity`` units from the single row in ``queryset``."""
+    while quantity > 0:
+        if queryset.filter(stock__gte=quantity).update(stock=F("stock") - quantity):
+            return quantity
+        available = queryset.values_list("stock", flat=True).first() or 0
+        if available <= 0:
+            return 0
+        quantity = min(quantity, available)
+    return 0
+
+
+def reserve(product: Product, quantity: int = 1) -> int:
+    """Decrement stock without read-modify-write; returns the units reserved."""
+    reserved = 0
+    if product.stock_shards:
+        indexes = list(range(product.stock_shards))
+        random.shuffle(indexes)
+        shards = StockShard.objects.filter(product_id=product.pk)
+        for index in indexes:
+            reserved += _take(shards.filter(index=index), quantity - reserved)
+            if reserved == quantity:
+                break
+    if reserved < quantity:
+        reserved += _take(Product.objects.filter(pk=product.pk), quantity - reserved)
+    return reserved
+
+
+def set_total(product: Product, total: int) -> Product:
+    """Set the product's stock to ``total``, spread over its shards if it has any."""
+    # Conditional, because ``product`` may predate sharding being enabled.
+    if Product.objects.filter(pk=product.pk, stock_shards=0).update(stock=total):
+        product.stock, product.stock_shards = total, 0
+        return product
+    return rebalance(product, total=total)
+
+
+def with_stock_total(queryset):
+    """Annotate ``stock_total``, the stock including the shards, in the queryset's own query."""
+    sharded = (
+        StockShard.objects.filter(product_id=OuterRef("pk"))
+        .values("product_id")
+        .annotate(total=Sum("stock"))
+        .values("total")
+    )
+    return queryset.annotate(
+        stock_total=Case(
+            When(stock_shards=0, then=F("stock")),
+            default=F("stock") + Coalesce(Subquery(sharded), Value(0)),
+            output_field=IntegerField(),
+        )
+    )
+
+
+def total_stock(product: Product) -> int:
+    if not product.stock_shards:
+        return product.stock
+    if hasattr(product, "stock_total"):
+        return product.stock_total
+    sharded = StockShard.objects.filter(product_id=product.pk).aggregate(total=Sum("stock"))["total"]
+    return product.stock + (sharded or 0)
+
+
+@transaction.atomic
+def rebalance(product: Product, shards: int | None = None, total: int | None = None) -> Product:
+    """Spread the product's stock evenly over ``shards`` shard rows (0 disables sharding)."""
+    locked = Product.objects.select_for_update().get(pk=product.pk)
+    if total is None:
+        total = locked.stock
+        if locked.stock_shards:
+            # Reservations take from the shards without touching the product
+            # row; locked, so that none lands between the sum and the rewrite.
+            shard_stock = StockShard.objects.select_for_update().filter(product_id=locked.pk)
+            total += sum(shard_stock.values_list("stock", flat=True))
+    if shards is None:
+        shards = locked.stock_shards
+    if locked.stock_shards:
+        StockShard.objects.filter(product_id=locked.pk).delete()
+    if shards:
+        per_shard, extra = divmod(total, shards)
+        StockShard.objects.bulk_create(
+            StockShard(product_id=locked.pk, index=index, stock=per_shard + (index < extra))
+            for index in range(shards)
+        )
+        locked.stock = 0
+    else:
+        locked.stock = total
+    locked.stock_shards = shards
+    locked.save(update_fields=["stock", "stock_shards"])
+    product.stock, product.stock_shards = locked.stock, locked.stock_shards
+    return product
+
+
+def enable_sharding(product: Product, shards: int) -> Product:
+    if shards < 1:
+        raise ValueError("shards must be positive")
+    return rebalance(product, shards=shards)
+
+
+def disable_sharding(product: Product) -> Product:
+    return rebalance(product, shards=0)
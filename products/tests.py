@@ -3,7 +3,11 @@ from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
-from .models import Product, ProductType
+from django.test import TransactionTestCase
+from credibuy.testing import CacheIsolationMixin, run_concurrently
+from .models import Product, ProductType, StockShard
+from .serializers import ProductSerializer
+from . import stock
 from decimal import Decimal
 
 class ProductTests(APITestCase):
@@ -14,7 +18,7 @@ class ProductTests(APITestCase):
         cls.user = User.objects.create_user(email="jamarlesf@gmail.com", password='12345')
         cls.user.user_permissions.add(*Permission.objects.all())
         cls.product_type = ProductType.objects.create(name='Test ProductType', status="active")
-        cls.product = Product.objects.create(name='Test Product', product_type=cls.product_type, price=55000.83, description="test ini", stock=50)
+        cls.product = Product.objects.create(name='Test Product', product_type=cls.product_type, price=5500083, description="test ini", stock=50)
 
     @classmethod
     def tearDownClass(cls):
@@ -182,3 +186,175 @@ class ProductTypeTests(APITestCase):
         }
         response = self.client.post(url, product_type, format="json")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CatalogCacheTests(CacheIsolationMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(email="catalog@example.com", password="12345")
+        cls.user.user_permissions.add(*Permission.objects.all())
+        cls.product_type = ProductType.objects.create(name="Catalog type", status="active")
+        cls.product = Product.objects.create(
+            name="Cached", product_type=cls.product_type, price=1000, description="cached", stock=10
+        )
+        cls.other = Product.objects.create(
+            name="Other", product_type=cls.product_type, price=2000, description="other", stock=10
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.user)
+
+    def get(self, url, **headers):
+        return self.client.get(url, headers=headers)
+
+    def test_repeated_reads_are_served_from_cache(self):
+        url = reverse("product-detail", kwargs={"pk": self.product.id})
+        first = self.get(url)
+        self.assertEqual(first["X-Cache"], "MISS")
+        # Only the live stock is read.
+        with self.assertNumQueries(1):
+            second = self.get(url)
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["ETag"], first["ETag"])
+
+        response = self.client.get(reverse("product-cache-stats"))
+        self.assertEqual(response.data, {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    def test_conditional_requests_get_not_modified(self):
+        url = reverse("producttype-list")
+        response = self.get(url)
+        self.assertEqual(self.get(url, if_none_match=response["ETag"]).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(
+            self.get(url, if_modified_since=response["Last-Modified"]).status_code, status.HTTP_304_NOT_MODIFIED
+        )
+        self.assertEqual(self.get(url, if_none_match='W/"stale"').status_code, status.HTTP_200_OK)
+
+    def test_writes_invalidate_only_affected_entries(self):
+        detail = reverse("product-detail", kwargs={"pk": self.product.id})
+        other = reverse("product-detail", kwargs={"pk": self.other.id})
+        listing = reverse("product-list")
+        for url in (detail, other, listing):
+            self.get(url)
+
+        self.client.patch(detail, {"price": "1500.00"}, format="json")
+        response = self.get(detail)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(Decimal(response.data["price"]), Decimal("1500"))
+        self.assertEqual(self.get(listing)["X-Cache"], "MISS")
+        self.assertEqual(self.get(other)["X-Cache"], "HIT")
+
+        # The admin saves models directly, which invalidates too.
+        self.product_type.name = "Renamed type"
+        self.product_type.save()
+        type_detail = reverse("producttype-detail", kwargs={"pk": self.product_type.id})
+        self.assertEqual(self.get(type_detail).data["name"], "Renamed type")
+
+    def test_product_type_changes_invalidate_product_lists(self):
+        listing = reverse("product-list")
+        by_type = {"product_type__name": "Catalog type"}
+        self.assertEqual(len(self.client.get(listing, by_type).data["results"]), 2)
+        self.product_type.name = "Renamed type"
+        self.product_type.save()
+        response = self.client.get(listing, by_type)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"], [])
+
+    def test_stock_moves_keep_entries_and_are_served_live(self):
+        detail = reverse("product-detail", kwargs={"pk": self.other.id})
+        listing = reverse("product-list")
+        before = {url: self.get(url) for url in (detail, listing)}
+
+        stock.reserve(self.other)
+        stock.enable_sharding(self.other, 2)
+        stock.reserve(self.other)
+        for url, earlier in before.items():
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response["X-Cache"], "HIT")
+                self.assertNotIn("Last-Modified", response)
+                self.assertNotEqual(response["ETag"], earlier["ETag"])
+                self.assertEqual(self.get(url, if_none_match=earlier["ETag"]).status_code, status.HTTP_200_OK)
+                self.assertEqual(
+                    self.get(url, if_none_match=response["ETag"]).status_code, status.HTTP_304_NOT_MODIFIED
+                )
+        self.assertEqual(self.get(detail).data["stock"], 8)
+        rows = {row["id"]: row["stock"] for row in self.get(listing).data["results"]}
+        self.assertEqual(rows[self.other.id], 8)
+
+
+class StockReservationTests(TransactionTestCase):
+    THREADS = 16
+    ATTEMPTS = 60
+
+    def setUp(self):
+        product_type = ProductType.objects.create(name="Hot", status="active")
+        self.product = Product.objects.create(
+            name="Hot Product", product_type=product_type, price=1000, description="promo", stock=40
+        )
+
+    def sell_concurrently(self, product):
+        return run_concurrently(lambda attempt: stock.reserve(product), range(self.ATTEMPTS), self.THREADS)
+
+    def test_concurrent_reservations_do_not_oversell(self):
+        sold = self.sell_concurrently(self.product)
+        self.assertEqual(len(sold), self.ATTEMPTS)
+        self.assertEqual(sum(sold), 40)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 0)
+
+    def test_sharded_reservations_do_not_oversell(self):
+        stock.enable_sharding(self.product, 4)
+        self.assertEqual(stock.total_stock(self.product), 40)
+        sold = self.sell_concurrently(self.product)
+        self.assertEqual(sum(sold), 40)
+        self.assertEqual(stock.total_stock(Product.objects.get(pk=self.product.pk)), 0)
+        self.assertFalse(StockShard.objects.filter(product=self.product, stock__lt=0).exists())
+
+    def test_rebalancing_keeps_concurrent_reservations(self):
+        stock.enable_sharding(self.product, 4)
+
+        def sell_or_rebalance(attempt):
+            product = Product.objects.get(pk=self.product.pk)
+            if attempt % 5 == 0:
+                stock.rebalance(product, shards=2 + attempt % 3)
+                return 0
+            return stock.reserve(product)
+
+        sold = run_concurrently(sell_or_rebalance, range(self.ATTEMPTS), self.THREADS)
+        remaining = stock.total_stock(Product.objects.get(pk=self.product.pk))
+        self.assertEqual(sum(sold) + remaining, 40)
+        self.assertFalse(StockShard.objects.filter(product=self.product, stock__lt=0).exists())
+
+    def test_product_edits_keep_concurrent_reservations(self):
+        stale = Product.objects.get(pk=self.product.pk)
+        stock.reserve(self.product, 5)
+        serializer = ProductSerializer(stale, data={"name": "Renamed"}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(Product.objects.values_list("name", "stock").get(pk=self.product.pk), ("Renamed", 35))
+
+        stock.enable_sharding(self.product, 2)
+        serializer = ProductSerializer(stale, data={"stock": 12}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(stock.total_stock(Product.objects.get(pk=self.product.pk)), 12)
+
+    def test_sharded_stock_is_summed_in_the_list_query(self):
+        stock.enable_sharding(self.product, 4)
+        other = Product.objects.create(
+            name="Other", product_type=self.product.product_type, price=1000, description="promo", stock=7
+        )
+        stock.enable_sharding(other, 2)
+        with self.assertNumQueries(1):
+            data = ProductSerializer(stock.with_stock_total(Product.objects.order_by("pk")), many=True).data
+        self.assertEqual([row["stock"] for row in data], [40, 7])
+
+    def test_reserve_takes_what_is_left(self):
+        stock.enable_sharding(self.product, 3)
+        self.assertEqual(stock.reserve(self.product, 25), 25)
+        self.assertEqual(stock.reserve(self.product, 25), 15)
+        self.assertEqual(stock.reserve(self.product, 1), 0)
+        stock.disable_sharding(self.product)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 0)
@@ -5,23 +5,58 @@ from .models import ProductType, Product
 from rest_framework import viewsets
 from rest_framework.filters import OrderingFilter, SearchFilter
 from django_filters.rest_framework import DjangoFilterBackend
+from asgiref.sync import sync_to_async
+from credibuy.async_views import AsyncReadView
+from credibuy.money import MoneyFilterBackend
+from .caching import AsyncCachedCatalogMixin, CachedCatalogMixin
 from .serializers import ProductTypeSerializer, ProductSerializer
+from . import stock
 
-class ProductTypeViewSet(viewsets.ModelViewSet):
+class ProductTypeViewSet(CachedCatalogMixin, viewsets.ModelViewSet):
     queryset = ProductType.objects.all()
     serializer_class = ProductTypeSerializer
     filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
     ordering_fields = ['name']
     ordering = ['status','name']
+    query_budget = {"list": 1, "retrieve": 1, "create": 3, "update": 4, "partial_update": 4, "destroy": 8, "cache_stats": 0}
+    replica_reads = {"list"}
     search_fields = ['name', 'status']
     filterset_fields = ['name', 'status']
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CachedCatalogMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
+    filter_backends = [MoneyFilterBackend, OrderingFilter, SearchFilter]
     ordering_fields = ['name']
-    ordering = ['name', 'price', 'product_type__name']
+    ordering = ['name', 'price', 'product_type']
+    query_budget = {"list": 1, "retrieve": 1, "create": 4, "update": 4, "partial_update": 4, "destroy": 6, "cache_stats": 0}
+    replica_reads = {"list"}
     search_fields = ['name', 'product_type__name']
     filterset_fields = ['name', 'price', 'product_type__name']
 
+    live_fields = ("stock",)
+
+    def get_queryset(self):
+        return stock.with_stock_total(super().get_queryset())
+
+    def live_values(self, pks):
+        products = stock.with_stock_total(Product.objects.filter(pk__in=pks)).only("stock", "stock_shards")
+        return {product.pk: {"stock": stock.total_stock(product)} for product in products}
+
+
+
+class AsyncProductListView(AsyncCachedCatalogMixin, AsyncReadView):
+    viewset = ProductViewSet
+    basename = "product"
+    query_budget = {"get": ProductViewSet.query_budget["list"]}
+    replica_reads = {"get"}
+
+    async def serialize(self, view, instance, many=False):
+        # Serializing may sum the shards of a product saved without the annotation.
+        return await sync_to_async(self.get_data)(view, instance, many)
+
+
+class AsyncProductDetailView(AsyncProductListView):
+    action = "retrieve"
+    query_budget = {"get": ProductViewSet.query_budget["retrieve"]}
+    replica_reads = set()
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from credibuy.pagination import EstimatedCountPaginator
 from .models import Client
 from .forms import ClientForm
 
@@ -9,7 +10,7 @@ class ClientAdmin(admin.ModelAdmin):
     form = ClientForm
     add_form = ClientForm
     list_display = ("id", "email", "first_name", "last_name", "address")
-    list_filter = ("id", "email", "first_name", "last_name", "address")
+    list_filter = ("is_active",)
     fieldsets = (
         (None, {"fields": ("email", "first_name", "last_name", "address", "phone", "is_active")}),
     )
@@ -19,7 +20,9 @@ class ClientAdmin(admin.ModelAdmin):
             "fields": ("email", "first_name", "last_name", "address", "phone", "is_active")}
         ),
     )
-    search_fields = ("id", "email", "first_name", "last_name", "address")
+    search_fields = ("email__exact", "first_name__startswith", "last_name__startswith")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     ordering = ("id", "email", )
 
 
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='client',
+            name='client_last_name_idx',
+        ),
+        migrations.AlterField(
+            model_name='client',
+            name='last_name',
+            field=models.CharField(db_index=True, max_length=255, verbose_name='last name'),
+        ),
+    ]
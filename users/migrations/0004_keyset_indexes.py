@@ -0,0 +1,17 @@
+# Generated by Django 5.1.1 on 2026-10-18 15:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['first_name', 'id'], name='client_first_name_idx'),
+        ),
+    ]
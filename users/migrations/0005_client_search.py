@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from users import search
+
+
+def install(apps, schema_editor):
+    search.install(schema_editor.connection.alias, rebuild=True)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -4,11 +4,19 @@ from django.utils.translation import gettext_lazy as _
 
 class Client(models.Model):
     first_name = models.CharField(_('first name'), max_length=255)
-    last_name = models.CharField(_('last name'), max_length=255)
+    last_name = models.CharField(_('last name'), max_length=255, db_index=True)
     email = models.EmailField(_('email address'), max_length=255, unique=True)
     is_active = models.BooleanField(_("is active"))
     address = models.CharField(_("home address"), max_length=255)
     phone = models.CharField(_("phone number"), max_length=255)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["first_name", "last_name", "id"], name="client_name_idx"),
+            models.Index(fields=["first_name", "id"], name="client_first_name_idx"),
+            models.Index(fields=["is_active", "first_name", "last_name"], name="client_active_name_idx"),
+            models.Index(fields=["phone", "id"], name="client_phone_idx"),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
\ No newline at end of file
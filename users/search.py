@@ -0,0 +1,145 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+# Client columns that make up the searchable document, in index order.
+DOCUMENT_FIELDS = ("first_name", "last_name", "email", "phone")
+FTS_TABLE = "users_client_fts"
+# Characters kept from a search term; everything else separates words anyway.
+TERM = re.compile(r"[\w@.+-]+")
+
+# PostgreSQL: an expression GIN index over a 'simple' tsvector, so the query
+# below must spell the document exactly like the index does.
+PG_DOCUMENT = "to_tsvector('simple'::regconfig, " + " || ' ' || ".join(
+    f"coalesce({field}, '')" for field in DOCUMENT_FIELDS
+) + ")"
+PG_INSTALL = [f"CREATE INDEX IF NOT EXISTS client_search_idx ON users_client USING gin ({PG_DOCUMENT})"]
+PG_UNINSTALL = ["DROP INDEX IF EXISTS client_search_idx"]
+
+# SQLite: an external-content FTS5 table kept in step with triggers.
+_columns = ", ".join(DOCUMENT_FIELDS)
+_new = ", ".join(f"new.{field}" for field in DOCUMENT_FIELDS)
+_old = ", ".join(f"old.{field}" for field in DOCUMENT_FIELDS)
+SQLITE_INSTALL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{_columns}, content='users_client', content_rowid='id', prefix='2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON users_client BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON users_client BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON users_client BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old}); "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new}); END",
+]
+SQLITE_UNINSTALL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def supported(using: str = "default") -> bool:
+    return connections[using].vendor in ("postgresql", "sqlite")
+
+
+def install(using: str = "default", rebuild: bool = False):
+    """Create the client search index if it is missing.
+
+    Safe to repeat: SQLite drops the triggers whenever a migration rebuilds
+    ``users_client``, so this also runs after every ``migrate``.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            for sql in PG_INSTALL:
+                cursor.execute(sql)
+        elif connection.vendor == "sqlite":
+            for sql in SQLITE_INSTALL:
+                cursor.execute(sql)
+            if rebuild:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def uninstall(using: str = "default"):
+    connection = connections[using]
+    statements = {"postgresql": PG_UNINSTALL, "sqlite": SQLITE_UNINSTALL}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def search_query(terms: list[str], vendor: str) -> str | None:
+    """Every term must prefix-match a word of the document."""
+    words = [word for term in terms for word in TERM.findall(term)]
+    if not words:
+        return None
+    if vendor == "postgresql":
+        return " & ".join("'{}':*".format(word.lower()) for word in words)
+    return " ".join('"{}"*'.format(word) for word in words)
+
+
+def matching_clients(query: str, vendor: str) -> RawSQL:
+    """Ids of the clients matching ``query``, for use with ``__in``."""
+    if vendor == "postgresql":
+        return RawSQL(f"SELECT id FROM users_client WHERE {PG_DOCUMENT} @@ to_tsquery('simple', %s)", [query])
+    return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [query])
+
+
+def client_rank(query: str, vendor: str, client_column: str) -> RawSQL:
+    """Relevance of the client whose id is in ``client_column``; higher is better."""
+    if vendor == "postgresql":
+        # Aliased, so that a ``client_column`` of the outer users_client still
+        # refers to the outer row; the document's bare columns are the alias's.
+        sql = (
+            f"SELECT ts_rank({PG_DOCUMENT}, to_tsquery('simple', %s)) "
+            f"FROM users_client AS search_client WHERE search_client.id = {client_column}"
+        )
+    else:
+        # bm25() is negative, more so for better matches.
+        sql = f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {client_column}"
+    return RawSQL(f"COALESCE(({sql}), 0)", [query], output_field=FloatField())
+
+
+class ClientSearchFilter(SearchFilter):
+    """``?search=`` backed by the client full-text index and ranked by relevance.
+
+    Views name the path to the client through ``search_client_field``; terms
+    equal to one of ``search_exact_fields``'s choices filter that field
+    instead. Databases without a full-text index fall back to ``SearchFilter``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms or not supported(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+        vendor = connections[queryset.db].vendor
+
+        condition = Q()
+        for field in getattr(view, "search_exact_fields", []):
+            choices = {value for value, _ in queryset.model._meta.get_field(field).choices}
+            exact = [term for term in terms if term.lower() in choices]
+            if exact:
+                condition &= Q(**{f"{field}__in": [term.lower() for term in exact]})
+                terms = [term for term in terms if term not in exact]
+
+        client_field = getattr(view, "search_client_field", "pk")
+        query = search_query(terms, vendor)
+        if query is not None:
+            condition &= Q(**{f"{client_field}__in": matching_clients(query, vendor)})
+        queryset = queryset.filter(condition)
+        if query is None:
+            return queryset
+
+        if client_field == "pk":
+            column = queryset.model._meta.pk.column
+        else:
+            column = queryset.model._meta.get_field(client_field).column
+        quote = connections[queryset.db].ops.quote_name
+        rank = client_rank(query, vendor, f"{quote(queryset.model._meta.db_table)}.{quote(column)}")
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return queryset.annotate(search_rank=rank).order_by("-search_rank", *ordering)
+
@@ -1,8 +1,20 @@
 from rest_framework import serializers
+
+from credibuy.money import MoneySerializerField
 from .models import Client
 
 
+class PortfolioSerializer(serializers.Serializer):
+    """Read-only view of ``payments.ClientPortfolio``."""
+    outstanding_debt = MoneySerializerField(read_only=True)
+    active_credits = serializers.IntegerField(read_only=True)
+    next_due_date = serializers.DateField(read_only=True)
+    delayed_payments = serializers.IntegerField(read_only=True)
+
+
 class ClientSerializer(serializers.HyperlinkedModelSerializer):
+    portfolio = PortfolioSerializer(read_only=True, default=None)
+
     class Meta:
         model = Client
-        fields = ("first_name", "last_name", "is_active", "email", "address", "phone")
\ No newline at end of file
+        fields = ("first_name", "last_name", "is_active", "email", "address", "phone", "portfolio")
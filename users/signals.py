@@ -0,0 +1,12 @@
+from django.db import connections
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+
+from . import search
+
+
+@receiver(post_migrate)
+def ensure_search_index(sender, using="default", **kwargs):
+    # Table rebuilds on SQLite drop the FTS triggers; put them back.
+    if sender.name == "users" and "users_client" in connections[using].introspection.table_names():
+        search.install(using)
@@ -1,9 +1,12 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Permission
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from .models import Client
+from .search import client_rank
 
 class ClientTests(APITestCase):
     @classmethod
@@ -108,4 +111,55 @@ class ClientTests(APITestCase):
             "phone": "9124834734",
         }
         response = self.client.post(url, client_data, format="json")
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class ClientSearchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_superuser(email="search@example.com", password="12345")
+        Client.objects.bulk_create([
+            Client(first_name="Maria", last_name="Gomez", email="maria@example.com", is_active=True, address="a", phone="3001112233"),
+            Client(first_name="Mario", last_name="Maria", email="mario@example.com", is_active=True, address="b", phone="3004445566"),
+            Client(first_name="Pedro", last_name="Perez", email="pedro@example.com", is_active=False, address="c", phone="3007778899"),
+        ])
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def search(self, text):
+        response = self.client.get(reverse("client-list"), {"search": text})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [row["email"] for row in response.data["results"]]
+
+    def test_search_matches_word_prefixes_across_fields(self):
+        self.assertEqual(self.search("pere"), ["pedro@example.com"])
+        self.assertEqual(self.search("300777"), ["pedro@example.com"])
+        self.assertEqual(self.search("mario@example"), ["mario@example.com"])
+        self.assertEqual(self.search("mari gomez"), ["maria@example.com"])
+        self.assertEqual(self.search("nobody"), [])
+
+    def test_results_are_ranked(self):
+        # One "maria" matches in the first name and the email, the other only in the last name.
+        self.assertEqual(self.search("maria"), ["maria@example.com", "mario@example.com"])
+
+    def test_index_follows_client_changes(self):
+        pedro = Client.objects.get(email="pedro@example.com")
+        pedro.last_name = "Ramirez"
+        pedro.save()
+        Client.objects.filter(email="maria@example.com").delete()
+        self.assertEqual(self.search("ramirez"), ["pedro@example.com"])
+        self.assertEqual(self.search("perez"), [])
+        self.assertEqual(self.search("gomez"), [])
+
+    def test_export_follows_search(self):
+        response = self.client.get(reverse("client-export"), {"search": "maria", "file_format": "jsonl"})
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="client.jsonl"')
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)["email"] for line in lines], ["maria@example.com", "mario@example.com"])
+
+    def test_postgresql_rank_correlates_with_the_outer_client(self):
+        # ClientViewSet ranks users_client rows, so the subquery must not read its own table under that name.
+        rank = client_rank("'maria':*", "postgresql", '"users_client"."id"')
+        self.assertIn('FROM users_client AS search_client WHERE search_client.id = "users_client"."id"', rank.sql)
+        self.assertNotIn("users_client.id", rank.sql)
@@ -2,14 +2,45 @@ from rest_framework.filters import OrderingFilter
 from .models import Client
 from .serializers import ClientSerializer
 from rest_framework import viewsets
-from rest_framework.filters import OrderingFilter, SearchFilter
-from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework.filters import OrderingFilter
+from credibuy.money import MoneyFilterBackend
+from credibuy.exports import ExportMixin
+from .search import ClientSearchFilter
 
-class ClientViewSet(viewsets.ModelViewSet):
-    queryset = Client.objects.all()
+class ClientViewSet(ExportMixin, viewsets.ModelViewSet):
+    queryset = Client.objects.select_related("portfolio")
     serializer_class = ClientSerializer
-    filter_backends = [DjangoFilterBackend, OrderingFilter, SearchFilter]
-    ordering_fields = ['first_name', 'last_name', 'phone']
+    filter_backends = [MoneyFilterBackend, OrderingFilter, ClientSearchFilter]
+    ordering_fields = [
+        'first_name',
+        'last_name',
+        'phone',
+        'portfolio__outstanding_debt',
+        'portfolio__active_credits',
+        'portfolio__delayed_payments',
+    ]
     ordering = ['first_name', 'last_name']
+    query_budget = {"list": 1, "retrieve": 1, "create": 5, "update": 4, "partial_update": 4, "destroy": 6, "export": 1}
+    replica_reads = {"list", "export"}
+    export_columns = {
+        "id": "id",
+        "first_name": "first_name",
+        "last_name": "last_name",
+        "email": "email",
+        "is_active": "is_active",
+        "address": "address",
+        "phone": "phone",
+        "outstanding_debt": "portfolio__outstanding_debt",
+        "active_credits": "portfolio__active_credits",
+        "next_due_date": "portfolio__next_due_date",
+        "delayed_payments": "portfolio__delayed_payments",
+    }
     search_fields = ['first_name', 'last_name', 'email', 'phone']
-    filterset_fields = ['last_name', 'is_active']
+    filterset_fields = {
+        'last_name': ['exact'],
+        'is_active': ['exact'],
+        'portfolio__outstanding_debt': ['gte', 'lte'],
+        'portfolio__active_credits': ['gte'],
+        'portfolio__delayed_payments': ['gte'],
+        'portfolio__next_due_date': ['exact', 'lte', 'gte'],
+    }